@@ -16,6 +16,8 @@
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
 import parglare
+import parse_tables
+import grammar_actions
 import charset_normalizer
 import ailists
 import os
@@ -31,29 +33,30 @@ class AIListsParser():
                                                           types=n[3])],
         "AIGROUP_DEPOT_TYPGROUP_2_GROUP": [lambda _, n: ailists.AIGroupDepotTypgroup2(type=n[1],
                                                                                       vehicles=n[2])],
-        "AIGROUP_DEPOT_TYPGROUP_2_GROUP_LIST": [lambda _, n: [n[0]],
-                                                lambda _, n: n[0] + [n[1]]],
+        "AIGROUP_DEPOT_TYPGROUP_2_GROUP_LIST": [grammar_actions.list_first,
+                                                grammar_actions.list_append],
         "AIGROUP_DEPOT_GROUP": [lambda _, n: ailists.AIGroupDepot(name=n[1],
                                                                   hof_name=n[2],
                                                                   typgroups=n[4])],
         "AIGROUP_GROUP": [lambda _, n: n[0],
                           lambda _, n: n[0]],
-        "AIGROUP_GROUP_LIST": [lambda _, n: [n[0]],
-                               lambda _, n: n[0] + [n[1]]],
+        "AIGROUP_GROUP_LIST": [grammar_actions.list_first,
+                               grammar_actions.list_append],
         "OPTIONAL_LINE": [lambda _, n: "",
                           lambda _, n: n[0]],
-		"LINES": [lambda _, n: [n[0]],
-                  lambda _, n: n[0] + [n[1]]],
+		"LINES": [grammar_actions.list_first,
+                  grammar_actions.list_append],
         "DESCRIPTION_LINE": [lambda _, n: "",
                              lambda _, n: n[0]],
     }
     def __init__(self):
         self.grammar = parglare.Grammar.from_file(os.path.join(os.path.dirname(os.path.realpath(__file__)), "ailists_grammar.pg"))
-        self.parser = parglare.GLRParser(self.grammar,
-                                         actions=self.actions,
-                                         ws="\r")
+        self.parser = parglare.Parser(self.grammar,
+                                      actions=self.actions,
+                                      ws="\r",
+                                      table=parse_tables.table(self.grammar))
     def parse(self, file_name):
         best_match = charset_normalizer.from_path(file_name).best()
         content: str = '\n'.join(str(best_match).splitlines())
         logger.debug(f"Decoded ailists: {repr(content)}")
-        return self.parser.parse(content)[0]
+        return self.parser.parse(content)
@@ -0,0 +1,66 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import pytest
+import ailists
+import ailists_parser
+import ailists_serializer
+
+@pytest.fixture(scope="module")
+def parser() -> ailists_parser.AIListsParser:
+    return ailists_parser.AIListsParser()
+
+def serialized(a: ailists.AILists) -> str:
+    f = io.StringIO()
+    ailists_serializer.AIListsSerializer().serialize_(a, f)
+    return f.getvalue()
+
+def ailists_corpus() -> dict[str, ailists.AILists]:
+    return {
+        "Single group": ailists.AILists([ailists.AIGroup2('Taxis', 'Hof', ['Vehicles\\Taxi.ovh'])]),
+        "Trailing empty lines": ailists.AILists([
+            ailists.AIGroup2('Taxis', '', ['Vehicles\\Taxi.ovh', '', '']),
+            ailists.AIGroupDepot('Depot', 'Hof', [ailists.AIGroupDepotTypgroup2('Bus', ['Vehicles\\Bus.ovh', '']),
+                                                  ailists.AIGroupDepotTypgroup2('', None)]),
+            ailists.AIGroup2('Taxis 2', 'Hof', ['', '[en route', '[end of line', 'end]']),# lines almost like group end
+        ]),
+    }
+
+def group_vars(aigroup: ailists.AnyAIgroup) -> dict:
+    if isinstance(aigroup, ailists.AIGroupDepot):
+        return {**vars(aigroup), 'typgroups': [vars(typgroup) for typgroup in aigroup.typgroups]}
+    return vars(aigroup)
+
+@pytest.mark.parametrize("name", ailists_corpus().keys())
+def test_round_trip(name, parser) -> None:
+    original: ailists.AILists = ailists_corpus()[name]
+    content: str = serialized(original)
+    parsed: ailists.AILists = parser.parser.parse(content)
+    assert [type(aigroup) for aigroup in parsed.aigroups] == [type(aigroup) for aigroup in original.aigroups]
+    assert [group_vars(aigroup) for aigroup in parsed.aigroups] == [group_vars(aigroup) for aigroup in original.aigroups]
+    assert serialized(parsed) == content
+
+def test_empty_lines_between_groups(parser) -> None:# belong to no group
+    content: str = "\n\n[aigroup_2]\nTaxis\nHof\nVehicles\\Taxi.ovh\n\n[end]\n\n\n[aigroup_depot]\nDepot\nHof\n\n\n" \
+        "[aigroup_depot_typgroup_2]\nBus\n[end]\n\n\n[aigroup_depot_typgroup_2]\nBus\nVehicles\\Bus.ovh\n[end]"
+    parsed: ailists.AILists = parser.parser.parse(content)
+    assert [group_vars(aigroup) for aigroup in parsed.aigroups] == [
+        {'name': 'Taxis', 'hof_name': 'Hof', 'types': ['Vehicles\\Taxi.ovh', '']},
+        {'name': 'Depot', 'hof_name': 'Hof', 'typgroups': [{'type': 'Bus', 'vehicles': None},
+                                                           {'type': 'Bus', 'vehicles': ['Vehicles\\Bus.ovh']}]},
+    ]
@@ -0,0 +1,322 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+# Merges maps without GUI, as described by manifests (JSON files):
+#
+#   {
+#       "name": "Merged map",
+#       "directory": "merged",
+#       "maps": [
+#           {"directory": "maps/first"},
+#           {"directory": "maps/second", "shift_x": 2, "shift_y": -1, "keep_groundtex": true}
+#       ]
+#   }
+#
+# Relative directories are relative to manifest's directory. Manifests are
+# merged one by one in one process. Maps used by more than one manifest are
+# loaded once (files changed since are parsed again) and released after the
+# last manifest using them. Report with warnings, timings and metrics (see
+# metrics.py) of every manifest is written as JSON, exit status is 1 if any
+# manifest failed.
+#
+#   python batch_merge.py first.json second.json --workers 4 --report report.json
+#   python batch_merge.py first.json --progress --metrics metrics.jsonl
+
+import argparse
+import collections
+import json
+import logging
+import os
+import sys
+import time
+import typing
+import loader
+import metrics
+import omsi_files
+import omsi_map_merger
+import parse_cache
+import version
+
+logger = logging.getLogger(__name__)
+
+class ManifestError(Exception):
+    pass
+
+class MapEntry:
+    def __init__(self,
+                 directory: str,
+                 shift_x: int,
+                 shift_y: int,
+                 keep_groundtex: bool,
+                 ) -> None:
+        self.directory: str = directory
+        self.shift_x: int = shift_x
+        self.shift_y: int = shift_y
+        self.keep_groundtex: bool = keep_groundtex
+
+class Manifest:
+    def __init__(self,
+                 path: str,
+                 name: str,
+                 directory: str,# merged map is saved there
+                 maps: list[MapEntry],
+                 ) -> None:
+        self.path: str = path
+        self.name: str = name
+        self.directory: str = directory
+        self.maps: list[MapEntry] = maps
+
+def _field[T](entry: dict, key: str, field_type: type[T], default: T | None = None) -> T:
+    if key not in entry:
+        if default is None:
+            raise ManifestError(f"Missing \"{key}\"")
+        return default
+    value = entry[key]
+    # bool is int too, but not the other way
+    if not isinstance(value, field_type) or (field_type is int and isinstance(value, bool)):
+        raise ManifestError(f"\"{key}\" must be {field_type.__name__}, not {type(value).__name__}")
+    return value
+
+def read_manifest(path: str) -> Manifest:
+    try:
+        with open(path, encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError) as exception:
+        raise ManifestError(f"Unable to read manifest \"{path}\" ({type(exception).__name__}: {exception})") from exception
+    return manifest_of(entry, path, os.path.dirname(os.path.abspath(path)))
+
+def manifest_of(entry: typing.Any, path: str, base: str) -> Manifest:# from parsed JSON, relative directories are relative to base
+    def absolute(directory: str) -> str:
+        return os.path.normpath(os.path.join(base, directory))
+    try:
+        if not isinstance(entry, dict):
+            raise ManifestError("Manifest must be JSON object")
+        maps: list[MapEntry] = []
+        for i, map_entry in enumerate(_field(entry, "maps", list)):
+            if not isinstance(map_entry, dict):
+                raise ManifestError(f"Map {i} must be JSON object")
+            maps.append(MapEntry(absolute(_field(map_entry, "directory", str)),
+                                 _field(map_entry, "shift_x", int, 0),
+                                 _field(map_entry, "shift_y", int, 0),
+                                 _field(map_entry, "keep_groundtex", bool, False)))
+        if len(maps) < 2:
+            raise ManifestError("At least 2 maps are needed to merge")
+        if maps[0].keep_groundtex:
+            raise ManifestError("\"keep_groundtex\" on 1st map is nonsense")
+        return Manifest(path, _field(entry, "name", str), absolute(_field(entry, "directory", str)), maps)
+    except ManifestError as exception:
+        raise ManifestError(f"Invalid manifest \"{path}\": {exception}") from exception
+
+def _failures(sl: loader.SafeLoader) -> list[str]:# details of units not loaded
+    if isinstance(sl, loader.SafeLoaderList):
+        failures: list[str] = []
+        for sub_sl in sl.get_sl_list():
+            failures += _failures(sub_sl)
+        return failures
+    if sl.ready():
+        return []
+    return [sl.info_detailed()]
+
+def _loaded_bytes(sl: loader.SafeLoader) -> int:# size of parsed files, deferred ones are not held in memory
+    if isinstance(sl, loader.SafeLoaderList):
+        return sum([_loaded_bytes(sub_sl) for sub_sl in sl.get_sl_list()])
+    if sl.get_status() is not loader.FileParsingStatus.READ_SUCCESS:
+        return 0
+    try:
+        return os.path.getsize(typing.cast(loader.SafeLoaderUnit, sl).get_path())
+    except OSError:
+        return 0
+
+class MapPool:
+    # Maps by directory, kept loaded to be merged again. Size of map is size
+    # of its parsed files, which is roughly proportional to memory taken by
+    # parsed data. Least recently used maps are evicted over the limits.
+    def __init__(self,
+                 cache: parse_cache.ParseCache | None = None,
+                 lazy_tiles: bool = False,
+                 max_maps: int | None = None,
+                 max_bytes: int | None = None,
+                 ) -> None:
+        self.cache: parse_cache.ParseCache | None = cache
+        self.lazy_tiles: bool = lazy_tiles
+        self.max_maps: int | None = max_maps
+        self.max_bytes: int | None = max_bytes
+        self.__maps: collections.OrderedDict[str, omsi_map_merger.MapToMerge] = collections.OrderedDict()# least recently used first
+
+    def get(self, directory: str) -> tuple[omsi_map_merger.MapToMerge, bool]:# map and if it was kept
+        map_to_merge: omsi_map_merger.MapToMerge | None = self.__maps.get(directory)
+        if map_to_merge is not None:
+            self.__maps.move_to_end(directory)
+            return map_to_merge, True
+        map_to_merge = omsi_map_merger.MapToMerge(directory, 0, 0, False, self.cache, self.lazy_tiles)
+        self.__maps[directory] = map_to_merge
+        return map_to_merge, False
+
+    def maps_bytes(self) -> dict[str, int]:# least recently used first
+        return {directory: _loaded_bytes(map_to_merge) for directory, map_to_merge in self.__maps.items()}
+
+    def evict(self, keep: set[str] = set()) -> list[str]:# least recently used maps over limits, except kept ones, returns evicted
+        maps_bytes: dict[str, int] = self.maps_bytes()
+        evicted: list[str] = []
+        for directory in [directory for directory in maps_bytes if directory not in keep]:
+            if (self.max_maps is None or len(self.__maps) <= self.max_maps) and \
+               (self.max_bytes is None or sum(maps_bytes.values()) <= self.max_bytes):
+                break
+            del self.__maps[directory]
+            del maps_bytes[directory]
+            evicted.append(directory)
+        if evicted:
+            logger.info(f"Evicted maps: {evicted}")
+        return evicted
+
+    def release(self, keep: set[str]) -> None:# maps of other directories are not needed anymore
+        for directory in [directory for directory in self.__maps if directory not in keep]:
+            del self.__maps[directory]
+
+class BatchMerger:
+    def __init__(self,
+                 cache: parse_cache.ParseCache | None = None,
+                 lazy_tiles: bool = False,
+                 workers: int = 1,
+                 placement: omsi_files.FilePlacement = omsi_files.FilePlacement.COPY,
+                 strict: bool = False,# merged map is not saved if there are warnings
+                 pool: MapPool | None = None,# maps kept loaded between manifests
+                 observer: metrics.Observer | None = None,# of every manifest
+                 trace_memory: bool = False,# see loader.read_file
+                 ) -> None:
+        self.cache: parse_cache.ParseCache | None = cache
+        self.lazy_tiles: bool = lazy_tiles
+        self.workers: int = workers
+        self.placement: omsi_files.FilePlacement = placement
+        self.strict: bool = strict
+        self.pool: MapPool = pool or MapPool(cache, lazy_tiles)
+        self.observer: metrics.Observer | None = observer
+        self.trace_memory: bool = trace_memory
+
+    def merge(self, manifest: Manifest) -> dict[str, typing.Any]:# report of manifest
+        report: dict[str, typing.Any] = {"manifest": manifest.path,
+                                         "directory": manifest.directory,
+                                         "status": "failed",
+                                         "warnings": [],
+                                         "errors": [],
+                                         "reused_maps": 0,
+                                         "seconds": {}}
+        def timed(name: str, function: typing.Callable[[], typing.Any]) -> typing.Any:
+            start: float = time.perf_counter()
+            try:
+                return function()
+            finally:
+                report["seconds"][name] = round(time.perf_counter() - start, 6)
+        metrics_summary = metrics.Summary()
+        observer = metrics.Observers([metrics_summary] + ([] if self.observer is None else [self.observer]))
+        try:
+            merger = omsi_map_merger.OmsiMapMerger(self.cache, self.lazy_tiles)
+            for entry in manifest.maps:
+                map_to_merge, reused = self.pool.get(entry.directory)
+                report["reused_maps"] += reused
+                map_to_merge.set_shift(entry.shift_x, entry.shift_y)
+                map_to_merge.set_keep_groundtex(entry.keep_groundtex)
+                merger.append_map_to_merge(map_to_merge)
+            # reused maps are parsed again only if their files changed
+            timed("load", lambda: merger.reload_maps(self.workers, loader.LoadProgress(observer=observer, trace_memory=self.trace_memory)))
+            for map_to_merge in merger.get_maps():
+                report["errors"] += [f"Map \"{map_to_merge.directory}\": {failure}" for failure in _failures(map_to_merge)]
+            if report["errors"]:
+                return report
+            if merger.overlapping():
+                report["errors"].append("Maps overlap")
+                return report
+            merge_result: omsi_map_merger.MergeResult = timed("merge", lambda: merger.merged_omsi_map(manifest.name, observer))
+            report["warnings"] = merge_result.warnings
+            if self.strict and merge_result.warnings:
+                report["status"] = "not saved"
+                return report
+            summary: omsi_files.PlacementSummary = timed("save", lambda: merge_result.merged_map.save(manifest.directory, self.workers, self.placement, observer=observer))
+            report["placed"] = vars(summary)
+            report["status"] = "saved"
+        except Exception as exception:
+            logger.exception(f"Merging maps of manifest \"{manifest.path}\" failed")
+            report["errors"].append(f"{type(exception).__name__}: {exception}")
+        finally:
+            report["metrics"] = metrics_summary.to_dict()
+        return report
+
+    def run(self, manifests_paths: list[str]) -> dict[str, typing.Any]:# report of all manifests
+        start: float = time.perf_counter()
+        reports: list[dict[str, typing.Any]] = []
+        manifests: list[Manifest | None] = []
+        for path in manifests_paths:
+            try:
+                manifests.append(read_manifest(path))
+            except ManifestError as exception:
+                logger.error(str(exception))
+                manifests.append(None)
+        for i, manifest in enumerate(manifests):
+            if manifest is None:
+                reports.append({"manifest": manifests_paths[i], "status": "failed", "warnings": [],
+                                "errors": ["Invalid manifest"], "reused_maps": 0, "seconds": {}})
+                continue
+            logger.info(f"Merging maps of manifest \"{manifest.path}\"")
+            reports.append(self.merge(manifest))
+            self.pool.release({entry.directory for later in manifests[i+1:] if later is not None for entry in later.maps})
+        return {"version": version.version,
+                "succeeded": all([report["status"] == "saved" for report in reports]),
+                "seconds": round(time.perf_counter() - start, 6),
+                "manifests": reports}
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Merge OMSI maps without GUI, as described by JSON manifests.")
+    arg_parser.add_argument("manifests", nargs="+", help="manifest files, merged in given order")
+    arg_parser.add_argument("--workers", type=int, default=1, help="processes parsing and saving tiles")
+    arg_parser.add_argument("--lazy-tiles", action="store_true", help="parse tiles only when merged map is saved, uses less memory")
+    arg_parser.add_argument("--cache-directory", default=parse_cache.default_directory(), help="directory of parse cache shared with GUI")
+    arg_parser.add_argument("--no-cache", action="store_true", help="do not use parse cache")
+    arg_parser.add_argument("--placement", choices=[placement.name.lower() for placement in omsi_files.FilePlacement], default="copy",
+                            help="how files of source maps are placed in merged map")
+    arg_parser.add_argument("--strict", action="store_true", help="do not save merged map if there are warnings")
+    arg_parser.add_argument("--report", help="file to write JSON report to, standard output by default")
+    arg_parser.add_argument("--progress", action="store_true", help="show progress line on standard error")
+    arg_parser.add_argument("--metrics", help="file to append JSON lines with events of every file and phase to")
+    arg_parser.add_argument("--trace-memory", action="store_true", help="measure peak memory of parsing every file, parsing is several times slower")
+    arg_parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="WARNING", help="level of log written to standard error")
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', encoding='utf-8', level=args.log_level)
+    metrics_file: metrics.JsonLines | None = None if args.metrics is None else metrics.JsonLines.open(args.metrics)
+    sinks: list[metrics.Observer] = ([metrics.ProgressLine()] if args.progress else []) + ([] if metrics_file is None else [metrics_file])
+    batch_merger = BatchMerger(None if args.no_cache else parse_cache.ParseCache(args.cache_directory),
+                               args.lazy_tiles,
+                               args.workers,
+                               omsi_files.FilePlacement[args.placement.upper()],
+                               args.strict,
+                               observer=metrics.Observers(sinks) if sinks else None,
+                               trace_memory=args.trace_memory)
+    try:
+        report: dict[str, typing.Any] = batch_merger.run(args.manifests)
+    finally:
+        if metrics_file is not None:
+            metrics_file.close()
+    if args.report is None:
+        json.dump(report, sys.stdout, indent=4)
+        print()
+    else:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+    return 0 if report["succeeded"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import subprocess
+import sys
+import pytest
+import batch_merge
+import benchmark
+import omsi_map_merger
+import omsi_map_merger_test
+
+def write_manifest(path, name: str, maps: list[dict]) -> str:
+    path.write_text(json.dumps({"name": name, "directory": name, "maps": maps}), encoding='utf-8')
+    return str(path)
+
+@pytest.fixture
+def maps_directory(tmp_path):
+    for map_name in ["map0", "map1", "map2"]:
+        benchmark.write_synthetic_map(str(tmp_path / map_name), 3, 10)
+    return tmp_path
+
+def test_batch_merge(maps_directory) -> None:# the same as merged in GUI, shared map is loaded once
+    manifests: list[str] = [
+        write_manifest(maps_directory / "first.json", "first", [{"directory": "map0"}, {"directory": "map1", "shift_y": 1, "keep_groundtex": True}]),
+        write_manifest(maps_directory / "second.json", "second", [{"directory": "map2"}, {"directory": "map0", "shift_x": 3}]),
+    ]
+    report = batch_merge.BatchMerger().run(manifests)
+    assert report["succeeded"]
+    assert [manifest_report["status"] for manifest_report in report["manifests"]] == ["saved", "saved"]
+    assert [manifest_report["reused_maps"] for manifest_report in report["manifests"]] == [0, 1]
+    assert set(report["manifests"][0]["seconds"]) == {"load", "merge", "save"}
+    assert {"parse", "merge", "save", "serialize"} <= set(report["manifests"][0]["metrics"]["phases"])
+
+    merger = omsi_map_merger.OmsiMapMerger()
+    merger.append_map(str(maps_directory / "map2"))
+    merger.append_map(str(maps_directory / "map0"))
+    merger.get_maps()[1].shift(shift_x=3)
+    merger.load_maps()
+    merger.merged_omsi_map("second").merged_map.save(str(maps_directory / "expected"))
+    assert omsi_map_merger_test.saved_files(str(maps_directory / "second")) == omsi_map_merger_test.saved_files(str(maps_directory / "expected"))
+
+def test_batch_merge_failures(maps_directory) -> None:# failed manifest does not stop the others
+    manifests: list[str] = [
+        write_manifest(maps_directory / "invalid.json", "invalid", [{"directory": "map0"}, {"directory": "map1", "shift_y": "1"}]),
+        write_manifest(maps_directory / "overlapping.json", "overlapping", [{"directory": "map0"}, {"directory": "map1"}]),
+        write_manifest(maps_directory / "missing.json", "missing", [{"directory": "map0"}, {"directory": "map3", "shift_y": 1}]),
+        write_manifest(maps_directory / "valid.json", "valid", [{"directory": "map0"}, {"directory": "map1", "shift_y": 1}]),
+    ]
+    report = batch_merge.BatchMerger().run(manifests)
+    assert not report["succeeded"]
+    assert [manifest_report["status"] for manifest_report in report["manifests"]] == ["failed", "failed", "failed", "saved"]
+    assert report["manifests"][1]["errors"] == ["Maps overlap"]
+    assert "is not directory" in report["manifests"][2]["errors"][0]
+    assert not os.path.exists(maps_directory / "overlapping")
+
+def test_batch_merge_command(maps_directory) -> None:
+    manifest: str = write_manifest(maps_directory / "unnamed.json", "", [{"directory": "map0"}, {"directory": "map1", "shift_y": 1}])
+    completed = subprocess.run([sys.executable, batch_merge.__file__, manifest, "--no-cache", "--strict", "--report", str(maps_directory / "report.json")],
+                               capture_output=True, text=True)
+    assert completed.returncode == 1
+    report = json.loads((maps_directory / "report.json").read_text(encoding='utf-8'))
+    assert report["manifests"][0]["status"] == "not saved"
+    assert "Map name is empty" in report["manifests"][0]["warnings"]
@@ -0,0 +1,318 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+# Benchmarks on synthetic data, run e.g.:
+#   python benchmark.py tile_parse --objects 1000 10000 50000
+#   python benchmark.py map_load --tiles 16 --objects 2000 --workers 1 4
+#   python benchmark.py map_load --tiles 300 --objects 2000 --workers 1 --cache
+#   python benchmark.py merge_save --tiles 16 --objects 20000 --workers 1 4 --memory
+#   python benchmark.py object_memory --objects 50000
+#   python benchmark.py startup --repeat 5
+#   python benchmark.py grammar_parse --objects 40
+
+import argparse
+import copy
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing
+import ailists
+import ailists_parser
+import ailists_serializer
+import busstops
+import busstops_serializer
+import chrono_tile
+import chrono_tile_parser
+import chrono_tile_serializer
+import file_decoder
+import global_config
+import global_config_serializer
+import omsi_map
+import omsi_map_merger
+import parglare
+import parglare.closure
+import parglare.tables
+import parse_cache
+import station_links
+import station_links_parser
+import station_links_serializer
+import tile
+import tile_parser
+import tile_serializer
+import timetable
+
+def synthetic_tile(objects_count: int) -> tile.Tile:
+    splines: list[tile.Spline] = [tile.Spline(False, '0', 'Splines\\Benchmark\\spline.sli', 1000000 + i, 0, 0, '1.5', '0', '2.5', '0', '10', '0', \
+                                              '0', '0', None, '0', '0', '0', '0', '0', False, None, None) for i in range(objects_count // 10)]
+    objects: list[tile._Object] = [tile._Object(f'Object Nr. {i}', False, '0', 'Sceneryobjects\\Benchmark\\object.sco', i, '1.5', '2.5', '0', '90', '0', '0', '0', \
+                                                ['1', 'Text'] if i % 2 else None, None, None, \
+                                                [tile.Rule(False, '0', '', '', '1')] if i % 3 == 0 else None) for i in range(objects_count)]
+    return tile.Tile(f"Synthetic tile, {objects_count} objects", '14', True, None, None, None, splines, objects)
+
+def synthetic_global_config(tiles_count: int, objects_count: int) -> global_config.GlobalConfig:
+    return global_config.GlobalConfig("Synthetic map", "Synthetic", "Synthetic map", ["Synthetic map"], "14", objects_count + 1,
+                                      groundtex=[global_config.GroundTex("a.dds", "b.dds", "1", "1", "1")],
+                                      addseason=[global_config.AddSeason(" Synthetic season:", "1", "1", "1")],
+                                      trafficdensity_road=[global_config.Trafficdensity("0", "1")],
+                                      trafficdensity_passenger=[global_config.Trafficdensity("0", "1")],
+                                      entrypoints=[global_config.Entrypoints('0', 0, '0', '0', '0', '0', '0', '0', '0', '1', 0, "Synthetic entrypoint")],
+                                      _map=[global_config.Map(pos_x, 0, f"tile_{pos_x}_0.map") for pos_x in range(tiles_count)])
+
+def write_synthetic_map(directory: str, tiles_count: int, objects_count: int) -> None:
+    os.makedirs(os.path.join(directory, timetable.TIMETABLE_DIRNAME))
+    gc: global_config.GlobalConfig = synthetic_global_config(tiles_count, objects_count)
+    global_config_serializer.GlobalConfigSerializer().serialize(gc, os.path.join(directory, omsi_map.GLOBAL_CONFIG_FILENAME))
+    synthetic: tile.Tile = synthetic_tile(objects_count)
+    for gc_tile in gc._map:
+        tile_serializer.TileSerializer().serialize(synthetic, os.path.join(directory, gc_tile.map_file))
+    ailists_serializer.AIListsSerializer().serialize(ailists.AILists([ailists.AIGroup2("Synthetic", "Synthetic", ["Bus"])]),
+                                                     os.path.join(directory, omsi_map.AILISTS_FILENAME))
+    busstops_serializer.BusstopsSerializer().serialize(busstops.Busstops("Synthetic", "Busstops", [busstops.Busstop("Stop", 0, 1, 0, "0", "0", "Stop")]),
+                                                       os.path.join(directory, timetable.TIMETABLE_DIRNAME, timetable.BUSSTOPS_FILENAME))
+    station_links_serializer.StationLinksSerializer().serialize(station_links.StationLinks("Synthetic", "Station links", []),
+                                                                os.path.join(directory, timetable.TIMETABLE_DIRNAME, timetable.STNLINKS_FILENAME))
+
+def serialized_tile(t: tile.Tile) -> str:
+    f = io.StringIO()
+    tile_serializer.TileSerializer().serialize_(t, f)
+    return f.getvalue()
+
+def best_time(function, repeat: int) -> float:
+    best: float | None = None
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        function()
+        elapsed: float = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_tile_parse(args: argparse.Namespace) -> None:
+    parsers: dict[str, tile_parser.TileParser] = {engine.name: tile_parser.TileParser(engine) for engine in args.engines}
+    print(f"{'engine':>8} {'objects':>8} {'seconds':>10} {'us/object':>10}")
+    for objects_count in args.objects:
+        content: str = serialized_tile(synthetic_tile(objects_count))
+        for name, parser in parsers.items():
+            seconds: float = best_time(lambda: parser.parse_content(content), args.repeat)
+            print(f"{name:>8} {objects_count:>8} {seconds:>10.3f} {seconds / objects_count * 1e6:>10.1f}")
+
+def bench_map_load(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        maps_directories: list[str] = [os.path.join(directory, f"map{i}") for i in range(args.maps)]
+        for map_directory in maps_directories:
+            write_synthetic_map(map_directory, args.tiles, args.objects)
+        print(f"{'workers':>8} {'cache':>6} {'seconds':>10}")
+        for workers in args.workers:
+            cache: parse_cache.ParseCache | None = parse_cache.ParseCache(os.path.join(directory, f"cache{workers}")) if args.cache else None
+            for cache_state in ["cold", "warm"] if args.cache else ["none"]:
+                merger = omsi_map_merger.OmsiMapMerger(cache)
+                for map_directory in maps_directories:
+                    merger.append_map(map_directory)
+                seconds: float = best_time(lambda: merger.load_maps(workers), 1 if cache_state == "cold" else args.repeat)
+                assert all([mtm.ready() for mtm in merger.get_maps()])
+                print(f"{workers:>8} {cache_state:>6} {seconds:>10.3f}")
+
+def bench_merge_save(args: argparse.Namespace) -> None:
+    # peak memory is traced in main process only (workers hold one tile each), tracing slows it down, so it is a separate run
+    with tempfile.TemporaryDirectory() as directory:
+        maps_directories: list[str] = [os.path.join(directory, f"map{i}") for i in range(args.maps)]
+        for map_directory in maps_directories:
+            write_synthetic_map(map_directory, args.tiles, args.objects)
+        runs: int = 0
+        def merge_save(lazy_tiles: bool, workers: int) -> None:
+            nonlocal runs
+            runs += 1
+            merger = omsi_map_merger.OmsiMapMerger(lazy_tiles=lazy_tiles)
+            for i, map_directory in enumerate(maps_directories):
+                merger.append_map(map_directory)
+                merger.get_maps()[-1].shift(shift_y=i)
+            merger.load_maps()
+            merger.merged_omsi_map("Merged").merged_map.save(os.path.join(directory, f"merged{runs}"), workers)
+        print(f"{'lazy':>5} {'workers':>8} {'seconds':>10} {'peak MiB':>10}")
+        for lazy_tiles, workers in [(lazy_tiles, workers) for lazy_tiles in [False, True] for workers in args.workers]:
+            seconds: float = best_time(lambda: merge_save(lazy_tiles, workers), 1)
+            peak: str = "-"
+            if args.memory:
+                tracemalloc.start()
+                merge_save(lazy_tiles, workers)
+                peak = f"{tracemalloc.get_traced_memory()[1] / 1024 ** 2:.1f}"
+                tracemalloc.stop()
+            print(f"{str(lazy_tiles):>5} {workers:>8} {seconds:>10.3f} {peak:>10}")
+
+def bench_tile_serialize(args: argparse.Namespace) -> None:
+    # printing lines one by one to UTF-16 text stream is how tiles were serialized before
+    serializer: tile_serializer.TileSerializer = tile_serializer.TileSerializer()
+    def print_lines(t: tile.Tile, file_name: str) -> None:
+        with open(file_name, 'w', encoding='utf_16', newline='\r\n') as f:
+            for line in serializer.lines(t):
+                print(line, file=f)
+    print(f"{'objects':>8} {'MiB':>8} {'print [MiB/s]':>14} {'bulk [MiB/s]':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        file_name: str = os.path.join(directory, "tile_0_0.map")
+        for objects_count in args.objects:
+            t: tile.Tile = synthetic_tile(objects_count)
+            serializer.serialize(t, file_name)
+            mib: float = os.path.getsize(file_name) / 1024 ** 2
+            print_seconds: float = best_time(lambda: print_lines(t, file_name), args.repeat)
+            bulk_seconds: float = best_time(lambda: serializer.serialize(t, file_name), args.repeat)
+            print(f"{objects_count:>8} {mib:>8.1f} {mib / print_seconds:>14.1f} {mib / bulk_seconds:>13.1f}")
+
+def bench_tile_shift(args: argparse.Namespace) -> None:
+    print(f"{'objects':>8} {'elements [s]':>13} {'columns [s]':>12} {'columnar tile [s]':>18}")
+    for objects_count in args.objects:
+        t: tile.Tile = synthetic_tile(objects_count)
+        columnar: tile.ColumnarTile = tile.ColumnarTile.of(t)
+        elements_seconds: float = best_time(lambda: t.shifted_ids(100), args.repeat)
+        columns_seconds: float = best_time(lambda: columnar.shifted_ids(100), args.repeat)
+        of_seconds: float = best_time(lambda: tile.ColumnarTile.of(t), args.repeat)
+        print(f"{objects_count:>8} {elements_seconds:>13.4f} {columns_seconds:>12.4f} {of_seconds:>18.4f}")
+
+def bench_object_memory(args: argparse.Namespace) -> None:
+    # copies of one sample share all attribute values, so only objects themselves are measured,
+    # parsed tile includes strings and lists too
+    rules: list[tile.Rule] = [tile.Rule(False, '0', '', '', '1')]
+    samples: dict[str, object] = {
+        "Rule": rules[0],
+        "Spline": tile.Spline(False, '0', 'spline.sli', 1, 0, 2, '1.5', '0', '2.5', '0', '10', '0', '0', '0', None, '0', '0', '0', '0', '0', False, None, rules),
+        "_Object": tile._Object('Object', False, '0', 'object.sco', 1, '1.5', '2.5', '0', '90', '0', '0', '0', None, None, False, rules),
+        "SplineAttachement": tile.SplineAttachement('Object', '0', 'object.sco', 1, '0', '1.5', '2.5', '0', '90', '0', '0', '10', '100', '0', '0', None, None, False, rules),
+        "SplineAttachementRepeater": tile.SplineAttachementRepeater('Object', '0', '12', '117', 'object.sco', 1, '0', '1.5', '2.5', '0', '90', '0', '0', '10', '100', '0', '0', None, None, False, rules),
+    }
+    print(f"{'object':>26} {'bytes/object':>13}")
+    for name, sample in samples.items():
+        tracemalloc.start()
+        objects: list[object] = [copy.copy(sample) for _ in range(args.objects)]
+        size: int = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{name:>26} {size / len(objects):>13.1f}")
+    content: str = serialized_tile(synthetic_tile(args.objects))
+    tracemalloc.start()
+    parsed: tile.Tile = tile_parser.TileParser().parse_content(content)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{'parsed tile':>26} {size / (len(parsed.spline) + len(parsed._object)):>13.1f}")
+
+def bench_grammar_parse(args: argparse.Namespace) -> None:
+    # GLR (as these formats were parsed before) and LR parsers over the same grammar build trees only, actions
+    # of the grammars build lists in place, which GLR parser can not do, last column is parser with actions as used;
+    # GLR parse time of chrono tiles grows exponentially with number of objects, so keep it small
+    synthetic: tile.Tile = synthetic_tile(args.objects)
+    entries: list[station_links.StationLinkEntry] = [station_links.StationLinkEntry("Entry", 1, "0", 0, "10", "0", "0", "0", ["Trip.ttp"])]
+    formats: list[tuple[str, typing.Any, typing.Callable[[str], None], str]] = [
+        ("tile", tile_parser.TileParser(tile_parser.TileParserEngine.LR),
+         lambda file_name: tile_serializer.TileSerializer().serialize(synthetic, file_name), 'utf_16'),
+        ("chrono tile", chrono_tile_parser.ChronoTileParser(),
+         lambda file_name: chrono_tile_serializer.ChronoTileSerializer().serialize(chrono_tile.ChronoTile("Synthetic", "14", synthetic.spline + synthetic._object), file_name), 'utf_16'),
+        ("station links", station_links_parser.StationLinksParser(),
+         lambda file_name: station_links_serializer.StationLinksSerializer().serialize(station_links.StationLinks("Synthetic", "Station links",
+             [station_links.StationLink("Link", "0", 1, 2, "0", "0", "0", "0", "0", "0", entries * 3) for _ in range(args.objects // 4)]), file_name), 'iso-8859-1'),
+        ("ailists", ailists_parser.AIListsParser(),
+         lambda file_name: ailists_serializer.AIListsSerializer().serialize(ailists.AILists([ailists.AIGroup2(f"Group {i}", "Hof", ["Bus", "Car"]) for i in range(args.objects // 4)]), file_name), 'utf_16'),
+    ]
+    print(f"{'format':>14} {'KiB':>8} {'GLR tree [s]':>13} {'LR tree [s]':>12} {'speedup':>8} {'LR actions [s]':>15}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, parser, write, encoding in formats:
+            file_name: str = os.path.join(directory, name)
+            write(file_name)
+            content: str = file_decoder.decoded(file_name, [encoding])
+            glr_table = parglare.tables.create_table(parser.grammar, parglare.closure.LR_1, prefer_shifts=False, prefer_shifts_over_empty=False)
+            glr_parser = parglare.GLRParser(parser.grammar, ws="\r", build_tree=True, table=glr_table)
+            lr_parser = parglare.Parser(parser.grammar, ws="\r", build_tree=True, table=parser.parser.table)
+            glr_seconds: float = best_time(lambda: glr_parser.parse(content)[0], args.repeat)
+            lr_seconds: float = best_time(lambda: lr_parser.parse(content), args.repeat)
+            actions_seconds: float = best_time(lambda: parser.parser.parse(content), args.repeat)
+            print(f"{name:>14} {os.path.getsize(file_name) / 1024:>8.0f} {glr_seconds:>13.3f} {lr_seconds:>12.3f} {glr_seconds / lr_seconds:>8.1f} {actions_seconds:>15.3f}")
+
+STARTER_MODULES: list[str] = ["omsi_map_merger", "parse_cache", "version", "loader", "timetable", "run_files_manager"] # imported by starter, besides GUI
+
+def bench_startup(args: argparse.Namespace) -> None:
+    # every run in fresh interpreter, parse tables built with empty cache (cold), then loaded from it (warm),
+    # parsers are created on first use, here all of them at once
+    code: str = (f"import time\nstart = time.perf_counter()\nimport {', '.join(STARTER_MODULES)}\nimported = time.perf_counter()\n"
+                 "import lazy_instance\nfor instance in list(lazy_instance._instances):\n    instance.get()\n"
+                 "print(imported - start, time.perf_counter() - imported)")
+    print(f"{'tables':>7} {'imports [s]':>12} {'parsers [s]':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        env: dict[str, str] = dict(os.environ, XDG_CACHE_HOME=directory, LOCALAPPDATA=directory)
+        def seconds() -> tuple[float, float]:
+            completed = subprocess.run([sys.executable, "-c", code], env=env, cwd=os.path.dirname(os.path.realpath(__file__)),
+                                       capture_output=True, text=True, check=True)
+            imports, parsers = completed.stdout.split()[-2:]
+            return float(imports), float(parsers)
+        for tables, runs in [("cold", 1), ("warm", args.repeat)]:
+            imports, parsers = min([seconds() for _ in range(runs)], key=sum)
+            print(f"{tables:>7} {imports:>12.3f} {parsers:>12.3f}")
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="OMSI Map Merger benchmarks on synthetic data.")
+    subparsers = arg_parser.add_subparsers(required=True)
+
+    tile_parse = subparsers.add_parser("tile_parse", help="Parse time of synthetic tiles, should grow linearly with number of objects.")
+    tile_parse.add_argument("--objects", type=int, nargs='+', default=[1000, 10000, 50000])
+    tile_parse.add_argument("--engines", type=lambda name: tile_parser.TileParserEngine[name], nargs='+',
+                            default=list(tile_parser.TileParserEngine), metavar="ENGINE")
+    tile_parse.add_argument("--repeat", type=int, default=1)
+    tile_parse.set_defaults(function=bench_tile_parse)
+
+    map_load = subparsers.add_parser("map_load", help="Load time of synthetic maps with OmsiMapMerger.load_maps.")
+    map_load.add_argument("--maps", type=int, default=2)
+    map_load.add_argument("--tiles", type=int, default=16, help="tiles per map")
+    map_load.add_argument("--objects", type=int, default=2000, help="objects per tile")
+    map_load.add_argument("--workers", type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    map_load.add_argument("--cache", action='store_true', help="load with cold, then warm parse cache")
+    map_load.add_argument("--repeat", type=int, default=1)
+    map_load.set_defaults(function=bench_map_load)
+
+    merge_save = subparsers.add_parser("merge_save", help="Time and peak memory of loading, merging and saving synthetic maps, eager and with lazy tiles.")
+    merge_save.add_argument("--maps", type=int, default=2)
+    merge_save.add_argument("--tiles", type=int, default=16, help="tiles per map")
+    merge_save.add_argument("--objects", type=int, default=20000, help="objects per tile")
+    merge_save.add_argument("--workers", type=int, nargs='+', default=[1, os.cpu_count() or 1], help="workers saving tiles")
+    merge_save.add_argument("--memory", action='store_true', help="also trace peak memory of main process, in separate, much slower run")
+    merge_save.set_defaults(function=bench_merge_save)
+
+    tile_serialize = subparsers.add_parser("tile_serialize", help="Throughput of tile serializer, encoding whole tile at once and printing lines one by one.")
+    tile_serialize.add_argument("--objects", type=int, nargs='+', default=[10000, 50000])
+    tile_serialize.add_argument("--repeat", type=int, default=3)
+    tile_serialize.set_defaults(function=bench_tile_serialize)
+
+    tile_shift = subparsers.add_parser("tile_shift", help="Time of shifting ids of synthetic tile, copying elements and with columnar ids (and of building columns).")
+    tile_shift.add_argument("--objects", type=int, nargs='+', default=[10000, 100000])
+    tile_shift.add_argument("--repeat", type=int, default=3)
+    tile_shift.set_defaults(function=bench_tile_shift)
+
+    object_memory = subparsers.add_parser("object_memory", help="Memory taken by tile elements, in bytes per object.")
+    object_memory.add_argument("--objects", type=int, default=50000)
+    object_memory.set_defaults(function=bench_object_memory)
+
+    startup = subparsers.add_parser("startup", help="Time of importing modules starter depends on and of creating all parsers, with cold and warm parse tables cache.")
+    startup.add_argument("--repeat", type=int, default=3)
+    startup.set_defaults(function=bench_startup)
+
+    grammar_parse = subparsers.add_parser("grammar_parse", help="Parse time of synthetic files of every format with LR parser, and with GLR parser used before.")
+    grammar_parse.add_argument("--objects", type=int, default=40, help="objects of tile and chrono tile, 1/4 of that many station links and AI groups")
+    grammar_parse.add_argument("--repeat", type=int, default=1)
+    grammar_parse.set_defaults(function=bench_grammar_parse)
+
+    args = arg_parser.parse_args()
+    args.function(args)
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,8 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import copy
+
 class Busstop:
     def __init__(self,
                  name: str,
@@ -32,6 +34,12 @@ class Busstop:
         self.line4: str = line4
         self.line5: str = line5
         self.subname: str = subname
+    
+    def shifted_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> 'Busstop':# other attributes are shared with self
+        shifted: Busstop = copy.copy(self)
+        shifted.tile_index = self.tile_index + tile_indices_value
+        shifted.id = self.id + ids_value
+        return shifted
 
 class Busstops:
     def __init__(self,
@@ -42,7 +50,5 @@ class Busstops:
         self.comment2: str = comment2
         self.busstops: list[Busstop] = busstops
     
-    def change_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int):
-        for busstop in self.busstops:
-            busstop.tile_index += tile_indices_value
-            busstop.id += ids_value
+    def shifted_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> 'Busstops':
+        return Busstops(self.comment1, self.comment2, [busstop.shifted_ids_and_tile_indices(ids_value, tile_indices_value) for busstop in self.busstops])
@@ -15,7 +15,10 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import file_decoder
 import parglare
+import parse_tables
+import grammar_actions
 import busstops
 import os
 
@@ -36,15 +39,15 @@ class BusstopsParser:
                                                         line5=n[6],
                                                         subname=n[7]
                                                         )],
-        "BUSSTOP_GROUP_LIST": [lambda _, n: [n[0]],
-                               lambda _, n: n[0] + [n[1]]]
+        "BUSSTOP_GROUP_LIST": [grammar_actions.list_first,
+                               grammar_actions.list_append]
     }
     def __init__(self):
         self.grammar = parglare.Grammar.from_file(os.path.join(os.path.dirname(os.path.realpath(__file__)), "busstops_grammar.pg"))
         self.parser = parglare.Parser(self.grammar,
                                       actions=self.actions,
-                                      ws="\r")
+                                      ws="\r",
+                                      table=parse_tables.table(self.grammar))
     def parse(self, file_name):
-        with open(file_name, encoding="iso-8859-1") as f:
-            content = f.read()
+        content = file_decoder.decoded(file_name, ["iso-8859-1"])
         return self.parser.parse(content)
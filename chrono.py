@@ -24,18 +24,23 @@ import chrono_tile_serializer
 import timetable
 import omsi_files
 import os
-import glob
+import directory_index
 import pathlib
+import lazy_instance
 import loader
+import parse_cache
 import logging
 
 logger = logging.getLogger(__name__)
 
 CHRONO_DIRNAME: str = 'Chrono'
 
-_chrono_tile_parser = chrono_tile_parser.ChronoTileParser()
+_chrono_tile_parser = lazy_instance.LazyInstance(chrono_tile_parser.ChronoTileParser)
 _chrono_tile_serializer = chrono_tile_serializer.ChronoTileSerializer()
 
+def parse_chrono_tile(path: str) -> chrono_tile.ChronoTile:# picklable true loader for loader.ParallelLoader
+    return _chrono_tile_parser.get().parse(path)
+
 class ChronoTileInfo:
     def __init__(self,
                  directory: str,
@@ -60,40 +65,49 @@ class Chrono:
         self.omsi_files: omsi_files.OmsiFiles = comsi_files
         self.timetable: timetable.Timetable = ctimetable
     
-    def change_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> None:
-        for chrono_tiles_info in self.chrono_tiles_info:
-            chrono_tiles_info.tile.change_ids(ids_value)
-        self.timetable.change_ids_and_tile_indices(ids_value, tile_indices_value)
+    def shifted_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> 'Chrono':# unchanged parts are shared with self
+        return Chrono(self.chrono_directory,
+                      [ChronoTileInfo(chrono_tiles_info.directory, chrono_tiles_info.pos_x, chrono_tiles_info.pos_y, chrono_tiles_info.tile.shifted_ids(ids_value))
+                       for chrono_tiles_info in self.chrono_tiles_info],
+                      self.omsi_files,
+                      self.timetable.shifted_ids_and_tile_indices(ids_value, tile_indices_value))
     
-    def save(self, map_directory: str) -> None:
+    def save(self,
+             map_directory: str,
+             placement: omsi_files.FilePlacement = omsi_files.FilePlacement.COPY,
+             placer: omsi_files.FilesPlacer | None = None,
+             ) -> omsi_files.PlacementSummary:
         joined_directory: str = os.path.join(map_directory, self.chrono_directory)
         pathlib.Path(os.path.join(joined_directory, self.chrono_directory)).mkdir(parents=True)
-        self.omsi_files.save(map_directory)
+        summary: omsi_files.PlacementSummary = self.omsi_files.save(map_directory, placement, placer)
         for chrono_tile in self.chrono_tiles_info:
             file_path: str = os.path.join(joined_directory, f'tile_{chrono_tile.pos_x}_{chrono_tile.pos_y}.map')
             logger.info(f"Serializing chrono tile file {file_path}...")
             _chrono_tile_serializer.serialize(chrono_tile.tile, file_path)
         self.timetable.save(joined_directory)
+        return summary
 
 class ChronoSl(loader.SafeLoaderList):
     def __init__(self,
                  map_directory: str,
                  chrono_directory: str,
                  gc_map: list[global_config.Map],
+                 cache: parse_cache.ParseCache | None = None,
                  ):
         self.map_directory: str = map_directory
         self.chrono_directory: str = chrono_directory
         self.gc_map: list[global_config.Map] = gc_map
+        self.cache: parse_cache.ParseCache | None = cache
         self.chrono_translations = omsi_files.OmsiFiles()
-        self.chrono_tiles: loader.SafeLoaderList = loader.SafeLoaderList(list(map(lambda tile: loader.SafeLoaderUnit(chrono_tile.ChronoTile, os.path.join(map_directory, self.chrono_directory, tile.map_file), _chrono_tile_parser.parse, optional=True), self.gc_map)), "Chrono tiles")
-        self.timetable: timetable.TimetableSl = timetable.TimetableSl(os.path.join(self.map_directory, self.chrono_directory))
+        self.chrono_tiles: loader.SafeLoaderList = loader.SafeLoaderList(list(map(lambda tile: loader.SafeLoaderUnit(chrono_tile.ChronoTile, os.path.join(map_directory, self.chrono_directory, tile.map_file), parse_cache.cached(parse_chrono_tile, self.cache), optional=True), self.gc_map)), "Chrono tiles")
+        self.timetable: timetable.TimetableSl = timetable.TimetableSl(os.path.join(self.map_directory, self.chrono_directory), cache=self.cache)
         super().__init__([self.chrono_tiles],
                          self.chrono_directory,
                          omsi_files.OmsiFiles(self.__all_omsi_files()),
                          )
     
     def __lang_files_names(self):
-        return [os.path.relpath(x, self.map_directory) for x in glob.glob(os.path.join(self.map_directory, self.chrono_directory, "Chrono_*.dsc"))]
+        return directory_index.of(self.map_directory).files(self.chrono_directory, "Chrono_*.dsc")
     
     def __all_files_names(self):
         return [os.path.join(self.chrono_directory, "Chrono.cfg")] + self.__lang_files_names()
@@ -107,10 +121,17 @@ class ChronoSl(loader.SafeLoaderList):
     def get_chrono_tiles(self):
         return self.chrono_tiles
     
-    def load(self):
+    def load(self, pool: loader.ParallelLoader | None = None, progress: loader.LoadProgress | None = None):
+        directory_index.of(self.map_directory).refresh(self.chrono_directory)
+        super().get_omsi_files().set_omsi_files(self.__all_omsi_files())
+        super().load(pool, progress)
+        self.get_timetable().load(pool, progress)
+    
+    def reload(self, pool: loader.ParallelLoader | None = None, progress: loader.LoadProgress | None = None):
+        directory_index.of(self.map_directory).refresh(self.chrono_directory)
         super().get_omsi_files().set_omsi_files(self.__all_omsi_files())
-        super().load()
-        self.get_timetable().load()
+        super().reload(pool, progress)
+        self.get_timetable().reload(pool, progress)
     
     def get_data(self) -> Chrono:
         if not self.ready():
@@ -15,6 +15,7 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import copy
 import tile
 import typing
 
@@ -37,14 +38,23 @@ class ChronoTile:
         self.version: str = version
         self.elements_list: list[Select | tile.Spline | tile._Object | tile.SplineAttachement | tile.SplineAttachementRepeater] = elements_list
 
-    def change_ids(self, value: int) -> None:
-        for entry in self.elements_list:
-            entry.id += value
-            if type(entry) == tile.Spline:
-                entry.id_previous += value
-                entry.id_next += value
-            elif any(map(lambda valid_type: type(entry) == valid_type, [tile._Object, tile.SplineAttachement, tile.SplineAttachementRepeater])):
-                entry_object: tile._Object | tile.SplineAttachement | tile.SplineAttachementRepeater \
-                    = typing.cast(tile._Object | tile.SplineAttachement | tile.SplineAttachementRepeater, entry)
-                if entry_object.varparent is not None:
-                    entry_object.varparent += value
+    def objects_count(self) -> int:# changed splines and objects, and selections
+        return len(self.elements_list)
+
+    def shifted_ids(self, value: int) -> 'ChronoTile':# unchanged parts are shared with self
+        return ChronoTile(self.initial_comment, self.version, [_shifted_entry_ids(entry, value) for entry in self.elements_list])
+
+def _shifted_entry_ids[E: Select | tile.Spline | tile._Object | tile.SplineAttachement | tile.SplineAttachementRepeater](entry: E, value: int) -> E:
+    shifted: E = copy.copy(entry)
+    shifted.id = entry.id + value
+    if type(entry) == tile.Spline:
+        # unlike in tile, 0 (no previous/next spline) is shifted too
+        shifted_spline: tile.Spline = typing.cast(tile.Spline, shifted)
+        shifted_spline.id_previous += value
+        shifted_spline.id_next += value
+    elif any(map(lambda valid_type: type(entry) == valid_type, [tile._Object, tile.SplineAttachement, tile.SplineAttachementRepeater])):
+        shifted_object: tile._Object | tile.SplineAttachement | tile.SplineAttachementRepeater \
+            = typing.cast(tile._Object | tile.SplineAttachement | tile.SplineAttachementRepeater, shifted)
+        if shifted_object.varparent is not None:
+            shifted_object.varparent += value
+    return shifted
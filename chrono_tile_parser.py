@@ -15,7 +15,10 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import file_decoder
 import parglare
+import parse_tables
+import grammar_actions
 import chrono_tile
 import tile_parser
 import os
@@ -38,9 +41,9 @@ class ChronoTileParser():
                          lambda _, n: False],
         "SPLINE_GROUP": tile_parser.TileParser.actions["SPLINE_GROUP"],
         "SPLINE_H_GROUP": tile_parser.TileParser.actions["SPLINE_H_GROUP"],
-        "LINES": [lambda _, n: [n[0]],
-                  lambda _, n: n[0] + [n[1]]],
-        "SPLINE_TERRAIN_ALGIN_GROUP": [lambda _, n: True],
+        "LINES": [grammar_actions.list_first,
+                  grammar_actions.list_append],
+        "SPLINE_TERRAIN_ALIGN_GROUP": [lambda _, n: True],
         "OBJECT_HEADER_GROUP": [lambda _, n: False,
                                 lambda _, n: True],
         "OBJECT_GROUP": tile_parser.TileParser.actions["OBJECT_GROUP"],
@@ -49,34 +52,37 @@ class ChronoTileParser():
         "VARPARENT_GROUP": [lambda _, n: n[1]],
         "RULE_GROUP": tile_parser.TileParser.actions["RULE_GROUP"],
         "KILL_RULE_GROUP": tile_parser.TileParser.actions["KILL_RULE_GROUP"],
-        "RULE_GROUP_LIST": [lambda _, n: [n[0]],
-                            lambda _, n: [n[0]],
-                            lambda _, n: n[0] + [n[1]],
-                            lambda _, n: n[0] + [n[1]]],
+        "RULE_GROUP_LIST": [grammar_actions.list_first,
+                            grammar_actions.list_first,
+                            grammar_actions.list_append,
+                            grammar_actions.list_append],
         "OPTIONAL_LINE": [lambda _, n: "",
                           lambda _, n: n[0]],
         
-        "GROUP_LIST": [lambda _, n: [n[0]],
-                       lambda _, n: [n[0]],
-                       lambda _, n: [n[0]],
-                       lambda _, n: [n[0]],
-                       lambda _, n: [n[0]],
-                       lambda _, n: [n[0]],
-                       lambda _, n: n[0] + [n[1]],
-                       lambda _, n: n[0] + [n[1]],
-                       lambda _, n: n[0] + [n[1]],
-                       lambda _, n: n[0] + [n[1]],
-                       lambda _, n: n[0] + [n[1]],
-                       lambda _, n: n[0] + [n[1]]],
+        "GROUP_LIST": [grammar_actions.list_first,
+                       grammar_actions.list_first,
+                       grammar_actions.list_first,
+                       grammar_actions.list_first,
+                       grammar_actions.list_first,
+                       grammar_actions.list_first,
+                       grammar_actions.list_append,
+                       grammar_actions.list_append,
+                       grammar_actions.list_append,
+                       grammar_actions.list_append,
+                       grammar_actions.list_append,
+                       grammar_actions.list_append],
         
-		"NONEMPTY_LINE": [lambda _, n: n[0]]
+		"NONEMPTY_LINE": [lambda _, n: n[0]],
+        "OBJECT_COMMENT": tile_parser.TileParser.actions["OBJECT_COMMENT"],
+        "TERMINATED_LINES": tile_parser.TileParser.actions["TERMINATED_LINES"],
+        "UNTERMINATED_LINES": tile_parser.TileParser.actions["UNTERMINATED_LINES"]
     }
     def __init__(self):
         self.grammar = parglare.Grammar.from_file(os.path.join(os.path.dirname(os.path.realpath(__file__)), "chrono_tile_grammar.pg"))
-        self.parser = parglare.GLRParser(self.grammar,
-                                         actions=self.actions,
-                                         ws="\r")
+        self.parser = parglare.Parser(self.grammar,
+                                      actions=self.actions,
+                                      ws="\r",
+                                      table=parse_tables.table(self.grammar))
     def parse(self, file_name):
-        with open(file_name, encoding="utf_16") as f:
-            content = f.read()
-        return self.parser.parse(content)[0]
+        content = file_decoder.decoded(file_name, ["utf_16"])
+        return self.parser.parse(content)
@@ -0,0 +1,79 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import pytest
+import chrono_tile
+import chrono_tile_parser
+import chrono_tile_serializer
+import tile
+
+@pytest.fixture(scope="module")
+def parser() -> chrono_tile_parser.ChronoTileParser:
+    return chrono_tile_parser.ChronoTileParser()
+
+def serialized(t: chrono_tile.ChronoTile) -> str:
+    f = io.StringIO()
+    chrono_tile_serializer.ChronoTileSerializer().serialize_(t, f)
+    return f.getvalue()
+
+def some_object(description: str, id: int, opt_lines: list[str] | None, rule_list: list[tile.Rule] | None) -> tile._Object:
+    return tile._Object(description, False, '0', 'Sceneryobjects\\Signs\\sign.sco', id, '1', '2', '3', '4', '5', '6', '0', opt_lines, None, None, rule_list)
+
+def some_splineattachement(description: str, id: int, opt_lines: list[str] | None) -> tile.SplineAttachement:
+    return tile.SplineAttachement(description, '0', 'Sceneryobjects\\Busz.sco', id, '0', '1', '2', '3', '4', '5', '6', '7', '8', '0', '1', opt_lines, None, None, None)
+
+def chrono_tiles_corpus() -> list[chrono_tile.ChronoTile]:
+    return [
+        chrono_tile.ChronoTile("Empty chrono tile", '14', []),
+        chrono_tile.ChronoTile("Comments before objects", '14',
+                               [chrono_tile.Select(False, 5, ['1', '']),
+                                some_object('Object Nr. 1', 1, ['2', 'Text'], None),
+                                some_object('[rule]', 2, None, None),# comment looking like a rule header
+                                some_splineattachement('Object Nr. 3', 3, ['mirror'])]),
+        chrono_tile.ChronoTile("Trailing empty lines", '14',
+                               [some_object('Object Nr. 1', 1, ['2', 'Text 1', '', ''], None),
+                                some_object('Object Nr. 2', 2, ['', ''], [tile.Rule(False, '0', '', 'sign.sco', '1')]),
+                                some_splineattachement('Object Nr. 3', 3, ['', 'Text 1', '', ''])]),
+        chrono_tile.ChronoTile("Rule line after nonempty line", '14',
+                               [some_object('Object Nr. 1', 1, ['2', '[rule]', '[kill_rule]'], [tile.Rule(True, '2', '3', '', '4')])]),
+    ]
+
+def assert_elements_equal(parsed: chrono_tile.ChronoTile, original: chrono_tile.ChronoTile) -> None:
+    assert len(parsed.elements_list) == len(original.elements_list)
+    for parsed_entry, original_entry in zip(parsed.elements_list, original.elements_list):
+        assert type(parsed_entry) == type(original_entry)
+        if isinstance(original_entry, chrono_tile.Select):
+            assert vars(parsed_entry) == vars(original_entry)
+        else:
+            assert parsed_entry == original_entry
+
+@pytest.mark.parametrize("original", chrono_tiles_corpus(), ids=lambda t: t.initial_comment)
+def test_round_trip(original, parser) -> None:
+    content: str = serialized(original)
+    parsed: chrono_tile.ChronoTile = parser.parser.parse(content)
+    assert (parsed.initial_comment, parsed.version) == (original.initial_comment, original.version)
+    assert_elements_equal(parsed, original)
+    assert serialized(parsed) == content
+
+@pytest.mark.parametrize("rule_header, kill", [("[rule]", False), ("[kill_rule]", True)])
+def test_rule_after_empty_line(rule_header, kill, parser) -> None:# starts a rule group, not an extra line of the object
+    content: str = "Chrono\n\n[version]\n14\n\nObject Nr. 1\n[object]\n0\nsign.sco\n1\n1\n2\n3\n4\n5\n6\n0\n2\n\n" \
+        + rule_header + "\na\nb\nc\nd\n\n"
+    parsed: chrono_tile.ChronoTile = parser.parser.parse(content)
+    assert parsed.elements_list == [tile._Object('Object Nr. 1', False, '0', 'sign.sco', 1, '1', '3', '2', '4', '5', '6', '0', ['2'], None, None,
+                                                 [tile.Rule(kill, 'a', 'b', 'c', 'd')])]
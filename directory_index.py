@@ -0,0 +1,106 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+# Listings of directories of a map, every directory is scanned once with
+# os.scandir, when its first file is looked up, instead of checking every
+# file separately (slow on network drives). refresh() drops listings, eg.
+# before map is loaded or saved again. There is one index per directory in
+# every process, pickled index is only its directory.
+
+import fnmatch
+import os
+import threading
+
+_indexes: dict[str, 'DirectoryIndex'] = {}
+_indexes_lock = threading.Lock()
+
+def of(directory: str) -> 'DirectoryIndex':
+    key: str = os.path.abspath(directory)
+    with _indexes_lock:
+        if key not in _indexes:
+            real_directory: str = os.path.realpath(directory)
+            if real_directory not in _indexes:
+                _indexes[real_directory] = DirectoryIndex(real_directory)
+            _indexes[key] = _indexes[real_directory]
+        return _indexes[key]
+
+def refresh_all() -> None:
+    with _indexes_lock:
+        indexes: set[DirectoryIndex] = set(_indexes.values())
+    for index in indexes:
+        index.refresh()
+
+def _key(path: str) -> str:# case insensitive on Windows, like the file system
+    return os.path.normcase(os.path.normpath(path))
+
+def _glob_match(name: str, pattern: str) -> bool:# like glob, "*" does not match hidden files
+    return fnmatch.fnmatch(name, pattern) and (not name.startswith('.') or pattern.startswith('.'))
+
+class DirectoryIndex:
+    def __init__(self, real_directory: str) -> None:
+        self.real_directory: str = real_directory
+        self.__listings: dict[str, dict[str, tuple[str, bool, bool]]] = {}# directory: {name: (name as on disk, is file, is directory)}
+        self.__lock = threading.Lock()
+    
+    def __reduce__(self):
+        return (of, (self.real_directory,))
+    
+    def refresh(self, relative_directory: str | None = None) -> None:# None refreshes all directories
+        with self.__lock:
+            if relative_directory is None:
+                self.__listings.clear()
+            else:
+                self.__listings.pop(_key(relative_directory), None)
+    
+    def __listing(self, relative_directory: str) -> dict[str, tuple[str, bool, bool]]:
+        key: str = _key(relative_directory)
+        with self.__lock:
+            if key not in self.__listings:
+                listing: dict[str, tuple[str, bool, bool]] = {}
+                try:
+                    with os.scandir(os.path.join(self.real_directory, relative_directory)) as it:
+                        for entry in it:
+                            listing[os.path.normcase(entry.name)] = (entry.name, entry.is_file(), entry.is_dir())
+                except (FileNotFoundError, NotADirectoryError):
+                    pass
+                self.__listings[key] = listing
+            return self.__listings[key]
+    
+    def real_path(self, relative_path: str) -> str:
+        return os.path.join(self.real_directory, os.path.normpath(relative_path))
+    
+    def isfile(self, relative_path: str) -> bool:
+        directory, name = os.path.split(os.path.normpath(relative_path))
+        entry: tuple[str, bool, bool] | None = self.__listing(directory).get(os.path.normcase(name))
+        return entry is not None and entry[1]
+    
+    def isfile_real(self, real_path: str) -> bool:# files outside of indexed directory are checked directly
+        try:
+            relative_path: str = os.path.relpath(real_path, self.real_directory)
+        except ValueError:# other drive
+            return os.path.isfile(real_path)
+        if relative_path == os.pardir or relative_path.startswith(os.pardir + os.sep) or os.path.isabs(relative_path):
+            return os.path.isfile(real_path)
+        return self.isfile(relative_path)
+    
+    def files(self, relative_directory: str, pattern: str = "*") -> list[str]:# relative to indexed directory
+        return [os.path.join(relative_directory, name) for name, is_file, _ in self.__listing(relative_directory).values()
+                if is_file and _glob_match(name, pattern)]
+    
+    def directories(self, relative_directory: str, pattern: str = "*") -> list[str]:# relative to indexed directory
+        return [os.path.join(relative_directory, name) for name, _, is_dir in self.__listing(relative_directory).values()
+                if is_dir and _glob_match(name, pattern)]
@@ -0,0 +1,44 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pickle
+import directory_index
+
+def test_directory_index(tmp_path) -> None:
+    for file in ["global.cfg", "Holidays_de.txt", "Holidays_pl.txt", ".Holidays_x.txt", os.path.join("Chrono", "Winter", "Chrono_de.dsc")]:
+        os.makedirs(os.path.dirname(tmp_path / file), exist_ok=True)
+        (tmp_path / file).write_bytes(b"")
+    index: directory_index.DirectoryIndex = directory_index.of(str(tmp_path))
+    index.refresh()
+    assert index.isfile("global.cfg")
+    assert not index.isfile("Chrono")
+    assert not index.isfile(os.path.join("not_existing", "global.cfg"))
+    assert sorted(index.files("", "Holidays_*.txt")) == ["Holidays_de.txt", "Holidays_pl.txt"]
+    assert index.directories("Chrono") == [os.path.join("Chrono", "Winter")]
+    assert index.files(os.path.join("Chrono", "Winter"), "Chrono_*.dsc") == [os.path.join("Chrono", "Winter", "Chrono_de.dsc")]
+    assert index.isfile_real(os.path.join(os.path.realpath(tmp_path), "global.cfg"))
+    
+    (tmp_path / "ailists.cfg").write_bytes(b"")
+    assert not index.isfile("ailists.cfg")# listed before
+    index.refresh()
+    assert index.isfile("ailists.cfg")
+
+def test_directory_index_shared(tmp_path) -> None:# one index per directory in process, also after pickling
+    index: directory_index.DirectoryIndex = directory_index.of(str(tmp_path))
+    assert directory_index.of(str(tmp_path / "texture" / os.pardir)) is index
+    assert pickle.loads(pickle.dumps(index)) is index
@@ -15,19 +15,103 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+# File is read once and decoded once, with encoding chosen from candidates
+# by byte order mark, or, without it, by zero bytes in sample (ASCII text in
+# UTF-16 has every second byte zero). If decoding with chosen encoding fails,
+# other candidates are tried. Newlines are translated like by open() in text
+# mode. Time spent decoding is summed per thread, see decoding_seconds().
+
+import codecs
+import contextlib
+import io
 import logging
+import mmap
+import os
+import threading
+import time
+import typing
 
 logger = logging.getLogger(__name__)
 
-def decoded(file_name: str, encodings: list[str]) -> str:
-    for encoding in encodings:
-        activity_description: str = f"reading file \"{file_name}\" with encoding  \"{encoding}\"."
+type Buffer = bytes | bytearray | memoryview | mmap.mmap
+
+SAMPLE_SIZE: int = 4096
+CHUNK_SIZE: int = 1024 ** 2 # bytes decoded at once by decoded_lines
+
+_decoding = threading.local()
+
+def decoding_seconds() -> float:# spent decoding by this thread so far, difference of two calls is time of decoding between them
+    return getattr(_decoding, "seconds", 0.0)
+
+def _add_decoding_seconds(start: float) -> None:
+    _decoding.seconds = decoding_seconds() + time.perf_counter() - start
+
+def _is_utf_16(encoding: str) -> bool:
+    return codecs.lookup(encoding).name.startswith("utf-16")
+
+def sniffed_encoding(data: Buffer, encodings: list[str]) -> str:
+    utf_16_candidate: bool = any([_is_utf_16(encoding) for encoding in encodings])
+    sample: bytes = bytes(data[:SAMPLE_SIZE])
+    if utf_16_candidate and (sample.startswith(codecs.BOM_UTF16_LE) or sample.startswith(codecs.BOM_UTF16_BE)):
+        return "utf_16"# BOM is removed when decoding
+    if sample.startswith(codecs.BOM_UTF8) and any([codecs.lookup(encoding).name.startswith("utf-8") for encoding in encodings]):
+        return "utf_8_sig"
+    if utf_16_candidate and len(sample) >= 2:
+        if sample[1::2].count(0) > len(sample) // 4:
+            return "utf_16_le"
+        if sample[0::2].count(0) > len(sample) // 4:
+            return "utf_16_be"
+    other_encodings: list[str] = [encoding for encoding in encodings if not _is_utf_16(encoding)]
+    return other_encodings[0] if other_encodings else encodings[0]
+
+def decoded_buffer(data: Buffer, encodings: list[str], name: str = "buffer") -> str:# data may be mmap of file
+    start: float = time.perf_counter()
+    try:
+        return _decoded_buffer(data, encodings, name)
+    finally:
+        _add_decoding_seconds(start)
+
+def _decoded_buffer(data: Buffer, encodings: list[str], name: str) -> str:
+    sniffed: str = sniffed_encoding(data, encodings)
+    for encoding in [sniffed] + [encoding for encoding in encodings if encoding != sniffed]:
+        activity_description: str = f"decoding {name} with encoding \"{encoding}\"."
         try:
-            with open(file_name, encoding=encoding) as f:
-                content = f.read()
-                logger.debug("Succeeded " + activity_description)
-                return content
+            content: str = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate=True).decode(data, final=True)
         except UnicodeError:
             logger.debug("Failed " + activity_description)
-    else:
-        raise UnicodeError(f"Tried to decode file with encodings: {", ".join(encodings)}, all failed.")
+            continue
+        logger.debug("Succeeded " + activity_description)
+        return content
+    raise UnicodeError(f"Tried to decode {name} with encodings: {", ".join(encodings)}, all failed.")
+
+
+@contextlib.contextmanager
+def mapped(file_name: str) -> typing.Iterator[Buffer]:
+    # read-only memory map of file, pages are read by OS when used and are not process' own memory
+    with open(file_name, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:# empty file can not be mapped
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            yield mapped_file
+
+def decoded_lines(data: Buffer, encoding: str) -> typing.Iterator[str]:
+    # content decoded chunk by chunk and split at "\n" (like str.split, so the
+    # last line is empty if content ends with line end), only one chunk is held
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate=True)
+    rest: str = ""
+    with memoryview(data) as view:
+        for chunk_start in range(0, len(view), CHUNK_SIZE):
+            start: float = time.perf_counter()
+            lines: list[str] = (rest + decoder.decode(view[chunk_start:chunk_start + CHUNK_SIZE])).split("\n")
+            rest = lines.pop()
+            _add_decoding_seconds(start)
+            yield from lines
+    start = time.perf_counter()
+    lines = (rest + decoder.decode(b"", final=True)).split("\n")
+    _add_decoding_seconds(start)
+    yield from lines
+
+def decoded(file_name: str, encodings: list[str]) -> str:# file is mapped, not read, so only decoded content is held
+    with mapped(file_name) as data:
+        return decoded_buffer(data, encodings, f"file \"{file_name}\"")
@@ -0,0 +1,43 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+import codecs
+import mmap
+import pytest
+import file_decoder
+
+TEXT: str = "[version]\r\n14\r\nZażółć\r\n"
+
+@pytest.mark.parametrize("data, encodings", [
+    (TEXT.encode("utf_16"), ["utf_16", "ascii"]),
+    (TEXT.encode("utf_16_le"), ["utf_16", "ascii"]),
+    (TEXT.encode("utf_16_be"), ["utf_16"]),
+    (codecs.BOM_UTF8 + TEXT.encode("utf_8"), ["utf_8"]),
+], ids=["utf_16 BOM", "utf_16_le", "utf_16_be", "utf_8 BOM"])
+def test_decoded_buffer(data, encodings) -> None:# newlines translated like by open() in text mode
+    assert file_decoder.decoded_buffer(data, encodings) == "[version]\n14\nZażółć\n"
+
+def test_decoded_buffer_fallback() -> None:# sniffed encoding fails, next candidate is used
+    assert file_decoder.sniffed_encoding(b"caf\xe9\r", ["ascii", "iso-8859-1"]) == "ascii"
+    assert file_decoder.decoded_buffer(b"caf\xe9\r", ["ascii", "iso-8859-1"]) == "café\n"
+    with pytest.raises(UnicodeError):
+        file_decoder.decoded_buffer(b"caf\xe9", ["ascii"])
+
+def test_decoded_mmap(tmp_path) -> None:
+    (tmp_path / "tile_0_0.map").write_bytes(TEXT.encode("utf_16"))
+    with open(tmp_path / "tile_0_0.map", 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        assert file_decoder.decoded_buffer(mapped, ["utf_16", "ascii"]) == "[version]\n14\nZażółć\n"
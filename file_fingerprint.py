@@ -0,0 +1,71 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+# Fingerprint of file tells if file changed since it was taken. Size and
+# mtime are compared only, content is hashed (when taken and when compared)
+# only if mtime was recent when taken, as file may still be changed within
+# the same mtime (mtime resolution of some file systems is 2 s). File whose
+# size or mtime changed is considered changed, parse cache tells if its
+# content is the same.
+
+import hashlib
+import os
+import time
+
+RACY_MTIME_NS: int = 2 * 10 ** 9
+
+def content_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=32)).hexdigest()
+
+def racy(mtime_ns: int) -> bool:# file may still be changed within the same mtime
+    return time.time_ns() - mtime_ns < RACY_MTIME_NS
+
+class FileFingerprint:
+    def __init__(self,
+                 size: int,
+                 mtime_ns: int,
+                 content_hash: str | None,# only if mtime was racy
+                 ) -> None:
+        self.size: int = size
+        self.mtime_ns: int = mtime_ns
+        self.content_hash: str | None = content_hash
+
+    def __key(self):
+        return (self.size, self.mtime_ns, self.content_hash)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, FileFingerprint) and self.__key() == other.__key()
+
+    def __hash__(self) -> int:
+        return hash(self.__key())
+
+def fingerprint(path: str) -> FileFingerprint | None:# None if file does not exist
+    try:
+        stat: os.stat_result = os.stat(path)
+        return FileFingerprint(stat.st_size, stat.st_mtime_ns, content_hash(path) if racy(stat.st_mtime_ns) else None)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+def unchanged(previous: FileFingerprint | None, path: str) -> bool:
+    try:
+        stat: os.stat_result = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return previous is None
+    if previous is None or previous.size != stat.st_size or previous.mtime_ns != stat.st_mtime_ns:
+        return False
+    return previous.content_hash is None or previous.content_hash == content_hash(path)
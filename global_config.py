@@ -15,6 +15,8 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import copy
+
 class BackgroundImage:
     def __init__(self,
                  num1="",
@@ -132,6 +134,12 @@ class Entrypoints:
     
     def __repr__(self) -> str:
         return type(self).__name__ + str(self.__key())
+    
+    def shifted_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> 'Entrypoints':# other attributes are shared with self
+        shifted: Entrypoints = copy.copy(self)
+        shifted.id = self.id + ids_value
+        shifted.tile_index = self.tile_index + tile_indices_value
+        return shifted
 
 class Map:
     def __init__(self,
@@ -205,7 +213,8 @@ class GlobalConfig:
         self.entrypoints = entrypoints
         self._map = _map
         
-    def change_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int):
-        for entrypoint in self.entrypoints:
-            entrypoint.id = str(int(entrypoint.id) + int(ids_value))
-            entrypoint.tile_index = str(int(entrypoint.tile_index) + int(tile_indices_value))
+    def shifted_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> 'GlobalConfig':# unchanged parts are shared with self
+        shifted: GlobalConfig = copy.copy(self)
+        if self.entrypoints is not None:
+            shifted.entrypoints = [entrypoint.shifted_ids_and_tile_indices(ids_value, tile_indices_value) for entrypoint in self.entrypoints]
+        return shifted
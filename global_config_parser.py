@@ -15,7 +15,10 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import file_decoder
 import parglare
+import parse_tables
+import grammar_actions
 import global_config
 import os
 
@@ -49,8 +52,8 @@ class GlobalConfigParser():
         "NAME_GROUP": [lambda _, n: n[1]],
         "FRIENDLYNAME_GROUP": [lambda _, n: n[1]],
         "DESCRIPTION_GROUP": [lambda _, n: n[1]],
-        "LINES": [lambda _, n: [n[0]],
-                  lambda _, n: n[0] + [n[1]]],
+        "LINES": [grammar_actions.list_first,
+                  grammar_actions.list_append],
         "DESCRIPTION_LINE": [lambda _, n: "",
                              lambda _, n: n[0]],
         "VERSION_GROUP": [lambda _, n: n[1]],
@@ -88,25 +91,25 @@ class GlobalConfigParser():
                                                                  num2=n[4],
                                                                  num3=n[5]
                                                                  )],
-        "GROUNDTEX_GROUP_LIST": [lambda _, n: [n[0]],
-                                 lambda _, n: n[0] + [n[1]]],
+        "GROUNDTEX_GROUP_LIST": [grammar_actions.list_first,
+                                 grammar_actions.list_append],
         "ADDSEASON_GROUP": [lambda _, n: global_config.AddSeason(description=n[0],
                                                                  num1=n[2],
                                                                  num2=n[3],
                                                                  num3=n[4]
                                                                  )],
-        "ADDSEASON_GROUP_LIST": [lambda _, n: [n[0]],
-                                 lambda _, n: n[0] + [n[1]]],
+        "ADDSEASON_GROUP_LIST": [grammar_actions.list_first,
+                                 grammar_actions.list_append],
         "TRAFFICDENSITY_ROAD_GROUP": [lambda _, n: global_config.Trafficdensity(num1=n[1],
                                                                                 num2=n[2]
                                                                                 )],
-        "TRAFFICDENSITY_ROAD_GROUP_LIST": [lambda _, n: [n[0]],
-                                           lambda _, n: n[0] + [n[1]]],
+        "TRAFFICDENSITY_ROAD_GROUP_LIST": [grammar_actions.list_first,
+                                           grammar_actions.list_append],
         "TRAFFICDENSITY_PASSENGER_GROUP": [lambda _, n: global_config.Trafficdensity(num1=n[1],
                                                                                      num2=n[2]
                                                                                      )],
-        "TRAFFICDENSITY_PASSENGER_GROUP_LIST": [lambda _, n: [n[0]],
-                                                lambda _, n: n[0] + [n[1]]],
+        "TRAFFICDENSITY_PASSENGER_GROUP_LIST": [grammar_actions.list_first,
+                                                grammar_actions.list_append],
         "ENTRYPOINTS_GROUP": [lambda _, n: global_config.Entrypoints(object_on_tile_index=n[0],
                                                                      id=int(n[1]),
                                                                      line3=n[2],
@@ -120,15 +123,15 @@ class GlobalConfigParser():
                                                                      tile_index=int(n[10]),
                                                                      name=n[11],
                                                                      )],
-        "ENTRYPOINTS_GROUP_LIST_": [lambda _, n: [n[0]],
-                                    lambda _, n: n[0] + [n[1]]],
+        "ENTRYPOINTS_GROUP_LIST_": [grammar_actions.list_first,
+                                    grammar_actions.list_append],
         "ENTRYPOINTS_GROUP_LIST": [lambda _, n:n[2]],
         "MAP_GROUP": [lambda _, n: global_config.Map(pos_x=int(n[1]),
                                                      pos_y=int(n[2]),
                                                      map_file=n[3]
                                                      )],
-        "MAP_GROUP_LIST": [lambda _, n: [n[0]],
-                           lambda _, n: n[0] + [n[1]]],
+        "MAP_GROUP_LIST": [grammar_actions.list_first,
+                           grammar_actions.list_append],
         "OPTIONAL_LINE": [lambda _, n: "",
                           lambda _, n: n[0]],
         "OPTIONAL_STRANGE_LINE": [lambda _, n: "",
@@ -141,9 +144,9 @@ class GlobalConfigParser():
         self.grammar = parglare.Grammar.from_file(os.path.join(os.path.dirname(os.path.realpath(__file__)), "global_config_grammar.pg"))
         self.parser = parglare.Parser(self.grammar,
                                       actions=self.actions,
-                                      ws="\r")
+                                      ws="\r",
+                                      table=parse_tables.table(self.grammar))
 
     def parse(self, file_name):
-        with open(file_name, encoding="utf_16") as f:
-            content = f.read()
+        content = file_decoder.decoded(file_name, ["utf_16"])
         return self.parser.parse(content)
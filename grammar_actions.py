@@ -0,0 +1,38 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+# Semantic actions building lists for left recursive rules like
+#   LIST: ITEM | LIST ITEM;
+# without copying the whole list on every reduction.
+
+# LR parsers (parglare.Parser) consume every reduction result exactly once,
+# so the list can be extended in place.
+
+def list_first(_, n) -> list:
+    return [n[0]]
+
+def list_append(_, n) -> list:
+    n[0].append(n[1])
+    return n[0]
+
+def list_append_empty(_, n) -> list:# LIST line_end, empty line as ""
+    n[0].append("")
+    return n[0]
+
+def terminated_lines(lines: list[str]) -> list[str] | None:# without the empty line ending them, None if no lines are left
+    lines.pop()
+    return lines if lines else None
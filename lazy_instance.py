@@ -0,0 +1,58 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+# Instances expensive to create (parsers build grammars and parse tables),
+# created on first use, at most once per process.
+
+import os
+import threading
+import typing
+import weakref
+
+_instances: weakref.WeakSet = weakref.WeakSet()
+
+class LazyInstance[T]:
+    def __init__(self, factory: typing.Callable[[], T]) -> None:
+        self.factory: typing.Callable[[], T] = factory
+        self.__instance: T | None = None
+        self.__lock = threading.Lock()
+        _instances.add(self)
+
+    def get(self) -> T:
+        instance: T | None = self.__instance
+        if instance is None:
+            with self.__lock:
+                if self.__instance is None:
+                    self.__instance = self.factory()
+                instance = self.__instance
+        return instance
+
+    def created(self) -> bool:
+        return self.__instance is not None
+
+    def _after_fork(self) -> None:# lock may have been held by thread which does not exist in child process
+        self.__lock = threading.Lock()
+
+    def __reduce__(self):# instance is not sent to other processes, they create their own
+        return (LazyInstance, (self.factory,))
+
+def _after_fork_in_child() -> None:
+    for instance in list(_instances):
+        instance._after_fork()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,51 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+import concurrent.futures
+import os
+import pickle
+import subprocess
+import sys
+import threading
+import time
+import lazy_instance
+
+def test_created_once_by_concurrent_threads() -> None:
+    calls: list[int] = []
+    def factory() -> object:
+        calls.append(threading.get_ident())
+        time.sleep(0.05)
+        return object()
+    lazy = lazy_instance.LazyInstance(factory)
+    assert not lazy.created()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        instances: list[object] = list(executor.map(lambda _: lazy.get(), range(8)))
+    assert len(calls) == 1
+    assert all([instance is instances[0] for instance in instances])
+    assert lazy.created()
+
+def test_pickled_without_instance() -> None:
+    lazy = lazy_instance.LazyInstance(list)
+    lazy.get().append(1)
+    unpickled: lazy_instance.LazyInstance = pickle.loads(pickle.dumps(lazy))
+    assert not unpickled.created()
+    assert unpickled.get() == []
+
+def test_no_parser_created_on_import() -> None:
+    code: str = "import omsi_map_merger, lazy_instance\nprint(any([instance.created() for instance in lazy_instance._instances]))"
+    assert subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.realpath(lazy_instance.__file__)),
+                          capture_output=True, text=True, check=True).stdout.split()[-1] == "False"
@@ -19,20 +19,84 @@ from enum import Enum, auto
 import typing
 import os.path
 import omsi_files
+import file_decoder
+import file_fingerprint
 import traceback
 import logging
+import pickle
+import multiprocessing
+import concurrent.futures
+import threading
+import time
+import tracemalloc
+import metrics
 
 logger = logging.getLogger(__name__)
 
+SLOWEST_FILES_DETAILED: int = 5# listed by SafeLoaderList.info_detailed
+
 class NoDataError(Exception):
     pass
 
+class WorkerError(Exception):
+    pass
+
+class LoadCancelledError(Exception):
+    pass
+
+def _size_text(size: int) -> str:
+    if size < 1024 ** 2:
+        return f"{size / 1024:.1f} KiB"
+    return f"{size / 1024 ** 2:.1f} MiB"
+
+class LoadStats:# of reading file by SafeLoaderUnit, or of files of SafeLoaderList summed
+    def __init__(self,
+                 files: int = 1,
+                 size: int = 0,# bytes
+                 decode_seconds: float = 0.0,
+                 parse_seconds: float = 0.0,# without decoding
+                 objects: int | None = None,# splines and objects of tiles
+                 peak_memory_delta: int | None = None,# peak of memory allocated while reading (largest one of files), bytes, if traced
+                 ) -> None:
+        self.files: int = files
+        self.size: int = size
+        self.decode_seconds: float = decode_seconds
+        self.parse_seconds: float = parse_seconds
+        self.objects: int | None = objects
+        self.peak_memory_delta: int | None = peak_memory_delta
+    
+    @staticmethod
+    def total(stats: list['LoadStats']) -> 'LoadStats':
+        objects: list[int] = [s.objects for s in stats if s.objects is not None]
+        peak_memory_deltas: list[int] = [s.peak_memory_delta for s in stats if s.peak_memory_delta is not None]
+        return LoadStats(sum([s.files for s in stats]),
+                         sum([s.size for s in stats]),
+                         sum([s.decode_seconds for s in stats]),
+                         sum([s.parse_seconds for s in stats]),
+                         sum(objects) if objects else None,
+                         max(peak_memory_deltas) if peak_memory_deltas else None)
+    
+    def seconds(self) -> float:
+        return self.decode_seconds + self.parse_seconds
+    
+    def __str__(self) -> str:
+        return f"{_size_text(self.size)}, {self.seconds():.3f} s" + ("" if self.objects is None else f", {self.objects} objects")
+    
+    def info_detailed(self) -> str:
+        return "".join([f"Files read: {self.files}\n" if self.files != 1 else "",
+                        f"Size: {_size_text(self.size)}\n",
+                        f"Decoding: {self.decode_seconds:.3f} s\n",
+                        f"Parsing: {self.parse_seconds:.3f} s\n",
+                        "" if self.objects is None else f"Objects: {self.objects}\n",
+                        "" if self.peak_memory_delta is None else f"Peak memory allocated: {_size_text(self.peak_memory_delta)}\n"])
+
 class FileParsingStatus(Enum):
     NOT_READ = auto()
     READ_SUCCESS = auto()
     OPTIONAL_NOT_EXISTS = auto()
     ERROR = auto()
     LOWER_MIXED = auto()
+    DEFERRED = auto()# lazy SafeLoaderUnit, file is parsed when its data is needed
 
 class SafeLoader:# BASE CLASS, DO NOT INSTANTIATE
     # function self.__init__
@@ -65,10 +129,17 @@ class SafeLoader:# BASE CLASS, DO NOT INSTANTIATE
             FileParsingStatus.OPTIONAL_NOT_EXISTS: "NOT EXISTS (optional)",
             FileParsingStatus.ERROR: "ERROR",
             FileParsingStatus.LOWER_MIXED: "MIXED",
+            FileParsingStatus.DEFERRED: "DEFERRED",
         }
         return status_text[self.get_status()]
     
-    def load(self) -> None:
+    def load(self, pool: 'ParallelLoader | None' = None, progress: 'LoadProgress | None' = None) -> None:
+        raise NotImplementedError()
+    
+    def get_stats(self) -> LoadStats | None:# of files read, None if none was read
+        raise NotImplementedError()
+    
+    def reload(self, pool: 'ParallelLoader | None' = None, progress: 'LoadProgress | None' = None) -> None:# load only what changed since last load
         raise NotImplementedError()
     
     def ready(self) -> bool:
@@ -84,6 +155,7 @@ class SafeLoaderUnit[T](SafeLoader):
                  callback_failed: typing.Callable[[], None] = lambda: None,
                  ofiles: omsi_files.OmsiFiles = omsi_files.OmsiFiles(),
                  optional: bool = False,
+                 lazy: bool = False,
                  ) -> None:
         super().__init__(ofiles)
         self.__data_type: typing.Type[T] = data_type
@@ -95,6 +167,9 @@ class SafeLoaderUnit[T](SafeLoader):
         self.__callback_loaded: typing.Callable[[], None] = callback_loaded
         self.__callback_failed: typing.Callable[[], None] = callback_failed
         self.__optional: bool = optional
+        self.__lazy: bool = lazy
+        self.__fingerprint: file_fingerprint.FileFingerprint | None = None
+        self.__stats: LoadStats | None = None
         self.__data: T
     
     def get_type_name(self) -> str:
@@ -102,6 +177,9 @@ class SafeLoaderUnit[T](SafeLoader):
     
     def get_path(self) -> str:
         return self.__path
+    
+    def get_true_loader(self) -> typing.Callable[[str], T]:
+        return self.__true_loader
 
     def get_name(self) -> str:
         return os.path.split(self.get_path())[1]
@@ -109,31 +187,97 @@ class SafeLoaderUnit[T](SafeLoader):
     def get_status(self) -> FileParsingStatus:
         return self.__status
     
+    def get_error(self) -> str | None:# of failed loading
+        if self.__status is not FileParsingStatus.ERROR:
+            return None
+        return f"{type(self.__exception).__name__}: {self.__exception}"
+    
+    def get_stats(self) -> LoadStats | None:# of last reading
+        return self.__stats
+    
+    def set_read(self, stats: LoadStats | None, fingerprint: file_fingerprint.FileFingerprint | None) -> None:# of file read by other process, see read_file
+        self.__stats = stats
+        self.__fingerprint = fingerprint
+    
     def get_data(self) -> T:
         if self.__status is FileParsingStatus.READ_SUCCESS:
             return self.__data
+        elif self.__status is FileParsingStatus.DEFERRED:
+            return self.__parse_deferred()
         else:
             raise NoDataError(f"Unable to return data, file parsing status is {self.__status}.")
     
-    def load(self) -> None:
+    def load(self, pool: 'ParallelLoader | None' = None, progress: 'LoadProgress | None' = None) -> None:
+        if progress is not None:
+            progress.check_cancelled()
+            progress.plan(self)
+        if self.__lazy:
+            self.__defer()
+            if progress is not None:
+                progress.unit_done(self, read=False)
+            return
+        if pool is not None:
+            logger.info(f"SafeLoaderUnit of {self.__data_type.__name__} submitting file \"{self.get_path()}\" to parallel loader...")
+            pool.submit(self, self.__true_loader, progress)
+            return
         logger.info(f"SafeLoaderUnit of {self.__data_type.__name__} loading file \"{self.get_path()}\"...")
-        try:
-            loaded = self.__true_loader(self.get_path())
-        except Exception as exception:
-            if self.__optional and isinstance(exception, FileNotFoundError):
-                    self.__status = FileParsingStatus.OPTIONAL_NOT_EXISTS
-            else:
-                logger.info("An error occured while loading\n" + traceback.format_exc())
-                self.__status = FileParsingStatus.ERROR
-                self.__exception = exception
-                self.__callback_failed()
+        if progress is not None:
+            progress.unit_started(self)
+        loaded, exception, traceback_text, self.__stats, self.__fingerprint = read_file(self.__true_loader, self.get_path(), progress is not None and progress.trace_memory)
+        if exception is None:
+            self.loading_succeeded(loaded)
         else:
-            assert type(loaded) == self.__data_type, f"true_loader must return object of type declared when constructing SafeLoader, required type: {self.__data_type}, type of returned: {type(loaded)}"
-            self.__data = loaded
-            self.__status = FileParsingStatus.READ_SUCCESS
-            self.__exception = self.__placeholder_exception
-            self.__callback_loaded()
-        
+            self.loading_failed(exception, traceback_text)
+        if progress is not None:
+            progress.unit_done(self, read=True)
+    
+    def reload(self, pool: 'ParallelLoader | None' = None, progress: 'LoadProgress | None' = None) -> None:
+        if self.ready() and file_fingerprint.unchanged(self.__fingerprint, self.get_path()):
+            logger.info(f"SafeLoaderUnit of {self.__data_type.__name__} file \"{self.get_path()}\" not changed since last load, not reloading.")
+            if progress is not None:
+                progress.plan(self)
+                progress.unit_done(self, read=False)
+            return
+        self.load(pool, progress)
+    
+    def __defer(self) -> None:
+        # no fingerprint is taken, deferred file is parsed at its current state anyway, so reload() just defers it again
+        self.__fingerprint = None
+        self.__stats = None
+        if not os.path.isfile(self.get_path()):
+            exception = FileNotFoundError(f"File \"{self.get_path()}\" does not exist.")
+            self.loading_failed(exception, f"{type(exception).__name__}: {exception}")
+            return
+        logger.info(f"SafeLoaderUnit of {self.__data_type.__name__} deferring parsing of file \"{self.get_path()}\" until its data is needed.")
+        self.__status = FileParsingStatus.DEFERRED
+        self.__exception = self.__placeholder_exception
+    
+    def __parse_deferred(self) -> T:
+        # parsed data is not kept, so only data in use is held in memory
+        logger.info(f"SafeLoaderUnit of {self.__data_type.__name__} parsing deferred file \"{self.get_path()}\"...")
+        loaded, exception, traceback_text, self.__stats, _ = read_file(self.__true_loader, self.get_path())
+        if exception is not None:
+            self.loading_failed(exception, traceback_text)
+            raise NoDataError(f"Unable to return data, parsing deferred file failed ({type(exception).__name__}: {exception}).") from exception
+        assert type(loaded) == self.__data_type, f"true_loader must return object of type declared when constructing SafeLoader, required type: {self.__data_type}, type of returned: {type(loaded)}"
+        return loaded
+    
+    def loading_succeeded(self, loaded: T) -> None:
+        assert type(loaded) == self.__data_type, f"true_loader must return object of type declared when constructing SafeLoader, required type: {self.__data_type}, type of returned: {type(loaded)}"
+        self.__data = loaded
+        self.__status = FileParsingStatus.READ_SUCCESS
+        self.__exception = self.__placeholder_exception
+        self.__callback_loaded()
+        logger.info(f"Safe loading finished. Status set to {self.get_status()}")
+    
+    def loading_failed(self, exception: Exception, traceback_text: str) -> None:
+        if self.__optional and isinstance(exception, FileNotFoundError):
+                self.__status = FileParsingStatus.OPTIONAL_NOT_EXISTS
+        else:
+            logger.info("An error occured while loading\n" + traceback_text)
+            self.__status = FileParsingStatus.ERROR
+            self.__exception = exception
+            self.__callback_failed()
         logger.info(f"Safe loading finished. Status set to {self.get_status()}")
     
     def info_detailed(self) -> str:
@@ -148,12 +292,15 @@ class SafeLoaderUnit[T](SafeLoader):
                 status_description = f"Error: {type(self.__exception).__name__}\nError message: {str(self.__exception)}"
             case FileParsingStatus.OPTIONAL_NOT_EXISTS:
                 status_description = "This file does not exist, but it is not a problem, because it is optional."
+            case FileParsingStatus.DEFERRED:
+                status_description = "File found, it will be parsed when its data is needed."
             case _:
                 raise Exception(f"This status was not expected here (is {self.__status})")
-        return status_description + "\n" + self.omsi_files_info()
+        stats_description: str = "" if self.__stats is None else self.__stats.info_detailed()
+        return status_description + "\n" + stats_description + self.omsi_files_info()
     
     def ready(self) -> bool:
-        return self.get_status() in [FileParsingStatus.READ_SUCCESS, FileParsingStatus.OPTIONAL_NOT_EXISTS]
+        return self.get_status() in [FileParsingStatus.READ_SUCCESS, FileParsingStatus.OPTIONAL_NOT_EXISTS, FileParsingStatus.DEFERRED]
     
 class SafeLoaderList(SafeLoader):
     def __init__(self,
@@ -187,12 +334,233 @@ class SafeLoaderList(SafeLoader):
     def set_sl_list(self, new_list: list[SafeLoader]) -> None:
         self.__lower_safe_loaders = new_list
     
-    def load(self) -> None:
+    def load(self, pool: 'ParallelLoader | None' = None, progress: 'LoadProgress | None' = None) -> None:
+        if progress is not None:
+            progress.plan(self)
         for sl in self.__lower_safe_loaders:
-            sl.load()
+            sl.load(pool, progress)
+    
+    def reload(self, pool: 'ParallelLoader | None' = None, progress: 'LoadProgress | None' = None) -> None:
+        if progress is not None:
+            progress.plan(self)
+        for sl in self.__lower_safe_loaders:
+            sl.reload(pool, progress)
+    
+    def get_stats(self) -> LoadStats | None:
+        stats: list[LoadStats] = [unit_stats for unit_stats in [unit.get_stats() for unit in _units(self)] if unit_stats is not None]
+        return LoadStats.total(stats) if stats else None
     
     def info_detailed(self) -> str:
-        return "list of SafeLoaders\n" + self.omsi_files_info()
+        stats: LoadStats | None = self.get_stats()
+        if stats is None:
+            return "list of SafeLoaders\n" + self.omsi_files_info()
+        return ("list of SafeLoaders\n" + stats.info_detailed() + "Slowest files:\n"
+                + "".join([f"\t{unit.get_name()}: {unit.get_stats()}\n" for unit in slowest_units([self], SLOWEST_FILES_DETAILED)])
+                + self.omsi_files_info())
     
     def ready(self) -> bool:
-        return all([sl.ready() for sl in self.get_sl_list()])
\ No newline at end of file
+        return all([sl.ready() for sl in self.get_sl_list()])
+
+def _objects_count(data: typing.Any) -> int | None:# of tiles only
+    return data.objects_count() if hasattr(data, "objects_count") else None
+
+def read_file(true_loader: typing.Callable[[str], typing.Any],
+              path: str,
+              trace_memory: bool = False,# with tracemalloc, which makes parsing several times slower
+              ) -> tuple[typing.Any, Exception | None, str, LoadStats, file_fingerprint.FileFingerprint | None]:# data or error with its traceback
+    # fingerprint is taken before reading, so changes made while reading are noticed by next reload
+    fingerprint: file_fingerprint.FileFingerprint | None = file_fingerprint.fingerprint(path)
+    try:
+        size: int = os.path.getsize(path)
+    except OSError:
+        size = 0
+    # tracing started by others is kept and its peak is not reset, so the peak may
+    # then be one of allocations made before reading, and is an upper bound
+    started_tracing: bool = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()# peak starts at 0
+    try:
+        traced_before: int = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+        decoding_before: float = file_decoder.decoding_seconds()
+        start: float = time.perf_counter()
+        loaded: typing.Any = None
+        exception: Exception | None = None
+        traceback_text: str = ""
+        try:
+            loaded = true_loader(path)
+        except Exception as true_loader_exception:
+            exception, traceback_text = true_loader_exception, traceback.format_exc()
+        seconds: float = time.perf_counter() - start
+        decode_seconds: float = file_decoder.decoding_seconds() - decoding_before
+        peak_memory: int | None = tracemalloc.get_traced_memory()[1] - traced_before if trace_memory else None
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+    stats: LoadStats = LoadStats(1,
+                                 size,
+                                 decode_seconds,
+                                 seconds - decode_seconds,
+                                 None if exception is not None else _objects_count(loaded),
+                                 peak_memory)
+    return loaded, exception, traceback_text, stats, fingerprint
+
+def _load_in_worker(true_loader: typing.Callable[[str], typing.Any], path: str, trace_memory: bool) -> tuple[typing.Any, Exception | None, str, LoadStats, file_fingerprint.FileFingerprint | None]:
+    loaded, exception, traceback_text, stats, fingerprint = read_file(true_loader, path, trace_memory)
+    if exception is not None:
+        try:
+            pickle.loads(pickle.dumps(exception))
+        except Exception:# exception can not be sent back to the parent process as it is
+            exception = WorkerError(f"{type(exception).__name__}: {str(exception)}")
+    return loaded, exception, traceback_text, stats, fingerprint
+
+class ParallelLoader:
+    # Runs true loaders of SafeLoaderUnits in a pool of processes.
+    # True loaders must be picklable (module level functions or methods of
+    # picklable objects). Results are set, and callbacks are called, in the
+    # parent process, in order of submission, by wait().
+    def __init__(self, max_workers: int | None = None) -> None:
+        self.__executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers,
+                                                                 mp_context=multiprocessing.get_context("spawn"))
+        self.__pending: list[tuple[SafeLoaderUnit, concurrent.futures.Future, LoadProgress | None]] = []
+    
+    def __enter__(self) -> 'ParallelLoader':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        try:
+            if exc_type is None:
+                self.wait()
+        finally:
+            self.__executor.shutdown(cancel_futures=True)
+    
+    def submit(self, unit: SafeLoaderUnit, true_loader: typing.Callable[[str], typing.Any], progress: 'LoadProgress | None' = None) -> None:
+        if progress is not None:
+            progress.unit_started(unit)
+        self.__pending.append((unit, self.__executor.submit(_load_in_worker, true_loader, unit.get_path(), progress is not None and progress.trace_memory), progress))
+    
+    def wait(self) -> None:
+        while self.__pending:
+            unit, future, progress = self.__pending.pop(0)
+            if progress is not None and progress.cancelled():# results of files parsed already are dropped too
+                for _, pending_future, _ in self.__pending:
+                    pending_future.cancel()
+                future.cancel()
+                self.__pending = []
+                raise LoadCancelledError("Loading cancelled")
+            try:
+                loaded, exception, traceback_text, stats, fingerprint = future.result()
+            except Exception as future_exception:# eg. unpicklable true loader or result, broken pool
+                unit.set_read(None, None)
+                unit.loading_failed(future_exception, traceback.format_exc())
+            else:
+                unit.set_read(stats, fingerprint)
+                if exception is None:
+                    unit.loading_succeeded(loaded)
+                else:
+                    unit.loading_failed(exception, traceback_text)
+            if progress is not None:
+                progress.unit_done(unit, read=True)
+
+def _units(sl: SafeLoader) -> list[SafeLoaderUnit]:
+    if isinstance(sl, SafeLoaderList):
+        units: list[SafeLoaderUnit] = []
+        for lower_sl in sl.get_sl_list():
+            units += _units(lower_sl)
+        return units
+    return [typing.cast(SafeLoaderUnit, sl)]
+
+def slowest_units(sls: list[SafeLoader], count: int) -> list[SafeLoaderUnit]:# of units read, slowest first
+    units: list[SafeLoaderUnit] = [unit for sl in sls for unit in _units(sl) if unit.get_stats() is not None]
+    return sorted(units, key=lambda unit: typing.cast(LoadStats, unit.get_stats()).seconds(), reverse=True)[:count]
+
+class LoadProgress:
+    # Progress of loading files, updated by thread loading them and read by
+    # other threads. Files are planned as soon as their loaders are known
+    # (eg. tiles when global config is loaded), so planned totals grow while
+    # loading. When cancelled, loading stops before next file with
+    # LoadCancelledError. Files not read (unchanged, deferred) are not
+    # counted in bytes. Files read are reported to observer in "parse" phase.
+    def __init__(self,
+                 callback: typing.Callable[['LoadProgress'], None] = lambda _: None,# called after every file, from loading thread
+                 observer: metrics.Observer | None = None,
+                 trace_memory: bool = False,# peak memory of every file is measured, see read_file
+                 ) -> None:
+        self.__callback: typing.Callable[['LoadProgress'], None] = callback
+        self.observer: metrics.Observer | None = observer
+        self.trace_memory: bool = trace_memory
+        self.__lock = threading.Lock()
+        self.__cancelled = threading.Event()
+        self.__planned: dict[SafeLoaderUnit, int] = {}# planned bytes of units
+        self.__done: set[SafeLoaderUnit] = set()
+        self.started: float = time.perf_counter()
+        self.files_planned: int = 0
+        self.files_done: int = 0
+        self.bytes_planned: int = 0
+        self.bytes_done: int = 0
+        self.objects_done: int = 0# splines and objects of tiles
+    
+    def plan(self, sl: SafeLoader) -> None:# files of sl not planned before
+        for unit in _units(sl):
+            if unit in self.__planned:
+                continue
+            try:
+                size: int = os.path.getsize(unit.get_path())
+            except OSError:
+                size = 0
+            with self.__lock:
+                self.__planned[unit] = size
+                self.files_planned += 1
+                self.bytes_planned += size
+    
+    def unit_started(self, unit: SafeLoaderUnit) -> None:# file is going to be read
+        if self.observer is not None:
+            self.observer.file_started("parse", unit.get_path())
+    
+    def unit_done(self, unit: SafeLoaderUnit, read: bool) -> None:
+        stats: LoadStats | None = unit.get_stats() if read else None
+        objects: int | None = None if stats is None else stats.objects
+        if read and self.observer is not None:
+            self.observer.file_finished("parse", unit.get_path(), 0.0 if stats is None else stats.seconds(),
+                                        self.__planned[unit] if stats is None else stats.size, objects, unit.get_error())
+        with self.__lock:
+            if unit in self.__done:
+                return
+            self.__done.add(unit)
+            self.files_done += 1
+            if read:
+                self.bytes_done += self.__planned[unit]
+            else:
+                self.bytes_planned -= self.__planned[unit]
+            self.objects_done += objects or 0
+        self.__callback(self)
+    
+    def cancel(self) -> None:# may be called from any thread
+        self.__cancelled.set()
+    
+    def cancelled(self) -> bool:
+        return self.__cancelled.is_set()
+    
+    def check_cancelled(self) -> None:
+        if self.cancelled():
+            raise LoadCancelledError("Loading cancelled")
+    
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+    
+    def fraction(self) -> float:# of planned bytes (or files if no bytes are to read)
+        if self.bytes_planned > 0:
+            return self.bytes_done / self.bytes_planned
+        return self.files_done / self.files_planned if self.files_planned > 0 else 0.0
+    
+    def objects_per_second(self) -> float:
+        return self.objects_done / max(self.elapsed(), 1e-9)
+    
+    def eta(self) -> float | None:# seconds left, estimated from bytes read so far
+        if self.bytes_done == 0:
+            return None
+        return self.elapsed() * (self.bytes_planned - self.bytes_done) / self.bytes_done
+    
+    def __str__(self) -> str:
+        eta: float | None = self.eta()
+        return f"{self.files_done}/{self.files_planned} files, {self.bytes_done / 1024 ** 2:.1f}/{self.bytes_planned / 1024 ** 2:.1f} MiB read, " \
+               f"{self.objects_per_second():.0f} objects/s, ETA {'?' if eta is None else f'{eta:.0f} s'}"
@@ -15,7 +15,11 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import tracemalloc
 import pytest
+import file_decoder
+import file_fingerprint
 import loader
 
 class SomethingToLoad:
@@ -63,3 +67,239 @@ def test_detailed_error_info(basic_slu_fail):
     basic_slu_fail.load()
     assert SomeError.__name__ in basic_slu_fail.info_detailed(), "error's type name not present"
     assert "some error message" in str(basic_slu_fail.info_detailed()), "error message not present"
+
+# parallel loading, true loaders must be picklable (module level functions)
+
+class UnpicklableError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)# only message is pickled, unpickling fails
+        self.code: int = code
+
+def unpicklable_error_loader(path: str):
+    raise UnpicklableError(5, "unpicklable error message")
+
+def optional_file_loader(path: str) -> SomethingToLoad:
+    with open(path):
+        return SomethingToLoad()
+
+@pytest.fixture(scope="module")
+def pool():
+    with loader.ParallelLoader(2) as parallel_loader:
+        yield parallel_loader
+
+def test_parallel_load_success(pool):
+    called: list[str] = []
+    slu = loader.SafeLoaderUnit(SomethingToLoad, "file path", something_loader, lambda: called.append("loaded"), lambda: called.append("failed"))
+    slu.load(pool)
+    assert slu.get_status() == loader.FileParsingStatus.NOT_READ
+    pool.wait()
+    assert slu.get_status() == loader.FileParsingStatus.READ_SUCCESS
+    assert type(slu.get_data()) is SomethingToLoad
+    assert called == ["loaded"]
+
+def test_parallel_load_fail(pool):
+    called: list[str] = []
+    slu = loader.SafeLoaderUnit(SomethingToLoad, "file path", failing_true_loader, lambda: called.append("loaded"), lambda: called.append("failed"))
+    slu.load(pool)
+    pool.wait()
+    assert slu.get_status() == loader.FileParsingStatus.ERROR
+    assert SomeError.__name__ in slu.info_detailed()
+    assert "some error message" in slu.info_detailed()
+    assert called == ["failed"]
+
+def test_parallel_load_unpicklable_error(pool):
+    slu = loader.SafeLoaderUnit(SomethingToLoad, "file path", unpicklable_error_loader)
+    slu.load(pool)
+    pool.wait()
+    assert slu.get_status() == loader.FileParsingStatus.ERROR
+    assert UnpicklableError.__name__ in slu.info_detailed()
+    assert "unpicklable error message" in slu.info_detailed()
+
+def test_parallel_load_optional_not_exists(pool, tmp_path):
+    slu = loader.SafeLoaderUnit(SomethingToLoad, str(tmp_path / "not_existing.txt"), optional_file_loader, optional=True)
+    sll = loader.SafeLoaderList([slu], "list")
+    sll.load(pool)
+    pool.wait()
+    assert sll.get_status() == loader.FileParsingStatus.OPTIONAL_NOT_EXISTS
+
+# reloading only changed files
+
+loaded_paths: list[str] = []
+
+def counting_file_loader(path: str) -> SomethingToLoad:
+    loaded_paths.append(path)
+    with open(path) as f:
+        f.read()
+    return SomethingToLoad()
+
+@pytest.fixture
+def file_slu(tmp_path):
+    loaded_paths.clear()
+    path = tmp_path / "file.txt"
+    path.write_text("content")
+    return loader.SafeLoaderUnit(SomethingToLoad, str(path), counting_file_loader)
+
+def test_reload_unchanged(file_slu):
+    file_slu.load()
+    data: SomethingToLoad = file_slu.get_data()
+    file_slu.reload()
+    assert file_slu.get_data() is data
+    assert len(loaded_paths) == 1
+
+def test_reload_changed(file_slu):
+    file_slu.load()
+    with open(file_slu.get_path(), 'w') as f:
+        f.write("other content")
+    file_slu.reload()
+    assert file_slu.get_status() == loader.FileParsingStatus.READ_SUCCESS
+    assert len(loaded_paths) == 2
+
+def test_fingerprint_hashed_only_if_racy(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("content")
+    assert file_fingerprint.fingerprint(str(path)).content_hash is not None
+    os.utime(path, ns=(10 ** 18, 10 ** 18))
+    assert file_fingerprint.fingerprint(str(path)).content_hash is None
+
+def test_reload_racy_changed(file_slu):# same size and mtime, but file was changed right after load
+    file_slu.load()
+    mtime_ns: int = os.stat(file_slu.get_path()).st_mtime_ns
+    with open(file_slu.get_path(), 'w') as f:
+        f.write("CONTENT")
+    os.utime(file_slu.get_path(), ns=(mtime_ns, mtime_ns))
+    file_slu.reload()
+    assert len(loaded_paths) == 2
+
+def test_reload_not_loaded_yet(file_slu):
+    file_slu.reload()
+    assert file_slu.get_status() == loader.FileParsingStatus.READ_SUCCESS
+    assert len(loaded_paths) == 1
+
+def test_reload_after_fail(basic_slu_fail):
+    basic_slu_fail.load()
+    basic_slu_fail.reload()
+    assert basic_slu_fail.get_status() == loader.FileParsingStatus.ERROR
+
+# lazy loading, parsing deferred until data is needed
+
+def test_lazy_load_deferred(file_slu):
+    lazy_slu = loader.SafeLoaderUnit(SomethingToLoad, file_slu.get_path(), counting_file_loader, lazy=True)
+    lazy_slu.load()
+    assert lazy_slu.get_status() == loader.FileParsingStatus.DEFERRED
+    assert lazy_slu.ready()
+    assert loaded_paths == []
+    assert type(lazy_slu.get_data()) is SomethingToLoad
+    assert lazy_slu.get_data() is not lazy_slu.get_data() # parsed data is not kept
+    assert len(loaded_paths) == 3
+
+def test_lazy_load_not_existing(tmp_path):
+    lazy_slu = loader.SafeLoaderUnit(SomethingToLoad, str(tmp_path / "not_existing.txt"), counting_file_loader, lazy=True)
+    lazy_slu.load()
+    assert lazy_slu.get_status() == loader.FileParsingStatus.ERROR
+
+def test_lazy_get_data_fail(file_slu):
+    lazy_slu = loader.SafeLoaderUnit(SomethingToLoad, file_slu.get_path(), failing_true_loader, lazy=True)
+    lazy_slu.load()
+    with pytest.raises(loader.NoDataError):
+        lazy_slu.get_data()
+    assert lazy_slu.get_status() == loader.FileParsingStatus.ERROR
+    assert "some error message" in lazy_slu.info_detailed()
+
+# progress and cancellation
+
+@pytest.fixture
+def files_sll(tmp_path):
+    loaded_paths.clear()
+    for i in range(4):
+        (tmp_path / f"file{i}.txt").write_text("x" * (i + 1))
+    return loader.SafeLoaderList([loader.SafeLoaderUnit(SomethingToLoad, str(tmp_path / f"file{i}.txt"), counting_file_loader) for i in range(4)], "list")
+
+def test_progress(files_sll):
+    progress = loader.LoadProgress()
+    files_sll.load(None, progress)
+    assert (progress.files_done, progress.files_planned, progress.bytes_done, progress.bytes_planned) == (4, 4, 10, 10)
+    assert progress.fraction() == 1.0
+    progress = loader.LoadProgress()
+    files_sll.reload(None, progress)# unchanged files are not read
+    assert (progress.files_done, progress.files_planned, progress.bytes_planned) == (4, 4, 0)
+
+def test_cancel_between_files(files_sll):
+    progress = loader.LoadProgress(lambda p: p.cancel() if p.files_done == 2 else None)
+    with pytest.raises(loader.LoadCancelledError):
+        files_sll.load(None, progress)
+    assert len(loaded_paths) == 2
+    assert [sl.get_status() for sl in files_sll.get_sl_list()][2:] == [loader.FileParsingStatus.NOT_READ] * 2
+
+def test_parallel_cancel(files_sll):
+    progress = loader.LoadProgress(lambda p: p.cancel())
+    with pytest.raises(loader.LoadCancelledError):
+        with loader.ParallelLoader(2) as parallel_loader:
+            files_sll.load(parallel_loader, progress)
+    assert progress.files_done == 1
+    assert [sl.get_status() for sl in files_sll.get_sl_list()][1:] == [loader.FileParsingStatus.NOT_READ] * 3
+
+# stats of read files
+
+def decoding_file_loader(path: str) -> SomethingToLoad:
+    file_decoder.decoded(path, ["iso-8859-1"])
+    return SomethingToLoad()
+
+def test_stats(files_sll):
+    assert files_sll.get_stats() is None
+    files_sll.load()
+    stats: loader.LoadStats | None = files_sll.get_sl_list()[3].get_stats()
+    assert stats is not None
+    assert (stats.files, stats.size, stats.objects) == (1, 4, None)
+    total: loader.LoadStats | None = files_sll.get_stats()
+    assert total is not None
+    assert (total.files, total.size) == (4, 10)
+    assert len(loader.slowest_units([files_sll], 2)) == 2
+    assert "Slowest files:" in files_sll.info_detailed()
+
+def test_parallel_stats(pool, tmp_path):# decoding is measured in worker process
+    path = tmp_path / "file.txt"
+    path.write_text("x" * 1024 ** 2)
+    slu = loader.SafeLoaderUnit(SomethingToLoad, str(path), decoding_file_loader)
+    slu.load(pool)
+    pool.wait()
+    stats: loader.LoadStats | None = slu.get_stats()
+    assert stats is not None
+    assert stats.size == 1024 ** 2
+    assert stats.decode_seconds > 0.0
+    assert "Decoding:" in slu.info_detailed()
+
+def allocating_loader(path: str) -> SomethingToLoad:
+    data: bytes = b"x" * 10 * 1024 ** 2
+    del data
+    return SomethingToLoad()
+
+def test_trace_memory(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("content")
+    slu = loader.SafeLoaderUnit(SomethingToLoad, str(path), allocating_loader)
+    slu.load()
+    assert slu.get_stats().peak_memory_delta is None# not traced by default
+    slu.load(None, loader.LoadProgress(trace_memory=True))
+    assert slu.get_stats().peak_memory_delta >= 10 * 1024 ** 2
+
+def test_trace_memory_started_by_others(tmp_path):# their tracing and its peak are kept
+    path = tmp_path / "file.txt"
+    path.write_text("content")
+    tracemalloc.start()
+    try:
+        data: bytes = b"x" * 20 * 1024 ** 2
+        del data
+        _, _, _, stats, _ = loader.read_file(something_loader, str(path), True)
+        assert tracemalloc.is_tracing()
+        assert tracemalloc.get_traced_memory()[1] >= 20 * 1024 ** 2
+        assert stats.peak_memory_delta is not None
+    finally:
+        tracemalloc.stop()
+
+def test_deferred_stats(file_slu):
+    lazy_slu = loader.SafeLoaderUnit(SomethingToLoad, file_slu.get_path(), counting_file_loader, lazy=True)
+    lazy_slu.load()
+    assert lazy_slu.get_stats() is None
+    lazy_slu.get_data()
+    assert lazy_slu.get_stats().size == len("content")
+    assert loader.slowest_units([lazy_slu], 1) == [lazy_slu]
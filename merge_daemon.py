@@ -0,0 +1,231 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+# Merge daemon, keeps maps loaded between merges, so maps merged many times
+# are parsed once (and again only their files changed since). It listens on
+# localhost only, merges are done one at a time:
+#
+#   POST /merge      manifest (see batch_merge.py), optional "base" is
+#                    directory relative directories are relative to (daemon's
+#                    working directory by default), answers with report
+#   GET  /status     kept maps, least recently used first, with their size
+#   POST /shutdown
+#
+# Requests must name the daemon as their Host (127.0.0.1:<port> or
+# localhost:<port>), and POST requests must send application/json, so web
+# pages cannot make them.
+#
+#   python merge_daemon.py serve --max-maps 8 --max-mib 512
+#   python merge_daemon.py merge manifest.json
+#   python merge_daemon.py stop
+
+import argparse
+import http
+import http.server
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import typing
+import urllib.error
+import urllib.request
+import batch_merge
+import metrics
+import omsi_files
+import parse_cache
+import version
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT: int = 47011
+
+class MergeDaemon:
+    def __init__(self, batch_merger: batch_merge.BatchMerger) -> None:
+        self.batch_merger: batch_merge.BatchMerger = batch_merger
+        self.merges: int = 0
+        self.started: float = time.time()
+
+    def merge(self, entry: typing.Any) -> tuple[http.HTTPStatus, dict[str, typing.Any]]:
+        try:
+            base: typing.Any = entry.get("base", os.getcwd()) if isinstance(entry, dict) else os.getcwd()
+            if not isinstance(base, str):
+                raise batch_merge.ManifestError("\"base\" must be str")
+            manifest: batch_merge.Manifest = batch_merge.manifest_of(entry, "request", base)
+        except batch_merge.ManifestError as exception:
+            return http.HTTPStatus.BAD_REQUEST, {"status": "failed", "errors": [str(exception)]}
+        report: dict[str, typing.Any] = self.batch_merger.merge(manifest)
+        self.merges += 1
+        # maps of this merge are kept, they are the most recently used
+        report["evicted_maps"] = self.batch_merger.pool.evict({entry.directory for entry in manifest.maps})
+        return http.HTTPStatus.OK, report
+
+    def status(self) -> dict[str, typing.Any]:
+        pool: batch_merge.MapPool = self.batch_merger.pool
+        return {"version": version.version,
+                "uptime": round(time.time() - self.started, 3),
+                "merges": self.merges,
+                "max_maps": pool.max_maps,
+                "max_bytes": pool.max_bytes,
+                "maps": [{"directory": directory, "bytes": size} for directory, size in pool.maps_bytes().items()]}
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    server: '_Server'
+
+    def __answer(self, status: http.HTTPStatus, answer: dict[str, typing.Any]) -> None:
+        body: bytes = json.dumps(answer).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __rejected(self) -> bool:# answers request not sent by a local client, like a web page's request after DNS rebinding
+        port: int = self.server.server_address[1]
+        if self.headers.get("Host") not in (f"127.0.0.1:{port}", f"localhost:{port}"):
+            self.__answer(http.HTTPStatus.FORBIDDEN, {"status": "failed", "errors": [f"Host \"{self.headers.get('Host')}\" not allowed"]})
+            return True
+        if self.command == "POST" and self.headers.get_content_type() != "application/json":# not sendable by a web page without preflight
+            self.__answer(http.HTTPStatus.UNSUPPORTED_MEDIA_TYPE, {"status": "failed", "errors": [f"Content-Type \"{self.headers.get('Content-Type')}\" is not application/json"]})
+            return True
+        return False
+
+    def do_GET(self) -> None:
+        if self.__rejected():
+            return
+        if self.path == "/status":
+            self.__answer(http.HTTPStatus.OK, self.server.daemon.status())
+        else:
+            self.__answer(http.HTTPStatus.NOT_FOUND, {"errors": [f"No such path \"{self.path}\""]})
+
+    def do_POST(self) -> None:
+        if self.__rejected():
+            return
+        if self.path == "/merge":
+            try:
+                entry: typing.Any = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            except ValueError as exception:
+                self.__answer(http.HTTPStatus.BAD_REQUEST, {"status": "failed", "errors": [f"Invalid JSON ({exception})"]})
+                return
+            self.__answer(*self.server.daemon.merge(entry))
+        elif self.path == "/shutdown":
+            self.__answer(http.HTTPStatus.OK, {})
+            # serve_forever waits for shutdown, it cannot be called from its thread
+            threading.Thread(target=self.server.shutdown).start()
+        else:
+            self.__answer(http.HTTPStatus.NOT_FOUND, {"errors": [f"No such path \"{self.path}\""]})
+
+    def log_message(self, format: str, *args: typing.Any) -> None:
+        logger.info(f"{self.address_string()} {format % args}")
+
+class _Server(http.server.HTTPServer):# one request at a time, merges share loaded maps
+    def __init__(self, daemon: MergeDaemon, port: int) -> None:
+        super().__init__(("127.0.0.1", port), _RequestHandler)
+        self.daemon: MergeDaemon = daemon
+
+def server(daemon: MergeDaemon, port: int = DEFAULT_PORT) -> http.server.HTTPServer:# call serve_forever() on it, port 0 is any free port
+    return _Server(daemon, port)
+
+class Client:
+    def __init__(self, port: int = DEFAULT_PORT, timeout: float | None = None) -> None:
+        self.url: str = f"http://127.0.0.1:{port}"
+        self.timeout: float | None = timeout
+
+    def __request(self, path: str, entry: typing.Any = None) -> dict[str, typing.Any]:
+        request = urllib.request.Request(self.url + path,
+                                         data=None if entry is None else json.dumps(entry).encode('utf-8'),
+                                         headers={"Content-Type": "application/json"},
+                                         method="GET" if entry is None else "POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as error:# answer tells what is wrong with request
+            with error:
+                return json.loads(error.read())
+
+    def merge(self, entry: dict[str, typing.Any]) -> dict[str, typing.Any]:# report
+        return self.__request("/merge", entry)
+
+    def merge_file(self, path: str) -> dict[str, typing.Any]:# directories are relative to manifest's directory, like in batch_merge
+        with open(path, encoding='utf-8') as f:
+            entry: typing.Any = json.load(f)
+        if isinstance(entry, dict):
+            entry.setdefault("base", os.path.dirname(os.path.abspath(path)))
+        return self.merge(entry)
+
+    def status(self) -> dict[str, typing.Any]:
+        return self.__request("/status")
+
+    def shutdown(self) -> None:
+        self.__request("/shutdown", {})
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Merge daemon keeping maps loaded between merges.")
+    arg_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="localhost port")
+    subparsers = arg_parser.add_subparsers(dest="command", required=True)
+    serve = subparsers.add_parser("serve", help="Run daemon.")
+    serve.add_argument("--workers", type=int, default=1, help="processes parsing and saving tiles")
+    serve.add_argument("--lazy-tiles", action="store_true", help="parse tiles only when merged map is saved, uses less memory")
+    serve.add_argument("--cache-directory", default=parse_cache.default_directory(), help="directory of parse cache shared with GUI")
+    serve.add_argument("--no-cache", action="store_true", help="do not use parse cache")
+    serve.add_argument("--placement", choices=[placement.name.lower() for placement in omsi_files.FilePlacement], default="copy",
+                       help="how files of source maps are placed in merged map")
+    serve.add_argument("--strict", action="store_true", help="do not save merged map if there are warnings")
+    serve.add_argument("--max-maps", type=int, help="maps kept loaded, least recently used are evicted")
+    serve.add_argument("--max-mib", type=float, help="size of parsed files of maps kept loaded, least recently used are evicted")
+    serve.add_argument("--metrics", help="file to append JSON lines with events of every file and phase of merges to")
+    serve.add_argument("--trace-memory", action="store_true", help="measure peak memory of parsing every file, parsing is several times slower")
+    serve.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO", help="level of log written to standard error")
+    merge = subparsers.add_parser("merge", help="Merge maps as described by manifest files, with running daemon.")
+    merge.add_argument("manifests", nargs="+")
+    subparsers.add_parser("status", help="Print status of running daemon.")
+    subparsers.add_parser("stop", help="Stop running daemon.")
+    args = arg_parser.parse_args()
+
+    client = Client(args.port)
+    match args.command:
+        case "serve":
+            logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', encoding='utf-8', level=args.log_level)
+            cache: parse_cache.ParseCache | None = None if args.no_cache else parse_cache.ParseCache(args.cache_directory)
+            pool = batch_merge.MapPool(cache, args.lazy_tiles, args.max_maps, None if args.max_mib is None else int(args.max_mib * 1024 ** 2))
+            metrics_file: metrics.JsonLines | None = None if args.metrics is None else metrics.JsonLines.open(args.metrics)
+            daemon = MergeDaemon(batch_merge.BatchMerger(cache, args.lazy_tiles, args.workers, omsi_files.FilePlacement[args.placement.upper()], args.strict, pool, metrics_file, args.trace_memory))
+            try:
+                with server(daemon, args.port) as http_server:
+                    logger.info(f"Merge daemon listening on 127.0.0.1:{http_server.server_address[1]}")
+                    http_server.serve_forever()
+            finally:
+                if metrics_file is not None:
+                    metrics_file.close()
+            return 0
+        case "merge":
+            reports: list[dict[str, typing.Any]] = [client.merge_file(path) for path in args.manifests]
+            json.dump(reports, sys.stdout, indent=4)
+            print()
+            return 0 if all([report.get("status") == "saved" for report in reports]) else 1
+        case "status":
+            json.dump(client.status(), sys.stdout, indent=4)
+            print()
+            return 0
+        case "stop":
+            client.shutdown()
+            return 0
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import threading
+import urllib.error
+import urllib.request
+import pytest
+import batch_merge
+import benchmark
+import merge_daemon
+
+@pytest.fixture
+def client(tmp_path):
+    for map_name in ["map0", "map1", "map2"]:
+        benchmark.write_synthetic_map(str(tmp_path / map_name), 3, 10)
+    daemon = merge_daemon.MergeDaemon(batch_merge.BatchMerger(pool=batch_merge.MapPool(max_maps=2)))
+    with merge_daemon.server(daemon, 0) as http_server:
+        thread = threading.Thread(target=http_server.serve_forever)
+        thread.start()
+        yield merge_daemon.Client(http_server.server_address[1], timeout=60)
+        http_server.shutdown()
+        thread.join()
+
+def test_merges_keep_maps(client, tmp_path) -> None:# least recently used map is evicted over limit
+    first = client.merge({"name": "first", "directory": "first", "base": str(tmp_path), "maps": [{"directory": "map0"}, {"directory": "map1", "shift_y": 1}]})
+    assert (first["status"], first["reused_maps"], first["evicted_maps"]) == ("saved", 0, [])
+    again = client.merge({"name": "again", "directory": "again", "base": str(tmp_path), "maps": [{"directory": "map0"}, {"directory": "map1", "shift_y": 1}]})
+    assert (again["status"], again["reused_maps"]) == ("saved", 2)
+    second = client.merge({"name": "second", "directory": "second", "base": str(tmp_path), "maps": [{"directory": "map2"}, {"directory": "map0", "shift_y": 1}]})
+    assert (second["status"], second["reused_maps"], second["evicted_maps"]) == ("saved", 1, [str(tmp_path / "map1")])
+    status = client.status()
+    assert status["merges"] == 3
+    assert [kept["directory"] for kept in status["maps"]] == [str(tmp_path / "map2"), str(tmp_path / "map0")]
+    assert all([kept["bytes"] > 0 for kept in status["maps"]])
+
+def test_invalid_request(client, tmp_path) -> None:
+    answer = client.merge({"name": "invalid", "directory": "invalid", "base": str(tmp_path), "maps": [{"directory": "map0"}]})
+    assert answer["status"] == "failed"
+    assert "At least 2 maps" in answer["errors"][0]
+    assert client.status()["merges"] == 0
+
+@pytest.mark.parametrize("headers, status", [
+    ({"Content-Type": "text/plain"}, 415),# sendable by any web page
+    ({"Content-Type": "application/json", "Host": "attacker.example:{port}"}, 403),# DNS rebinding
+    ({"Content-Type": "application/json", "Host": "127.0.0.1:1"}, 403),
+])
+def test_foreign_request_rejected(client, headers, status) -> None:
+    port: str = client.url.rsplit(":", 1)[1]
+    request = urllib.request.Request(client.url + "/shutdown", data=b"{}", method="POST",
+                                     headers={name: value.format(port=port) for name, value in headers.items()})
+    with pytest.raises(urllib.error.HTTPError) as raised:
+        urllib.request.urlopen(request, timeout=60)
+    with raised.value as error:
+        assert error.code == status
+        assert json.loads(error.read())["status"] == "failed"
+    assert client.status()["merges"] == 0# still serving
@@ -0,0 +1,238 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+# Events of loading, merging and saving maps, and sinks for them. Phases:
+#   parse      files read by loaders (see loader.LoadProgress)
+#   merge      OmsiMapMerger.merged_omsi_map, with
+#   shift      shifting ids and indices of merged maps (deferred tiles are
+#              shifted when saved, in serialize)
+#   save       OmsiMap.save, with
+#   serialize  files written (deferred tiles are parsed there too)
+#   copy       files of source maps placed in saved map
+# Files may be reported from worker threads, so sinks must be thread safe.
+# Files parsed or serialized in worker processes are reported when their
+# results come back, with time measured in worker.
+
+import contextlib
+import json
+import sys
+import threading
+import time
+import typing
+
+class Observer:# sink doing nothing, override what is needed
+    def phase_started(self, phase: str) -> None:
+        pass
+
+    def phase_finished(self, phase: str, seconds: float) -> None:
+        pass
+
+    def file_started(self, phase: str, path: str) -> None:
+        pass
+
+    def file_finished(self,
+                      phase: str,
+                      path: str,
+                      seconds: float,
+                      size: int | None = None,# bytes read or written
+                      objects: int | None = None,# splines and objects of tile
+                      error: str | None = None,
+                      ) -> None:
+        pass
+
+class Observers(Observer):# passes events to all observers
+    def __init__(self, observers: list[Observer]) -> None:
+        self.observers: list[Observer] = observers
+
+    def phase_started(self, phase: str) -> None:
+        for observer in self.observers:
+            observer.phase_started(phase)
+
+    def phase_finished(self, phase: str, seconds: float) -> None:
+        for observer in self.observers:
+            observer.phase_finished(phase, seconds)
+
+    def file_started(self, phase: str, path: str) -> None:
+        for observer in self.observers:
+            observer.file_started(phase, path)
+
+    def file_finished(self, phase: str, path: str, seconds: float, size: int | None = None, objects: int | None = None, error: str | None = None) -> None:
+        for observer in self.observers:
+            observer.file_finished(phase, path, seconds, size, objects, error)
+
+@contextlib.contextmanager
+def phase(observer: Observer | None, name: str) -> typing.Iterator[None]:# reports phase to observer if given
+    if observer is None:
+        yield
+        return
+    start: float = time.perf_counter()
+    observer.phase_started(name)
+    try:
+        yield
+    finally:
+        observer.phase_finished(name, time.perf_counter() - start)
+
+def reported(observer: Observer | None, phase: str, path: str, function: typing.Callable[[], typing.Any]) -> typing.Any:# calls function, reports it as file of phase
+    if observer is None:
+        return function()
+    observer.file_started(phase, path)
+    start: float = time.perf_counter()
+    error: str | None = None
+    try:
+        return function()
+    except Exception as exception:
+        error = f"{type(exception).__name__}: {exception}"
+        raise
+    finally:
+        observer.file_finished(phase, path, time.perf_counter() - start, error=error)
+
+class FileRecord:
+    def __init__(self, phase: str, path: str, seconds: float, size: int | None, objects: int | None, error: str | None) -> None:
+        self.phase: str = phase
+        self.path: str = path
+        self.seconds: float = seconds
+        self.size: int | None = size
+        self.objects: int | None = objects
+        self.error: str | None = error
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return vars(self).copy()
+
+class PhaseTotals:
+    def __init__(self) -> None:
+        self.seconds: float = 0.0# of phase, files of it may be done at the same time
+        self.files: int = 0
+        self.files_seconds: float = 0.0
+        self.bytes: int = 0
+        self.objects: int = 0
+        self.errors: int = 0
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return vars(self).copy()
+
+class Summary(Observer):# totals of phases and slowest files
+    def __init__(self, slowest_count: int = 10) -> None:
+        self.slowest_count: int = slowest_count
+        self.phases: dict[str, PhaseTotals] = {}
+        self.slowest_files: list[FileRecord] = []# slowest first
+        self.__lock = threading.Lock()
+
+    def __totals(self, phase: str) -> PhaseTotals:
+        if phase not in self.phases:
+            self.phases[phase] = PhaseTotals()
+        return self.phases[phase]
+
+    def phase_finished(self, phase: str, seconds: float) -> None:
+        with self.__lock:
+            self.__totals(phase).seconds += seconds
+
+    def file_finished(self, phase: str, path: str, seconds: float, size: int | None = None, objects: int | None = None, error: str | None = None) -> None:
+        with self.__lock:
+            totals: PhaseTotals = self.__totals(phase)
+            totals.files += 1
+            totals.files_seconds += seconds
+            totals.bytes += size or 0
+            totals.objects += objects or 0
+            totals.errors += error is not None
+            if len(self.slowest_files) < self.slowest_count or seconds > self.slowest_files[-1].seconds:
+                self.slowest_files.append(FileRecord(phase, path, seconds, size, objects, error))
+                self.slowest_files.sort(key=lambda record: record.seconds, reverse=True)
+                del self.slowest_files[self.slowest_count:]
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        with self.__lock:
+            return {"phases": {phase: totals.to_dict() for phase, totals in self.phases.items()},
+                    "slowest_files": [record.to_dict() for record in self.slowest_files]}
+
+    def __str__(self) -> str:
+        with self.__lock:
+            lines: list[str] = [f"{phase}: {totals.seconds:.2f} s, {totals.files} files ({totals.files_seconds:.2f} s), "
+                                f"{totals.bytes / 1024 ** 2:.1f} MiB, {totals.objects} objects, {totals.errors} errors"
+                                for phase, totals in self.phases.items()]
+            lines += ["slowest files:"] + [f"  {record.seconds:.3f} s {record.phase} {record.path}" for record in self.slowest_files]
+            return "\n".join(lines)
+
+class JsonLines(Observer):# metrics file, one JSON object per event
+    def __init__(self, stream: typing.TextIO) -> None:
+        self.stream: typing.TextIO = stream
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def open(path: str) -> 'JsonLines':# appended, close stream when done
+        return JsonLines(open(path, 'a', encoding='utf-8'))
+
+    def __write(self, event: str, **fields: typing.Any) -> None:
+        line: str = json.dumps({"time": time.time(), "event": event} | fields)
+        with self.__lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def phase_started(self, phase: str) -> None:
+        self.__write("phase_started", phase=phase)
+
+    def phase_finished(self, phase: str, seconds: float) -> None:
+        self.__write("phase_finished", phase=phase, seconds=seconds)
+
+    def file_started(self, phase: str, path: str) -> None:
+        self.__write("file_started", phase=phase, path=path)
+
+    def file_finished(self, phase: str, path: str, seconds: float, size: int | None = None, objects: int | None = None, error: str | None = None) -> None:
+        self.__write("file_finished", phase=phase, path=path, seconds=seconds, size=size, objects=objects, error=error)
+
+    def close(self) -> None:
+        self.stream.close()
+
+class ProgressLine(Observer):# one line rewritten on terminal, for command line
+    def __init__(self, stream: typing.TextIO = sys.stderr, interval: float = 0.2) -> None:
+        self.stream: typing.TextIO = stream
+        self.interval: float = interval# seconds between updates
+        self.__lock = threading.Lock()
+        self.__last_update: float = 0.0
+        self.__phase_files: dict[str, tuple[int, int]] = {}# files and bytes done in phase
+        self.__width: int = 0
+
+    def __show(self, text: str, end: str = "") -> None:
+        self.stream.write("\r" + text.ljust(self.__width) + end)
+        self.stream.flush()
+        self.__width = 0 if end else len(text)
+
+    def file_finished(self, phase: str, path: str, seconds: float, size: int | None = None, objects: int | None = None, error: str | None = None) -> None:
+        with self.__lock:
+            files, size_done = self.__phase_files.get(phase, (0, 0))
+            self.__phase_files[phase] = (files + 1, size_done + (size or 0))
+            if time.perf_counter() - self.__last_update >= self.interval:
+                self.__last_update = time.perf_counter()
+                self.__show(f"{phase}: {files + 1} files, {(size_done + (size or 0)) / 1024 ** 2:.1f} MiB, {path}")
+
+    def phase_finished(self, phase: str, seconds: float) -> None:
+        with self.__lock:
+            files, size_done = self.__phase_files.pop(phase, (0, 0))
+            self.__show(f"{phase}: {files} files, {size_done / 1024 ** 2:.1f} MiB, {seconds:.2f} s", "\n")
+
+class EventSender(Observer):# for GUI, sends current file to event loop, eg. with window.write_event_value
+    def __init__(self, send: typing.Callable[[str], None], interval: float = 0.1) -> None:
+        self.send: typing.Callable[[str], None] = send
+        self.interval: float = interval# seconds between sent events
+        self.__last_sent: float = 0.0
+
+    def file_started(self, phase: str, path: str) -> None:
+        if time.perf_counter() - self.__last_sent >= self.interval:
+            self.__last_sent = time.perf_counter()
+            self.send(f"{phase} {path}")
+
+    def phase_started(self, phase: str) -> None:
+        self.send(phase)
@@ -0,0 +1,77 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import json
+import pytest
+import benchmark
+import loader
+import metrics
+import omsi_map_merger
+
+def test_summary() -> None:
+    summary = metrics.Summary(slowest_count=2)
+    with metrics.phase(summary, "parse"):
+        summary.file_finished("parse", "a", 0.1, 100, 5)
+        summary.file_finished("parse", "b", 0.3, 200)
+        summary.file_finished("parse", "c", 0.2, error="ParseError: c")
+    assert summary.phases["parse"].files == 3
+    assert summary.phases["parse"].bytes == 300
+    assert summary.phases["parse"].objects == 5
+    assert summary.phases["parse"].errors == 1
+    assert [record.path for record in summary.slowest_files] == ["b", "c"]
+    assert json.loads(json.dumps(summary.to_dict()))["slowest_files"][1]["error"] == "ParseError: c"
+
+@pytest.mark.parametrize("lazy_tiles, workers", [(False, 1), (True, 2)])
+def test_merge_reported(tmp_path, lazy_tiles: bool, workers: int) -> None:# every phase and tile
+    benchmark.write_synthetic_map(str(tmp_path / "map0"), 3, 10)
+    benchmark.write_synthetic_map(str(tmp_path / "map1"), 2, 10)
+    summary = metrics.Summary()
+    stream = io.StringIO()
+    observer = metrics.Observers([summary, metrics.JsonLines(stream)])
+    merger = omsi_map_merger.OmsiMapMerger(lazy_tiles=lazy_tiles)
+    merger.append_map(str(tmp_path / "map0"))
+    merger.append_map(str(tmp_path / "map1"))
+    merger.get_maps()[1].shift(shift_y=1)
+    merger.load_maps(workers, loader.LoadProgress(observer=observer))
+    merger.merged_omsi_map("merged", observer).merged_map.save(str(tmp_path / "merged"), workers, observer=observer)
+
+    assert {"parse", "merge", "shift", "save", "serialize"} <= set(summary.phases)
+    tiles: list[str] = [f"tile_{x}_{y}.map" for x, y in [(0, 0), (1, 0), (2, 0), (0, 1), (1, 1)]]
+    serialized: dict[str, metrics.FileRecord] = {}
+    parsed_objects: int = 0
+    for line in stream.getvalue().splitlines():
+        event = json.loads(line)
+        if event["event"] == "file_finished" and event["phase"] == "serialize" and event["path"] in tiles:
+            serialized[event["path"]] = event
+        if event["event"] == "file_finished" and event["phase"] == "parse" and event["objects"] is not None:
+            parsed_objects += event["objects"]
+    assert set(serialized) == set(tiles)
+    assert all([event["size"] > 0 for event in serialized.values()])
+    tile_objects: int = merger.get_maps()[0].get_tiles().get_sl_list()[0].get_data().objects_count()
+    assert sum([event["objects"] for event in serialized.values()]) == 5 * tile_objects
+    assert parsed_objects == (0 if lazy_tiles else 5 * tile_objects)# deferred tiles are parsed when saved
+
+def test_progress_line() -> None:
+    stream = io.StringIO()
+    progress_line = metrics.ProgressLine(stream, interval=0.0)
+    with metrics.phase(progress_line, "copy"):
+        progress_line.file_finished("copy", "texture/a.dds", 0.1, 1024 ** 2)
+        progress_line.file_finished("copy", "texture/b.dds", 0.1, 1024 ** 2)
+    lines: list[str] = stream.getvalue().split("\r")
+    assert lines[-2].startswith("copy: 2 files, 2.0 MiB, texture/b.dds")
+    assert lines[-1].startswith("copy: 2 files, 2.0 MiB,") and lines[-1].rstrip().endswith(" s")
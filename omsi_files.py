@@ -18,9 +18,191 @@
 import os
 import shutil
 import logging
+import threading
+import time
+import typing
+import uuid
+import concurrent.futures
+import directory_index
+import metrics
+from enum import Enum, auto
 
 logger = logging.getLogger(__name__)
 
+_FICLONE: int = 0x40049409 # Linux ioctl cloning whole file
+DEFAULT_IO_WORKERS: int = 8
+
+class FilePlacement(Enum):
+    # How files are placed in saved map. Every method falls back to the next
+    # one if not supported (other file system, OS, kernel): REFLINK ->
+    # KERNEL_COPY -> COPY, HARDLINK -> KERNEL_COPY -> COPY.
+    COPY = auto()# shutil.copyfile, uses sendfile where possible
+    KERNEL_COPY = auto()# os.copy_file_range, data is not passed through user space, some file systems share it
+    REFLINK = auto()# copy-on-write clone (btrfs, XFS), new file shares data with source until modified
+    HARDLINK = auto()# no data written, but saved file IS the source file, changing one changes the other
+
+class PlacementSummary:
+    def __init__(self,
+                 copied_files: int = 0,
+                 copied_bytes: int = 0,
+                 linked_files: int = 0,# hardlinked or reflinked
+                 linked_bytes: int = 0,
+                 ) -> None:
+        self.copied_files: int = copied_files
+        self.copied_bytes: int = copied_bytes
+        self.linked_files: int = linked_files
+        self.linked_bytes: int = linked_bytes
+    
+    def __add__(self, other: 'PlacementSummary') -> 'PlacementSummary':
+        return PlacementSummary(self.copied_files + other.copied_files,
+                                self.copied_bytes + other.copied_bytes,
+                                self.linked_files + other.linked_files,
+                                self.linked_bytes + other.linked_bytes)
+    
+    def __str__(self) -> str:
+        return f"{self.copied_bytes} bytes copied ({self.copied_files} files), {self.linked_bytes} bytes linked ({self.linked_files} files)"
+
+def _reflink(source: str, target: str) -> bool:# target is new file
+    try:
+        import fcntl
+    except ImportError:# Windows
+        return False
+    with open(source, 'rb') as source_file, open(target, 'wb') as target_file:
+        try:
+            fcntl.ioctl(target_file.fileno(), _FICLONE, source_file.fileno())
+        except OSError:
+            return False
+    return True
+
+def _kernel_copy(source: str, target: str) -> bool:# target is new file
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    with open(source, 'rb') as source_file:
+        remaining: int = os.fstat(source_file.fileno()).st_size
+        with open(target, 'wb') as target_file:
+            try:
+                while remaining > 0:
+                    copied: int = os.copy_file_range(source_file.fileno(), target_file.fileno(), remaining)
+                    if copied == 0:# source shrank or file system copies nothing, target is not complete
+                        return False
+                    remaining -= copied
+            except OSError:
+                return False
+    return True
+
+def _hardlink(source: str, target: str) -> bool:
+    try:
+        os.link(source, target)
+    except OSError:
+        return False
+    return True
+
+def _replaced(write: typing.Callable[[str, str], bool], source: str, target: str) -> bool:
+    # written to temporary file replacing target when complete, so target
+    # existing before (maybe a link to other file) is never truncated
+    temporary: str = os.path.join(os.path.dirname(target), f".{os.path.basename(target)}.{uuid.uuid4().hex}.tmp")
+    try:
+        if write(source, temporary):
+            os.replace(temporary, target)
+            return True
+    except BaseException:
+        _remove_if_exists(temporary)
+        raise
+    _remove_if_exists(temporary)
+    return False
+
+def _remove_if_exists(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def place_file(source: str, target: str, placement: FilePlacement = FilePlacement.COPY) -> PlacementSummary:
+    if os.path.exists(target) and os.path.samefile(source, target):# eg. target hardlinked to source before
+        raise shutil.SameFileError(f"\"{source}\" and \"{target}\" are the same file")
+    size: int = os.path.getsize(source)
+    if placement is FilePlacement.HARDLINK and _hardlink(source, target):
+        return PlacementSummary(linked_files=1, linked_bytes=size)
+    if placement is FilePlacement.REFLINK and _replaced(_reflink, source, target):
+        return PlacementSummary(linked_files=1, linked_bytes=size)
+    if placement is FilePlacement.COPY or not _replaced(_kernel_copy, source, target):
+        shutil.copyfile(source, target)
+    return PlacementSummary(copied_files=1, copied_bytes=size)
+
+class FilesPlacer:
+    # Places files in pool of threads, so waiting for disk or network share
+    # while placing one file overlaps with others. Every target is placed
+    # once, even if submitted many times. Errors are collected, see errors
+    # after wait().
+    def __init__(self,
+                 placement: FilePlacement = FilePlacement.COPY,
+                 workers: int = DEFAULT_IO_WORKERS,
+                 progress: typing.Callable[[int, int], None] | None = None,# (done, submitted), called from pool's threads
+                 observer: metrics.Observer | None = None,# placed files are reported as files of "copy" phase
+                 ) -> None:
+        self.placement: FilePlacement = placement
+        self.summary: PlacementSummary = PlacementSummary()# of placed files, after wait()
+        self.errors: list[tuple[str, BaseException]] = []# (target, its error)
+        self.__progress: typing.Callable[[int, int], None] | None = progress
+        self.__observer: metrics.Observer | None = observer
+        self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="FilesPlacer")
+        self.__lock = threading.Lock()
+        self.__sources: dict[str, str] = {}# target: source
+        self.__done: int = 0
+        self.__futures: list[tuple[str, concurrent.futures.Future]] = []
+    
+    def __enter__(self) -> 'FilesPlacer':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.__executor.shutdown(cancel_futures=exc_type is not None)
+    
+    def place(self, source: str, target: str) -> None:
+        with self.__lock:
+            if target in self.__sources:
+                if self.__sources[target] != source:
+                    logger.warning(f"File {target} is already placed from {self.__sources[target]}, {source} will not be placed")
+                return
+            self.__sources[target] = source
+        self.__futures.append((target, self.__executor.submit(self.__place, source, target)))
+    
+    def place_all(self, placements: typing.Iterable[tuple[str, str]]) -> None:# (source, target)
+        for source, target in placements:
+            self.place(source, target)
+    
+    def __place(self, source: str, target: str) -> PlacementSummary:
+        if self.__observer is not None:
+            self.__observer.file_started("copy", target)
+        start: float = time.perf_counter()
+        summary: PlacementSummary | None = None
+        error: str | None = None
+        try:
+            summary = place_file(source, target, self.placement)
+            return summary
+        except Exception as exception:
+            error = f"{type(exception).__name__}: {exception}"
+            raise
+        finally:# failed files are done too
+            if self.__observer is not None:
+                self.__observer.file_finished("copy", target, time.perf_counter() - start,
+                                              None if summary is None else summary.copied_bytes + summary.linked_bytes, error=error)
+            with self.__lock:
+                self.__done += 1
+                done, submitted = self.__done, len(self.__sources)
+            logger.info(f"Placing file {target} done, {done}/{submitted} files done")
+            if self.__progress is not None:
+                self.__progress(done, submitted)
+    
+    def wait(self) -> PlacementSummary:
+        futures, self.__futures = self.__futures, []
+        for target, future in futures:
+            try:
+                self.summary += future.result()
+            except Exception as exception:
+                logger.error(f"Placing file {target} failed ({type(exception).__name__}: {exception})")
+                self.errors.append((target, exception))
+        return self.summary
+
 class OmsiFile:
     def __init__(self,
                  map_path,#="",
@@ -34,7 +216,7 @@ class OmsiFile:
         self.params: dict[str, str] = params
         self.optional = optional
         if real_file_name is None:
-            self.real_file_name = os.path.realpath(os.path.join(self.map_path, self.get_file_name()))
+            self.real_file_name = directory_index.of(self.map_path).real_path(self.get_file_name())
         else:
             self.real_file_name = real_file_name
             
@@ -43,20 +225,33 @@ class OmsiFile:
             return self.pattern
         return self.pattern.format(**self.params)
     
-    def save(self,
-             target_directory=""
-             ) -> None:
-        real_target_file = os.path.realpath(os.path.join(target_directory, self.get_file_name()))
-        if os.path.isfile(self.real_file_name):
+    def with_params(self, params: dict[str, str]) -> 'OmsiFile':# same source file, other target file name
+        return OmsiFile(self.map_path, self.pattern, (self.params or {}) | params, self.optional, self.real_file_name)
+    
+    def target(self,
+               target_directory="",
+               ) -> str | None:# None if file will not be placed
+        real_target_file = directory_index.of(target_directory).real_path(self.get_file_name())
+        if directory_index.of(self.map_path).isfile_real(self.real_file_name):
             if not self.real_file_name == real_target_file:
-                logger.info("Copying file "+ self.real_file_name + " to " + real_target_file)
-                shutil.copyfile(self.real_file_name, real_target_file)
+                return real_target_file
             else:
                 logger.info("File " + self.real_file_name + " will not be copied to the same directory")
         elif self.optional:
             logger.info("Optional file " + self.real_file_name + " does not exist, will not be copied.")
         else:
             logger.info("Non-optional file " + self.real_file_name + " does not exist, will not be copied.")
+        return None
+    
+    def save(self,
+             target_directory="",
+             placement: FilePlacement = FilePlacement.COPY,
+             ) -> PlacementSummary:
+        real_target_file = self.target(target_directory)
+        if real_target_file is None:
+            return PlacementSummary()
+        logger.info("Placing file "+ self.real_file_name + " to " + real_target_file + " (" + placement.name + ")")
+        return place_file(self.real_file_name, real_target_file, placement)
 
 class OmsiFiles:
     def __init__(self, omsi_files=[]):
@@ -66,10 +261,23 @@ class OmsiFiles:
         self.omsi_files.append(omsi_file)
     
     def save(self,
-             target_directory=""
-             ) -> None:
+             target_directory="",
+             placement: FilePlacement = FilePlacement.COPY,
+             placer: FilesPlacer | None = None,# files are only submitted to placer, they are counted in its summary
+             ) -> PlacementSummary:
+        if placer is not None:
+            placer.place_all(self.placements(target_directory))
+            return PlacementSummary()
+        summary: PlacementSummary = PlacementSummary()
         for of in self.omsi_files:
-            of.save(target_directory)
+            summary += of.save(target_directory, placement)
+        return summary
+    
+    def placements(self,
+                   target_directory="",
+                   ) -> list[tuple[str, str]]:# (source, target) of files to place
+        targets: list[tuple[str, str | None]] = [(of.real_file_name, of.target(target_directory)) for of in self.omsi_files]
+        return [(source, target) for source, target in targets if target is not None]
     
     def get_files_names(self) -> list[str]:
         return [ofile.get_file_name() for ofile in self.omsi_files]
@@ -0,0 +1,115 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import pytest
+import omsi_files
+
+@pytest.fixture
+def source_map(tmp_path) -> str:
+    directory: str = str(tmp_path / "map")
+    os.makedirs(os.path.join(directory, "texture", "map"))
+    with open(os.path.join(directory, "tile_0_0.map.terrain"), 'wb') as f:
+        f.write(b"terrain" * 1000)
+    with open(os.path.join(directory, "texture", "map", "tile_0_0.map.1.dds"), 'wb') as f:
+        f.write(b"dds" * 10)
+    return directory
+
+def some_files(directory: str) -> omsi_files.OmsiFiles:
+    return omsi_files.OmsiFiles([
+        omsi_files.OmsiFile(directory, "tile_{pos_x}_{pos_y}.map.terrain", {"pos_x": "0", "pos_y": "0"}, optional=True).with_params({"pos_x": "1"}),
+        omsi_files.OmsiFile(directory, "texture/map/tile_{pos_x}_{pos_y}.map.1.dds", {"pos_x": "0", "pos_y": "0"}, optional=True),
+        omsi_files.OmsiFile(directory, "tile_{pos_x}_{pos_y}.map.water", {"pos_x": "0", "pos_y": "0"}, optional=True),
+    ])
+
+@pytest.mark.parametrize("placement", list(omsi_files.FilePlacement), ids=lambda placement: placement.name)
+def test_placement(placement, source_map, tmp_path) -> None:# every placement (or its fallback) gives the same files
+    target: str = str(tmp_path / "target")
+    os.makedirs(os.path.join(target, "texture", "map"))
+    summary: omsi_files.PlacementSummary = some_files(source_map).save(target, placement)
+    with open(os.path.join(target, "tile_1_0.map.terrain"), 'rb') as f:
+        assert f.read() == b"terrain" * 1000
+    with open(os.path.join(target, "texture", "map", "tile_0_0.map.1.dds"), 'rb') as f:
+        assert f.read() == b"dds" * 10
+    assert not os.path.exists(os.path.join(target, "tile_0_0.map.water"))
+    assert summary.copied_files + summary.linked_files == 2
+    assert summary.copied_bytes + summary.linked_bytes == 7030
+    if placement is omsi_files.FilePlacement.HARDLINK:# same file system
+        assert summary.linked_bytes == 7030
+        assert os.path.samefile(os.path.join(target, "tile_1_0.map.terrain"), os.path.join(source_map, "tile_0_0.map.terrain"))
+    elif placement in [omsi_files.FilePlacement.COPY, omsi_files.FilePlacement.KERNEL_COPY]:
+        assert summary.copied_bytes == 7030
+        assert not os.path.samefile(os.path.join(target, "tile_1_0.map.terrain"), os.path.join(source_map, "tile_0_0.map.terrain"))
+
+def test_placement_fallback(source_map, tmp_path, monkeypatch) -> None:
+    def cross_device_link(*args) -> None:
+        raise OSError("Invalid cross-device link")
+    monkeypatch.setattr(os, "link", cross_device_link)
+    target: str = str(tmp_path / "target")
+    os.makedirs(os.path.join(target, "texture", "map"))
+    summary: omsi_files.PlacementSummary = some_files(source_map).save(target, omsi_files.FilePlacement.HARDLINK)
+    assert (summary.copied_bytes, summary.linked_bytes) == (7030, 0)
+    with open(os.path.join(target, "tile_1_0.map.terrain"), 'rb') as f:
+        assert f.read() == b"terrain" * 1000
+
+@pytest.mark.parametrize("placement", list(omsi_files.FilePlacement), ids=lambda placement: placement.name)
+def test_placement_onto_source(placement, source_map, tmp_path) -> None:# target hardlinked to source before is not truncated
+    source: str = os.path.join(source_map, "tile_0_0.map.terrain")
+    target: str = str(tmp_path / "tile_1_0.map.terrain")
+    os.link(source, target)
+    with pytest.raises(shutil.SameFileError):
+        omsi_files.place_file(source, target, placement)
+    with open(source, 'rb') as f:
+        assert f.read() == b"terrain" * 1000
+
+def test_placement_over_existing_link(source_map, tmp_path) -> None:# other file linked to target is not changed
+    other: str = str(tmp_path / "other")
+    with open(other, 'wb') as f:
+        f.write(b"other")
+    target: str = str(tmp_path / "target")
+    os.link(other, target)
+    omsi_files.place_file(os.path.join(source_map, "tile_0_0.map.terrain"), target, omsi_files.FilePlacement.KERNEL_COPY)
+    with open(target, 'rb') as f:
+        assert f.read() == b"terrain" * 1000
+    with open(other, 'rb') as f:
+        assert f.read() == b"other"
+
+def test_kernel_copy_incomplete(source_map, tmp_path, monkeypatch) -> None:# falls back to copy
+    monkeypatch.setattr(os, "copy_file_range", lambda *args: 0, raising=False)
+    target: str = str(tmp_path / "target")
+    summary: omsi_files.PlacementSummary = omsi_files.place_file(os.path.join(source_map, "tile_0_0.map.terrain"), target, omsi_files.FilePlacement.KERNEL_COPY)
+    assert summary.copied_bytes == 7000
+    with open(target, 'rb') as f:
+        assert f.read() == b"terrain" * 1000
+    assert sorted(os.listdir(tmp_path)) == ["map", "target"]# temporary file is removed
+
+def test_files_placer(source_map, tmp_path) -> None:# the same target is placed once, errors are collected
+    target: str = str(tmp_path / "target")
+    os.makedirs(os.path.join(target, "texture", "map"))
+    progress: list[tuple[int, int]] = []
+    with omsi_files.FilesPlacer(workers=2, progress=lambda done, submitted: progress.append((done, submitted))) as placer:
+        some_files(source_map).save(target, placer=placer)
+        some_files(source_map).save(target, placer=placer)
+        placer.place(os.path.join(source_map, "not_existing.terrain"), os.path.join(target, "not_existing.terrain"))
+        summary: omsi_files.PlacementSummary = placer.wait()
+    assert (summary.copied_files, summary.copied_bytes) == (2, 7030)
+    assert [target for target, _ in placer.errors] == [os.path.join(target, "not_existing.terrain")]
+    assert isinstance(placer.errors[0][1], FileNotFoundError)
+    assert sorted(progress)[-1] == (3, 3)
+    with open(os.path.join(target, "tile_1_0.map.terrain"), 'rb') as f:
+        assert f.read() == b"terrain" * 1000
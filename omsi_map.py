@@ -16,8 +16,12 @@
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import glob
 import itertools
+import collections.abc
+import concurrent.futures
+import directory_index
+import functools
+import multiprocessing
 import global_config
 import global_config_parser
 import global_config_serializer
@@ -30,8 +34,14 @@ import ailists
 import ailists_parser
 import ailists_serializer
 import chrono
+import lazy_instance
 import loader
+import parse_cache
 import logging
+import metrics
+import operator
+import time
+import traceback
 import typing
 
 logger = logging.getLogger(__name__)
@@ -39,56 +49,205 @@ logger = logging.getLogger(__name__)
 GLOBAL_CONFIG_FILENAME = "global.cfg"
 AILISTS_FILENAME = "ailists.cfg"
 
-_global_config_parser = global_config_parser.GlobalConfigParser()
+_global_config_parser = lazy_instance.LazyInstance(global_config_parser.GlobalConfigParser)
 _global_config_serializer = global_config_serializer.GlobalConfigSerializer()
 
-_tile_parser = tile_parser.TileParser()
+_tile_parser = lazy_instance.LazyInstance(tile_parser.TileParser)
 _tile_serializer = tile_serializer.TileSerializer()
 
-_ailists_parser = ailists_parser.AIListsParser()
+_ailists_parser = lazy_instance.LazyInstance(ailists_parser.AIListsParser)
 _ailists_serializer = ailists_serializer.AIListsSerializer()
 
+# module level functions (unlike bound methods of parsers) are picklable,
+# so they can be used as true loaders with loader.ParallelLoader
+
+def parse_global_config(path: str) -> global_config.GlobalConfig:
+    return _global_config_parser.get().parse(path)
+
+def parse_tile(path: str) -> tile.Tile:
+    return _tile_parser.get().parse(path)
+
+def parse_ailists(path: str) -> ailists.AILists:
+    return _ailists_parser.get().parse(path)
+
+type TileTransform = typing.Callable[[tile.Tile], tile.Tile]
+
+class DeferredTiles(collections.abc.Sequence):
+    # Tiles of lazy tile loaders, every access parses tile again and nothing
+    # is kept, so only tiles in use are held in memory. Changes of tiles are
+    # recorded as transforms and applied to every freshly parsed tile.
+    def __init__(self, sources: list[tuple[loader.SafeLoaderUnit[tile.Tile], tuple[TileTransform, ...]]]) -> None:
+        self.__sources: list[tuple[loader.SafeLoaderUnit[tile.Tile], tuple[TileTransform, ...]]] = sources
+    
+    def __len__(self) -> int:
+        return len(self.__sources)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return DeferredTiles(self.__sources[index])
+        tile_sl, transforms = self.__sources[index]
+        til: tile.Tile = tile_sl.get_data()
+        for transform in transforms:
+            til = transform(til)
+        return til
+    
+    def __add__(self, other: 'DeferredTiles') -> 'DeferredTiles':
+        return DeferredTiles(self.__sources + other.__sources)
+    
+    def transformed(self, transforms: typing.Iterable[TileTransform]) -> 'DeferredTiles':# one transform per tile
+        return DeferredTiles([(tile_sl, tile_transforms + (transform,)) for (tile_sl, tile_transforms), transform in zip(self.__sources, transforms, strict=True)])
+    
+    def set_stats(self, index: int, stats: loader.LoadStats) -> None:# of tile parsed by worker saving it
+        tile_sl, _ = self.__sources[index]
+        tile_sl.set_read(stats, None)
+    
+    def submit_save(self, executor: concurrent.futures.Executor, directory: str, map_files: list[str]) -> list[concurrent.futures.Future]:
+        # every tile is parsed, changed and serialized in worker process, parent process holds no tiles,
+        # true loaders and transforms must be picklable
+        return [executor.submit(_save_deferred_tile, tile_sl.get_true_loader(), tile_sl.get_path(), transforms, directory, map_file)
+                for (tile_sl, transforms), map_file in zip(self.__sources, map_files, strict=True)]
+
+class _SavedTile:# result of saving tile, returned by workers
+    def __init__(self, placements: list[tuple[str, str]], objects: int, seconds: float, stats: loader.LoadStats | None = None) -> None:
+        self.placements: list[tuple[str, str]] = placements# files of tile to place by files placer
+        self.objects: int = objects
+        self.seconds: float = seconds# of serializing, with parsing of deferred tile
+        self.stats: loader.LoadStats | None = stats# of parsing deferred tile
+
+def _save_tile(til: tile.Tile, directory: str, map_file: str, start: float | None = None) -> _SavedTile:
+    start = time.perf_counter() if start is None else start
+    _tile_serializer.serialize(til, os.path.join(directory, map_file))
+    return _SavedTile(til._files.placements(directory), til.objects_count(), time.perf_counter() - start)
+
+def _save_deferred_tile(true_loader: typing.Callable[[str], tile.Tile], path: str, transforms: tuple[TileTransform, ...], directory: str, map_file: str) -> _SavedTile:
+    start: float = time.perf_counter()
+    til: tile.Tile
+    til, exception, _, stats, _ = loader.read_file(true_loader, path)
+    if exception is not None:
+        raise exception
+    for transform in transforms:
+        til = transform(til)
+    saved_tile: _SavedTile = _save_tile(til, directory, map_file, start)
+    saved_tile.stats = stats
+    return saved_tile
+
+type Tiles = list[tile.Tile] | DeferredTiles
+
+def tiles_transformed(tiles: Tiles, transforms: typing.Iterable[TileTransform]) -> Tiles:
+    # transforms are applied to parsed tiles at once, deferred tiles get them when parsed
+    if isinstance(tiles, DeferredTiles):
+        return tiles.transformed(transforms)
+    return [transform(til) for til, transform in zip(tiles, transforms, strict=True)]
+
+def concatenated_tiles(tiles_list: list[Tiles]) -> Tiles:
+    if all([isinstance(tiles, DeferredTiles) for tiles in tiles_list]):
+        return functools.reduce(operator.add, typing.cast(list[DeferredTiles], tiles_list), DeferredTiles([]))
+    return list(itertools.chain.from_iterable(tiles_list))
+
+class MapSaveError(Exception):
+    # parts of map are saved at the same time, so more than one of them may fail
+    def __init__(self, errors: list[tuple[str, BaseException]]) -> None:# (part of map, its error)
+        self.errors: list[tuple[str, BaseException]] = errors
+        super().__init__(f"Saving {len(errors)} part(s) of map failed:\n" +
+                         "\n".join([f"* {part}:\n{"".join(traceback.format_exception(error))}" for part, error in errors]))
+
+def _shifted_tile(tile_index: int, ids_value: int, groundtex_value: int, til: tile.Tile) -> tile.Tile:
+    logger.info(f"Changing objects' IDs and splines' IDs: TILE {tile_index}")
+    return tile.ColumnarTile.of(til).shifted_ids(ids_value).shifted_groundtex_indices(groundtex_value)
+
 class OmsiMap:
     def __init__(self,
                  mglobal_config: global_config.GlobalConfig,
-                 mtiles: list[tile.Tile],
+                 mtiles: Tiles,
                  momsi_files: omsi_files.OmsiFiles,
                  mstandard_timetable: timetable.Timetable,
                  mailists: ailists.AILists,
                  mchronos: list[chrono.Chrono],
     ):
         self.global_config: global_config.GlobalConfig = mglobal_config
-        self.tiles: list[tile.Tile] = mtiles
+        self.tiles: Tiles = mtiles
         self.mfiles: omsi_files.OmsiFiles = momsi_files
         self.mstandard_timetable: timetable.Timetable = mstandard_timetable
         self.ailists: ailists.AILists = mailists
         self.mchronos: list[chrono.Chrono] = mchronos
     
-    def shift_ids(self, value: int) -> None:
-        for mtile in self.tiles:
-            mtile.change_ids(value)
-    
-    def change_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> None:
-        for tile_index, til in zip(itertools.count(), self.tiles):
-            logger.info(f"Changing objects' IDs and splines' IDs: TILE {tile_index}")
-            til.change_ids(ids_value)
+    def shifted(self, ids_value: int, tile_indices_value: int, groundtex_value: int) -> 'OmsiMap':
+        # self is not changed, unchanged parts (strings, rule lists, ailists, time table lines...) are shared with self
+        tiles: Tiles = tiles_transformed(self.tiles, [functools.partial(_shifted_tile, tile_index, ids_value, groundtex_value) for tile_index in range(len(self.tiles))])
         
-        self.mstandard_timetable.change_ids_and_tile_indices(ids_value, tile_indices_value)
+        mstandard_timetable: timetable.Timetable = self.mstandard_timetable.shifted_ids_and_tile_indices(ids_value, tile_indices_value)
         
         logger.info("Changing entrypoints' IDs and tile indices: global_config")
-        self.global_config.change_ids_and_tile_indices(ids_value, tile_indices_value)
+        mglobal_config: global_config.GlobalConfig = self.global_config.shifted_ids_and_tile_indices(ids_value, tile_indices_value)
         
-        for chrono in self.mchronos:
-            chrono.change_ids_and_tile_indices(ids_value, tile_indices_value)
+        mchronos: list[chrono.Chrono] = [mchrono.shifted_ids_and_tile_indices(ids_value, tile_indices_value) for mchrono in self.mchronos]
+        return OmsiMap(mglobal_config, tiles, self.mfiles, mstandard_timetable, self.ailists, mchronos)
     
-    def change_groundtex_indices(self, value: int) -> None:
-        for til in self.tiles:
-            til.change_groundtex_indices(value)
+    def save_tiles(self,
+                   directory: str,
+                   workers: int = 1,
+                   placement: omsi_files.FilePlacement = omsi_files.FilePlacement.COPY,
+                   io_workers: int = omsi_files.DEFAULT_IO_WORKERS,
+                   ) -> omsi_files.PlacementSummary:
+        with omsi_files.FilesPlacer(placement, io_workers) as placer:
+            self.__save_tiles(directory, workers, placer, [])
+        return placer.summary
     
-    def save_tiles(self, directory: str) -> None:
-        for gc_tile, map_tile in zip(self.global_config._map, self.tiles):
-            _tile_serializer.serialize(map_tile, os.path.join(directory, gc_tile.map_file))
-            map_tile.save_files(directory)
+    def __save_tiles(self,
+                     directory: str,
+                     workers: int,
+                     placer: omsi_files.FilesPlacer,
+                     parts: list[tuple[str, typing.Callable[[], None]]],
+                     observer: metrics.Observer | None = None,
+                     ) -> None:
+        # Tiles are serialized here, or by workers (deferred tiles parsed by
+        # workers holding one tile each), while other parts are saved here.
+        # Files of tiles and parts are placed by placer. Errors of workers
+        # and placer are collected and raised together as MapSaveError.
+        errors: list[tuple[str, BaseException]] = []
+        map_files: list[str] = [gc_tile.map_file for gc_tile in self.global_config._map]
+        def place_tile(map_file: str, saved_tile: _SavedTile) -> None:
+            if observer is not None:
+                observer.file_finished("serialize", map_file, saved_tile.seconds, os.path.getsize(os.path.join(directory, map_file)), saved_tile.objects)
+            placer.place_all(saved_tile.placements)
+        if workers <= 1:
+            for part, save_part in parts:
+                metrics.reported(observer, "serialize", part, save_part)
+            for index, map_file in enumerate(map_files):
+                if observer is not None:
+                    observer.file_started("serialize", map_file)
+                start: float = time.perf_counter()
+                place_tile(map_file, _save_tile(self.tiles[index], directory, map_file, start))# deferred tile is parsed by self.tiles[index]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                try:
+                    futures: list[concurrent.futures.Future]
+                    if isinstance(self.tiles, DeferredTiles):
+                        futures = self.tiles.submit_save(executor, directory, map_files)
+                    else:
+                        futures = [executor.submit(_save_tile, map_tile, directory, map_file) for map_tile, map_file in zip(self.tiles, map_files)]
+                    for part, save_part in parts:
+                        try:
+                            metrics.reported(observer, "serialize", part, save_part)
+                        except Exception as exception:
+                            logger.error(f"Saving {part} failed ({type(exception).__name__}: {exception})")
+                            errors.append((part, exception))
+                    for index, (map_file, future) in enumerate(zip(map_files, futures)):
+                        try:
+                            saved_tile: _SavedTile = future.result()
+                            if isinstance(self.tiles, DeferredTiles) and saved_tile.stats is not None:
+                                self.tiles.set_stats(index, saved_tile.stats)
+                            place_tile(map_file, saved_tile)
+                        except Exception as exception:
+                            logger.error(f"Saving {map_file} failed ({type(exception).__name__}: {exception})")
+                            errors.append((map_file, exception))
+                except BaseException:
+                    executor.shutdown(cancel_futures=True)
+                    raise
+        placer.wait()
+        errors += placer.errors
+        if errors:
+            raise MapSaveError(errors)
     
     def get_time_table_line_names(self) -> list[str]:
         return list(set(itertools.chain.from_iterable([tt.get_time_table_line_names() for tt in [self.mstandard_timetable] + [mchrono.timetable for mchrono in self.mchronos]])))
@@ -99,7 +258,25 @@ class OmsiMap:
     def get_trips_names(self) -> list[str]:
         return list(set(itertools.chain.from_iterable([tt.get_trips_names() for tt in [self.mstandard_timetable] + [mchrono.timetable for mchrono in self.mchronos]])))
     
-    def save(self, directory: str) -> None:
+    def save(self,
+             directory: str,
+             workers: int = 1,
+             placement: omsi_files.FilePlacement = omsi_files.FilePlacement.COPY,
+             io_workers: int = omsi_files.DEFAULT_IO_WORKERS,# threads placing files
+             files_progress: typing.Callable[[int, int], None] | None = None,# see omsi_files.FilesPlacer
+             observer: metrics.Observer | None = None,
+             ) -> omsi_files.PlacementSummary:
+        with metrics.phase(observer, "save"):
+            return self.__save(directory, workers, placement, io_workers, files_progress, observer)
+    
+    def __save(self,
+               directory: str,
+               workers: int,
+               placement: omsi_files.FilePlacement,
+               io_workers: int,
+               files_progress: typing.Callable[[int, int], None] | None,
+               observer: metrics.Observer | None,
+               ) -> omsi_files.PlacementSummary:
         #prepare directories
         logger.info(f"Saving OmsiMap to directory: \"{directory}\"")
         logger.info(f"Will create \"{directory}\" directory if not exists")
@@ -107,15 +284,18 @@ class OmsiMap:
         if os.listdir(directory) != []:
             raise Exception(f"Directory \"{directory}\" isn't empty.\nYou can save map only to empty directory.")
         os.makedirs(os.path.join(directory, 'texture', 'map'))
+        directory_index.refresh_all()# files of maps may have changed since they were loaded
         
-        _global_config_serializer.serialize(self.global_config, os.path.join(directory, GLOBAL_CONFIG_FILENAME))
-        self.save_tiles(directory)
-        self.mfiles.save(directory)
-        self.mstandard_timetable.save(directory)
-        _ailists_serializer.serialize(self.ailists, os.path.join(directory, AILISTS_FILENAME))
-        for chrono in self.mchronos:
-            chrono.save(directory)
-        logger.info("Map saving completed")
+        with omsi_files.FilesPlacer(placement, io_workers, files_progress, observer) as placer:
+            parts: list[tuple[str, typing.Callable[[], None]]] = [
+                (GLOBAL_CONFIG_FILENAME, functools.partial(_global_config_serializer.serialize, self.global_config, os.path.join(directory, GLOBAL_CONFIG_FILENAME))),
+                ("map files", functools.partial(self.mfiles.save, directory, placer=placer)),
+                ("timetable", functools.partial(self.mstandard_timetable.save, directory)),
+                (AILISTS_FILENAME, functools.partial(_ailists_serializer.serialize, self.ailists, os.path.join(directory, AILISTS_FILENAME))),
+            ] + [(mchrono.chrono_directory, functools.partial(mchrono.save, directory, placer=placer)) for mchrono in self.mchronos]
+            self.__save_tiles(directory, workers, placer, parts, observer)
+        logger.info(f"Map saving completed, {placer.summary}")
+        return placer.summary
 
 class TileOFInjector:
     def __init__(self,
@@ -131,6 +311,11 @@ class TileOFInjector:
     
 class OmsiMapSl(loader.SafeLoaderList):
     def set_tiles_and_chronos_gc_consistent(self) -> None:
+        # loaders of tiles with the same file and attached files are kept, so reload() does not parse them again
+        previous_tiles: dict[tuple[str, tuple[str, ...]], loader.SafeLoaderUnit] = {
+            (tile_sl.get_path(), tuple(tile_sl.get_omsi_files().get_files_names())): tile_sl
+            for tile_sl in typing.cast(list[loader.SafeLoaderUnit], self._tiles.get_sl_list())}
+        previous_chronos: list[chrono.ChronoSl] = typing.cast(list[chrono.ChronoSl], self._chronos.get_sl_list())
         self.empty_tiles_and_chronos()
         # set tiles' safe parsers
         tiles_safe_loaders: list[loader.SafeLoader] = []
@@ -158,27 +343,36 @@ class OmsiMapSl(loader.SafeLoaderList):
                                       params={"pos_x": gc_tile.pos_x, "pos_y": gc_tile.pos_y, "groundtex_index": str(groundtex_index)},
                                       optional=True)
                   for groundtex_index in range(1, groundtex_count+1) ])
-            tiles_safe_loaders.append(loader.SafeLoaderUnit(tile.Tile, os.path.join(self.directory, gc_tile.map_file), TileOFInjector(_tile_parser.parse, tile_files).parse , ofiles=tile_files))
+            tile_path: str = os.path.join(self.directory, gc_tile.map_file)
+            previous_tile: loader.SafeLoaderUnit | None = previous_tiles.get((tile_path, tuple(tile_files.get_files_names())))
+            if previous_tile is not None:
+                tiles_safe_loaders.append(previous_tile)
+            else:
+                tiles_safe_loaders.append(loader.SafeLoaderUnit(tile.Tile, tile_path, TileOFInjector(parse_cache.cached(parse_tile, self.cache), tile_files).parse , ofiles=tile_files, lazy=self.lazy_tiles))
         self._tiles.set_sl_list(tiles_safe_loaders)
-        self.scan_chrono()
+        self.scan_chrono(previous_chronos)
     
     def empty_tiles_and_chronos(self) -> None:
         self._tiles.set_sl_list([])
         self._chronos.set_sl_list([])
 
     def __init__(self,
-                 directory=""):
+                 directory="",
+                 cache: parse_cache.ParseCache | None = None,
+                 lazy_tiles: bool = False):# lazy tiles are parsed when needed, eg. when saving merged map
         self.directory = directory
+        self.cache: parse_cache.ParseCache | None = cache
+        self.lazy_tiles: bool = lazy_tiles
         self._global_config: loader.SafeLoaderUnit[global_config.GlobalConfig] = loader.SafeLoaderUnit(global_config.GlobalConfig,
                                                                            os.path.join(self.directory, GLOBAL_CONFIG_FILENAME),
-                                                                           _global_config_parser.parse,
+                                                                           parse_cache.cached(parse_global_config, self.cache),
                                                                            self.set_tiles_and_chronos_gc_consistent, # on success
                                                                            self.empty_tiles_and_chronos, # on fail
                                                                            )
         self._tiles: loader.SafeLoaderList = loader.SafeLoaderList([], "Tiles")
         self._files: omsi_files.OmsiFiles = omsi_files.OmsiFiles(self.__fresh_omsi_files())
-        self._standard_timetable: timetable.TimetableSl = timetable.TimetableSl(self.directory)
-        self._ailists: loader.SafeLoaderUnit = loader.SafeLoaderUnit(ailists.AILists, os.path.join(self.directory, AILISTS_FILENAME), _ailists_parser.parse)
+        self._standard_timetable: timetable.TimetableSl = timetable.TimetableSl(self.directory, cache=self.cache)
+        self._ailists: loader.SafeLoaderUnit = loader.SafeLoaderUnit(ailists.AILists, os.path.join(self.directory, AILISTS_FILENAME), parse_cache.cached(parse_ailists, self.cache))
         self._chronos: loader.SafeLoaderList = loader.SafeLoaderList([], "Chronos")
         super().__init__(
             [
@@ -192,9 +386,37 @@ class OmsiMapSl(loader.SafeLoaderList):
             self._files,
         )
     
-    def load(self) -> None:
+    def load(self, pool: loader.ParallelLoader | None = None, progress: loader.LoadProgress | None = None) -> None:
+        self.load_global_config(progress)
+        self.load_rest(pool, progress)
+    
+    def load_global_config(self, progress: loader.LoadProgress | None = None) -> None:
+        directory_index.of(self.directory).refresh()
         self._files.set_omsi_files(self.__fresh_omsi_files())
-        super().load()
+        # global config is always loaded here, tiles and chronos to load are known after that
+        self._global_config.load(None, progress)
+    
+    def load_rest(self, pool: loader.ParallelLoader | None = None, progress: loader.LoadProgress | None = None) -> None:# after load_global_config
+        for sl in self.get_sl_list():
+            if sl is not self._global_config:
+                sl.load(pool, progress)
+    
+    def reload(self, pool: loader.ParallelLoader | None = None, progress: loader.LoadProgress | None = None) -> None:
+        self.reload_global_config(progress)
+        self.reload_rest(pool, progress)
+    
+    def reload_global_config(self, progress: loader.LoadProgress | None = None) -> None:
+        directory_index.of(self.directory).refresh()
+        self._files.set_omsi_files(self.__fresh_omsi_files())
+        # if global config changed, its callback keeps loaders of unchanged tiles and chronos
+        self._global_config.reload(None, progress)
+        if self._global_config.get_status() is loader.FileParsingStatus.READ_SUCCESS:
+            self.scan_chrono(typing.cast(list[chrono.ChronoSl], self._chronos.get_sl_list()))
+    
+    def reload_rest(self, pool: loader.ParallelLoader | None = None, progress: loader.LoadProgress | None = None) -> None:# after reload_global_config
+        for sl in self.get_sl_list():
+            if sl is not self._global_config:
+                sl.reload(pool, progress)
     
     def get_directory(self):
         return self.directory
@@ -236,13 +458,16 @@ class OmsiMapSl(loader.SafeLoaderList):
                   "timezone.txt",
                   ]:
             of_list.append(omsi_files.OmsiFile(map_path=self.directory, pattern=f, optional=True))
-        for f in [os.path.relpath(x, self.directory) for x in glob.glob(os.path.join(self.directory, "Holidays_*.txt"))]:
+        for f in directory_index.of(self.directory).files("", "Holidays_*.txt"):
             of_list.append(omsi_files.OmsiFile(map_path=self.directory, pattern=f, optional=True))
         return of_list
 
-    def scan_chrono(self):
-        chrono_directory_list = [os.path.relpath(x, self.directory) for x in glob.glob(os.path.join(self.directory, "Chrono", "*", ""))]
-        self._chronos.set_sl_list([chrono.ChronoSl(self.directory, chrono_directory, self._global_config.get_data()._map) for chrono_directory in chrono_directory_list])
+    def scan_chrono(self, keep: list[chrono.ChronoSl] = []):# loaders from "keep" are reused for the same chrono directory and tiles
+        chrono_directory_list = directory_index.of(self.directory).directories("Chrono")
+        gc_map: list[global_config.Map] = self._global_config.get_data()._map
+        kept: dict[str, chrono.ChronoSl] = {chrono_sl.chrono_directory: chrono_sl for chrono_sl in keep if chrono_sl.gc_map == gc_map}
+        self._chronos.set_sl_list([kept[chrono_directory] if chrono_directory in kept else chrono.ChronoSl(self.directory, chrono_directory, gc_map, self.cache)
+                                   for chrono_directory in chrono_directory_list])
     
     def get_aigroups_names(self) -> list[str]:
         return [aigroup.name for aigroup in self.get_ailists().get_data().aigroups]
@@ -250,8 +475,14 @@ class OmsiMapSl(loader.SafeLoaderList):
     def get_data(self) -> OmsiMap:
         if not self.ready():
             raise loader.NoDataError
+        tiles_sl: list[loader.SafeLoaderUnit[tile.Tile]] = typing.cast(list[loader.SafeLoaderUnit[tile.Tile]], self.get_tiles().get_sl_list())
+        tiles: Tiles
+        if self.lazy_tiles:
+            tiles = DeferredTiles([(tile_sl, ()) for tile_sl in tiles_sl])
+        else:
+            tiles = [tile_sl.get_data() for tile_sl in tiles_sl]
         return OmsiMap(self.get_global_config().get_data(),
-                       [typing.cast(loader.SafeLoaderUnit[tile.Tile], tile_sl).get_data() for tile_sl in self.get_tiles().get_sl_list()],
+                       tiles,
                        self.get_omsi_files(),
                        self.get_standard_timetable().get_data(),
                        self.get_ailists().get_data(),
@@ -16,15 +16,18 @@
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
 import omsi_map
+import loader
+import metrics
+import parse_cache
 import global_config
 import tile
 import ailists
 import timetable
 import omsi_files
 import os
-import typing
 import itertools
 import operator
+import functools
 import version
 import copy
 import logging
@@ -60,10 +63,12 @@ class MapToMerge(omsi_map.OmsiMapSl):
                  shift_x: int,
                  shift_y: int,
                  keep_groundtex: bool,
+                 cache: parse_cache.ParseCache | None = None,
+                 lazy_tiles: bool = False,
                  ) -> None:
         if not os.path.isdir(directory):
             raise ValueError(f"\"{directory}\" is not directory")
-        super().__init__(directory)
+        super().__init__(directory, cache, lazy_tiles)
         self.shift_x: int = shift_x
         self.shift_y: int = shift_y
         self.__keep_groundtex: bool = keep_groundtex
@@ -91,6 +96,10 @@ class MapToMerge(omsi_map.OmsiMapSl):
         self.shift_x += shift_x
         self.shift_y += shift_y
     
+    def set_shift(self, shift_x: int, shift_y: int) -> None:
+        self.shift_x = shift_x
+        self.shift_y = shift_y
+    
     def get_keep_groundtex(self) -> bool:
         return self.__keep_groundtex
     
@@ -101,18 +110,7 @@ class MapToMerge(omsi_map.OmsiMapSl):
         self.__keep_groundtex = not self.get_keep_groundtex()
 
 def shifted_entrypoint(entrypoint: global_config.Entrypoints, shift_idcode: int, shift_tile_index: int,) -> global_config.Entrypoints:
-    return global_config.Entrypoints(entrypoint.object_on_tile_index,
-                                        entrypoint.id + shift_idcode,
-                                        entrypoint.line3,
-                                        entrypoint.line4,
-                                        entrypoint.line5,
-                                        entrypoint.line6,
-                                        entrypoint.line7,
-                                        entrypoint.line8,
-                                        entrypoint.line9,
-                                        entrypoint.line10,
-                                        entrypoint.tile_index + shift_tile_index,
-                                        entrypoint.name)
+    return entrypoint.shifted_ids_and_tile_indices(shift_idcode, shift_tile_index)
 
 def shifted_entrypoints(entrypoints: list[global_config.Entrypoints], shift_idcode: int, shift_tile_index: int) -> list[global_config.Entrypoints]:
     return [shifted_entrypoint(entrypoint, shift_idcode, shift_tile_index) for entrypoint in entrypoints]
@@ -128,40 +126,17 @@ def shifted_gc_tiles(gc_tiles: list[global_config.Map], shift_x: int, shift_y: i
     return [shifted_gc_tile(gc_tile, shift_x, shift_y) for gc_tile in gc_tiles]
 
 def tile_shifted_ids(tile_old: tile.Tile, id_shift: int) -> tile.Tile:
-    new_splines: list[tile.Spline] =  [tile.Spline(s.h, s.line1, s.file_name, s.id+id_shift, s.id_previous+id_shift if s.id_previous!=0 else 0, s.id_next+id_shift if s.id_next!=0 else 0, \
-                                                   s.pos_x, s.pos_z, s.pos_y, s.rotate, s.length, s.radius, \
-                                                   s.gradient_start, s.gradient_end, s.delta_h, s.cant_start, s.cant_end, s.skew_start, \
-                                                   s.skew_end, s.line18, s.mirror, s.spline_terrain_align_2, s.rule_list) \
-                                        for s in tile_old.spline]
-    
-    def sceneryobject_id_shifted(sco) -> tile._Object | tile.SplineAttachement | tile.SplineAttachementRepeater: # type: ignore
-        def son(sco_id: int | None, shift: int) -> int | None:
-            return None if sco_id is None else sco_id+shift
-        sco_type: typing.Type[tile._Object | tile.SplineAttachement | tile.SplineAttachementRepeater] = type(sco)
-        match sco_type:
-            case tile._Object:
-                return tile._Object(sco.description, sco.attach_object, sco.line1, sco.file_name, sco.id+id_shift, sco.pos_x, \
-                                    sco.pos_z, sco.pos_y, sco.rotate, sco.pitch, sco.bank, sco.line10, \
-                                        sco.opt_lines, son(sco.varparent, id_shift), sco.spline_terrain_align, sco.rule_list)
-            case tile.SplineAttachement:
-                return tile.SplineAttachement(sco.description, sco.line1, sco.file_name, sco.id+id_shift, sco.line4, sco.pos_x, \
-                                              sco.pos_z, sco.pos_y, sco.rotate, sco.pitch, sco.bank, sco.interval, \
-                                              sco.distance, sco.line13, sco.line14, sco.opt_lines, son(sco.varparent, id_shift), sco.spline_terrain_align, \
-                                              sco.rule_list)
-            case tile.SplineAttachementRepeater:
-                return tile.SplineAttachementRepeater(sco.description, sco.line1, sco.line2, sco.line3, sco.file_name, sco.id+id_shift, \
-                                                      sco.line6, sco.pos_x, sco.pos_z, sco.pos_y, sco.rotate, sco.pitch, \
-                                                      sco.bank, sco.interval, sco.distance, sco.line15, sco.line16, sco.opt_lines, \
-                                                      son(sco.varparent, id_shift), sco.spline_terrain_align, sco.rule_list)
-    
-    return tile.Tile(tile_old.initial_comment,
-                     tile_old.version,
-                     tile_old.terrain,
-                     tile_old.water,
-                     tile_old.variable_terrainlightmap,
-                     tile_old.variable_terrain,
-                     new_splines,
-                     list(map(sceneryobject_id_shifted, tile_old._object)))
+    return tile_old.shifted_ids(id_shift)
+
+def with_full_covered_groundtex(map_tile: tile.Tile, pos_x: int, pos_y: int, groundtex_index: int) -> tile.Tile:
+    full_covered_groundtex_file:omsi_files.OmsiFile = \
+        omsi_files.OmsiFile(map_path=os.path.dirname(os.path.abspath(__file__)),
+        pattern="texture/map/tile_{pos_x}_{pos_y}.map.{groundtex_index}.dds",
+        params={"pos_x": "0", "pos_y": "0", "groundtex_index": "0"})
+    full_covered_groundtex_file.params['pos_x'] = pos_x
+    full_covered_groundtex_file.params['pos_y'] = pos_y
+    full_covered_groundtex_file.params['groundtex_index'] = str(groundtex_index)
+    return map_tile.with_file(full_covered_groundtex_file)
 
 class MergeResult:
     def __init__(self,
@@ -171,8 +146,13 @@ class MergeResult:
         self.warnings: list[str] = warnings
 
 class OmsiMapMerger:
-    def __init__(self) -> None:
+    def __init__(self,
+                 cache: parse_cache.ParseCache | None = None,
+                 lazy_tiles: bool = False,# tiles are parsed only when merged map is saved
+                 ) -> None:
         self.__maps: list[MapToMerge] = []
+        self.__cache: parse_cache.ParseCache | None = cache
+        self.__lazy_tiles: bool = lazy_tiles
     
     def get_maps(self) -> list[MapToMerge]:
         return self.__maps
@@ -195,14 +175,63 @@ class OmsiMapMerger:
     def append_map(self, directory: str) -> None:
         if os.path.normpath(directory) in map(lambda om: om.directory, self.__maps):
             raise MapRepetitionError(f"This map (\"{directory}\") has been added to merge before.\nMerging map with iself is not allowed.")
-        self.__maps.append(MapToMerge(os.path.normpath(directory), 0, 0, False))# tu ma byc normpath czy w OmsiMap??
+        self.__maps.append(MapToMerge(os.path.normpath(directory), 0, 0, False, self.__cache, self.__lazy_tiles))# tu ma byc normpath czy w OmsiMap??
+    
+    def append_map_to_merge(self, map_to_merge: MapToMerge) -> None:# map created before, possibly loaded and shared with other mergers
+        if map_to_merge.directory in map(lambda om: om.directory, self.__maps):
+            raise MapRepetitionError(f"This map (\"{map_to_merge.directory}\") has been added to merge before.\nMerging map with iself is not allowed.")
+        self.__maps.append(map_to_merge)
     
     def remove_map(self, index: int) -> None:
         del self.__maps[index]# tu handle exception??
     
-    def load_maps(self) -> None:
+    def load_maps(self, workers: int = 1, progress: loader.LoadProgress | None = None) -> None:
+        with metrics.phase(progress.observer if progress is not None else None, "parse"):
+            try:
+                self.__load_maps(workers, progress)
+            finally:
+                self.__evict_cache()
+    
+    def __load_maps(self, workers: int, progress: loader.LoadProgress | None) -> None:
+        # global configs first, then files of all maps are known to progress
+        for map_to_load in self.__maps:
+            map_to_load.load_global_config(progress)
+        self.__plan(progress)
+        if workers <= 1:
+            for map_to_load in self.__maps:
+                map_to_load.load_rest(None, progress)
+            return
+        with loader.ParallelLoader(workers) as pool:
+            for map_to_load in self.__maps:
+                map_to_load.load_rest(pool, progress)
+    
+    def reload_maps(self, workers: int = 1, progress: loader.LoadProgress | None = None) -> None:# parses only files changed since last load
+        with metrics.phase(progress.observer if progress is not None else None, "parse"):
+            try:
+                self.__reload_maps(workers, progress)
+            finally:
+                self.__evict_cache()
+    
+    def __reload_maps(self, workers: int, progress: loader.LoadProgress | None) -> None:
         for map_to_load in self.__maps:
-            map_to_load.load()
+            map_to_load.reload_global_config(progress)
+        self.__plan(progress)
+        if workers <= 1:
+            for map_to_load in self.__maps:
+                map_to_load.reload_rest(None, progress)
+            return
+        with loader.ParallelLoader(workers) as pool:
+            for map_to_load in self.__maps:
+                map_to_load.reload_rest(pool, progress)
+    
+    def __evict_cache(self) -> None:# entries written by loading
+        if self.__cache is not None:
+            self.__cache.evict()
+    
+    def __plan(self, progress: loader.LoadProgress | None) -> None:
+        if progress is not None:
+            for map_to_load in self.__maps:
+                progress.plan(map_to_load)
     
     def aigroup_name_collision(self) -> bool:
         aigroups_names_seq: list[str] = list(itertools.chain.from_iterable([[aig.name for aig in mtm.get_ailists().get_data().aigroups] for mtm in self.get_maps()]))
@@ -216,7 +245,7 @@ class OmsiMapMerger:
         groundtex: list[global_config.GroundTex] = [self.get_maps()[0].get_global_config().get_data().groundtex[0]]
         for mtm in self.get_maps():
             if mtm.get_keep_groundtex():
-                main_groundtex: global_config.GroundTex = copy.deepcopy(mtm.get_global_config().get_data().groundtex[0])
+                main_groundtex: global_config.GroundTex = copy.copy(mtm.get_global_config().get_data().groundtex[0])
                 main_groundtex.num1 = '3' # indicates resolution of fully covered groundtex
                 groundtex.append(main_groundtex)
             groundtex += mtm.get_global_config().get_data().groundtex[1:]
@@ -238,7 +267,11 @@ class OmsiMapMerger:
         tiles_counts_sequentially: list[int] = [len(mtm.get_global_config().get_data()._map) for mtm in self.get_maps()]
         return dict(zip(self.get_maps(), itertools.accumulate([0] + tiles_counts_sequentially, operator.add)))
 
-    def merged_omsi_map(self, new_map_name: str) -> MergeResult:
+    def merged_omsi_map(self, new_map_name: str, observer: metrics.Observer | None = None) -> MergeResult:
+        with metrics.phase(observer, "merge"):
+            return self.__merged_omsi_map(new_map_name, observer)
+    
+    def __merged_omsi_map(self, new_map_name: str, observer: metrics.Observer | None) -> MergeResult:
         assert self.ready(), "You can't get merged omsi map while not all maps are ready"
         assert not self.get_maps()[0].get_keep_groundtex(), "\"Keep groundtex\" on 1st map is nonsense."
 
@@ -256,7 +289,8 @@ class OmsiMapMerger:
         if self.aigroup_name_collision():
             warn("Aigroup name collision")
         
-        fm: dict[MapToMerge, omsi_map.OmsiMap] = dict([(mtm, copy.deepcopy(mtm.get_data())) for mtm in self.get_maps()])
+        # loaded maps are not changed, shifted maps share unchanged parts with them
+        fm: dict[MapToMerge, omsi_map.OmsiMap] = dict([(mtm, mtm.get_data()) for mtm in self.get_maps()])
 
         # warning about set worldcoordinates
         for mtm in self.get_maps():
@@ -325,25 +359,18 @@ class OmsiMapMerger:
                                         )
         
         # shift idcodes, tile indices, groundtex indices
-        for mtm in self.get_maps():
-            fm[mtm].change_ids_and_tile_indices(idcode_shift[mtm],  tile_shift[mtm])
-            fm[mtm].change_groundtex_indices(groundtex_shift[mtm])
-            # add full covered groundtex if keep groundex
-            if mtm.get_keep_groundtex():
-                for map_tile, gc_tile in zip(fm[mtm].tiles, fm[mtm].global_config._map):
-                    full_covered_groundtex_file:omsi_files.OmsiFile = \
-                        omsi_files.OmsiFile(map_path=os.path.dirname(os.path.abspath(__file__)),
-                        pattern="texture/map/tile_{pos_x}_{pos_y}.map.{groundtex_index}.dds",
-                        params={"pos_x": "0", "pos_y": "0", "groundtex_index": "0"})
-                    full_covered_groundtex_file.params['pos_x'] = gc_tile.pos_x
-                    full_covered_groundtex_file.params['pos_y'] = gc_tile.pos_y
-                    full_covered_groundtex_file.params['groundtex_index'] = str(groundtex_shift[mtm])
-                    map_tile._files.add(full_covered_groundtex_file)
+        with metrics.phase(observer, "shift"):
+            for mtm in self.get_maps():
+                fm[mtm] = fm[mtm].shifted(idcode_shift[mtm],  tile_shift[mtm], groundtex_shift[mtm])
+                # add full covered groundtex if keep groundex
+                if mtm.get_keep_groundtex():
+                    fm[mtm].tiles = omsi_map.tiles_transformed(fm[mtm].tiles,
+                                                               [functools.partial(with_full_covered_groundtex, pos_x=gc_tile.pos_x, pos_y=gc_tile.pos_y, groundtex_index=groundtex_shift[mtm])
+                                                                for gc_tile in fm[mtm].global_config._map])
         
-        # prepare tiles for merged map
-        tiles: list[tile.Tile] = list(itertools.chain.from_iterable([fm[mtm].tiles for mtm in self.get_maps()]))
-        for map_tile, gc_tile in zip(tiles, gc_tiles):
-            map_tile.set_files_pos(gc_tile.pos_x, gc_tile.pos_y)
+        # prepare tiles for merged map, lazy loaded tiles are parsed and changed when saved
+        tiles: omsi_map.Tiles = omsi_map.concatenated_tiles([fm[mtm].tiles for mtm in self.get_maps()])
+        tiles = omsi_map.tiles_transformed(tiles, [operator.methodcaller("with_files_pos", gc_tile.pos_x, gc_tile.pos_y) for gc_tile in gc_tiles])
         
         # prepare ailists
         all_aigroups: list[ailists.AnyAIgroup] = list(itertools.chain.from_iterable([fm[mtm].ailists.aigroups for mtm in self.get_maps()]))
@@ -15,8 +15,13 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import copy
+import os
 import pytest
 import itertools
+import benchmark
+import loader
+import omsi_map
 import omsi_map_merger
 import global_config
 import tile
@@ -93,3 +98,84 @@ def test_tile_shifted_id_natural(some_tile) -> None:
 
 def test_tile_shifted_id_0(some_tile) -> None:
     assert some_tile == omsi_map_merger.tile_shifted_ids(some_tile, 0)
+
+def test_columnar_tile_shifted_ids(some_tile) -> None:
+    # 0 id_previous/id_next and None varparent are not shifted
+    columnar: tile.ColumnarTile = tile.ColumnarTile.of(some_tile)
+    assert columnar == some_tile
+    for id_shift in [0, 63897]:
+        shifted: tile.ColumnarTile = columnar.shifted_ids(id_shift)
+        assert shifted == omsi_map_merger.tile_shifted_ids(some_tile, id_shift)
+        assert benchmark.serialized_tile(shifted) == benchmark.serialized_tile(omsi_map_merger.tile_shifted_ids(some_tile, id_shift))
+    assert columnar.spline[0].id_previous == 0
+    assert columnar.shifted_ids(10)._object[0].varparent is None
+    assert columnar.shifted_ids(10)._object[2].varparent == 4454
+
+# merging
+
+def saved_files(directory: str) -> dict[str, bytes]:
+    files: dict[str, bytes] = {}
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            with open(os.path.join(dirpath, filename), 'rb') as f:
+                files[os.path.relpath(os.path.join(dirpath, filename), directory)] = f.read()
+    return files
+
+def test_lazy_tiles_merge(tmp_path) -> None:
+    for map_name in ["map0", "map1"]:
+        benchmark.write_synthetic_map(str(tmp_path / map_name), 3, 10)
+    (tmp_path / "map1" / "tile_1_0.map.terrain").write_bytes(b"terrain")
+    saved: list[dict[str, bytes]] = []
+    for lazy_tiles, workers in [(False, 1), (False, 2), (True, 1), (True, 2)]:
+        merger = omsi_map_merger.OmsiMapMerger(lazy_tiles=lazy_tiles)
+        merger.append_map(str(tmp_path / "map0"))
+        merger.append_map(str(tmp_path / "map1"))
+        merger.get_maps()[1].shift(shift_y=1)
+        merger.get_maps()[1].set_keep_groundtex(True)
+        merger.load_maps()
+        assert merger.ready()
+        if lazy_tiles:
+            assert merger.get_maps()[0].get_tiles().get_status() == loader.FileParsingStatus.DEFERRED
+        merger.merged_omsi_map("Merged").merged_map.save(str(tmp_path / f"merged_{lazy_tiles}_{workers}"), workers)
+        assert merger.get_maps()[0].get_tiles().get_stats().files == 3# deferred tiles too, parsed by saving process or its workers
+        saved.append(saved_files(str(tmp_path / f"merged_{lazy_tiles}_{workers}")))
+    assert saved[0] == saved[1] == saved[2] == saved[3]
+    assert "tile_1_1.map.terrain" in saved[1]
+    assert os.path.join("texture", "map", "tile_2_1.map.1.dds") in saved[1]
+
+def test_parallel_save_errors(tmp_path) -> None:# all failed parts are reported, the rest is saved
+    benchmark.write_synthetic_map(str(tmp_path / "map0"), 3, 10)
+    map_sl = omsi_map.OmsiMapSl(str(tmp_path / "map0"))
+    map_sl.load()
+    omap: omsi_map.OmsiMap = map_sl.get_data()
+    omap.tiles[1] = copy.copy(omap.tiles[1])
+    omap.tiles[1]._files = None # type: ignore
+    omap.ailists = None # type: ignore
+    with pytest.raises(omsi_map.MapSaveError) as exception_info:
+        omap.save(str(tmp_path / "saved"), 2)
+    assert [part for part, _ in exception_info.value.errors] == [omsi_map.AILISTS_FILENAME, omap.global_config._map[1].map_file]
+    assert "AttributeError" in str(exception_info.value)
+    saved: dict[str, bytes] = saved_files(str(tmp_path / "saved"))
+    assert omsi_map.GLOBAL_CONFIG_FILENAME in saved
+    assert omap.global_config._map[2].map_file in saved
+
+def test_tile_shifted_ids_copy_on_write(some_tile) -> None:
+    ids_before: list[int] = [sco.id for sco in some_tile._object]
+    shifted: tile.Tile = omsi_map_merger.tile_shifted_ids(some_tile, 100)
+    assert [sco.id for sco in some_tile._object] == ids_before
+    assert shifted._object[0] is not some_tile._object[0]
+    assert shifted._object[0].rule_list is some_tile._object[0].rule_list
+    assert shifted._object[0].description is some_tile._object[0].description
+
+def test_load_maps_progress(tmp_path) -> None:# files of all maps are known after their global configs are read
+    merger = omsi_map_merger.OmsiMapMerger()
+    for map_name in ["map0", "map1"]:
+        benchmark.write_synthetic_map(str(tmp_path / map_name), 3, 10)
+        merger.append_map(str(tmp_path / map_name))
+    planned: list[int] = []
+    progress = loader.LoadProgress(lambda p: planned.append(p.files_planned))
+    merger.load_maps(progress=progress)
+    assert all([mtm.ready() for mtm in merger.get_maps()])
+    assert progress.files_done == progress.files_planned == len(planned)
+    assert planned[2:] == [planned[-1]] * (len(planned) - 2)
+    assert progress.objects_done == sum([map_tile.objects_count() for mtm in merger.get_maps() for map_tile in mtm.get_data().tiles])
@@ -0,0 +1,70 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import typing
+import pytest
+import benchmark
+import global_config
+import global_config_serializer
+import loader
+import omsi_map
+import tile
+import tile_serializer
+
+@pytest.fixture
+def map_directory(tmp_path) -> str:
+    directory: str = str(tmp_path / "map")
+    benchmark.write_synthetic_map(directory, 3, 10)
+    return directory
+
+def tiles_data(omsi_map_sl: omsi_map.OmsiMapSl) -> list[tile.Tile]:
+    return [typing.cast(loader.SafeLoaderUnit[tile.Tile], sl).get_data() for sl in omsi_map_sl.get_tiles().get_sl_list()]
+
+def test_reload_unchanged(map_directory) -> None:
+    omsi_map_sl = omsi_map.OmsiMapSl(map_directory)
+    omsi_map_sl.load()
+    global_config_before: global_config.GlobalConfig = omsi_map_sl.get_global_config().get_data()
+    tiles_before: list[tile.Tile] = tiles_data(omsi_map_sl)
+    omsi_map_sl.reload()
+    assert omsi_map_sl.ready()
+    assert omsi_map_sl.get_global_config().get_data() is global_config_before
+    assert all([after is before for after, before in zip(tiles_data(omsi_map_sl), tiles_before)])
+
+def test_reload_changed_tile(map_directory) -> None:
+    omsi_map_sl = omsi_map.OmsiMapSl(map_directory)
+    omsi_map_sl.load()
+    tiles_before: list[tile.Tile] = tiles_data(omsi_map_sl)
+    changed: tile.Tile = benchmark.synthetic_tile(20)
+    tile_serializer.TileSerializer().serialize(changed, os.path.join(map_directory, "tile_1_0.map"))
+    omsi_map_sl.reload()
+    tiles_after: list[tile.Tile] = tiles_data(omsi_map_sl)
+    assert tiles_after[0] is tiles_before[0]
+    assert tiles_after[1] is not tiles_before[1] and tiles_after[1] == changed
+    assert tiles_after[2] is tiles_before[2]
+
+def test_reload_changed_global_config(map_directory) -> None:
+    omsi_map_sl = omsi_map.OmsiMapSl(map_directory)
+    omsi_map_sl.load()
+    tiles_before: list[tile.Tile] = tiles_data(omsi_map_sl)
+    gc: global_config.GlobalConfig = benchmark.synthetic_global_config(2, 10)
+    gc.name = "Changed name"
+    global_config_serializer.GlobalConfigSerializer().serialize(gc, os.path.join(map_directory, omsi_map.GLOBAL_CONFIG_FILENAME))
+    omsi_map_sl.reload()
+    assert omsi_map_sl.get_global_config().get_data().name == "Changed name"
+    assert tiles_data(omsi_map_sl) == tiles_before[:2]
+    assert all([after is before for after, before in zip(tiles_data(omsi_map_sl), tiles_before)])
@@ -0,0 +1,218 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+# Persistent on-disk cache of parsed files.
+# Every entry is one file holding pickled header (format version, source
+# file's size, mtime and content hash) followed by pickled parsed object.
+# Entry is valid if format version matches and either size and mtime, or
+# content hash of source file match. Format version changes with
+# CACHE_FORMAT_VERSION, app version, grammars and modules defining parsed
+# objects. Least recently used entries over size limit are removed by
+# evict(), called once after loading many files (see OmsiMapMerger), as it
+# stats every entry.
+
+import file_fingerprint
+import functools
+import glob
+import hashlib
+import importlib.util
+import logging
+import os
+import pickle
+import platform
+import tempfile
+import time
+import typing
+import version
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION: int = 1
+DEFAULT_MAX_SIZE: int = 2 * 1024 ** 3 # bytes
+ENTRY_SUFFIX: str = ".cache"
+RACY_MTIME_NS: int = file_fingerprint.RACY_MTIME_NS
+
+# modules whose code determines what parsers return
+_SOURCE_MODULES: list[str] = [
+    "ailists", "ailists_parser",
+    "busstops", "busstops_parser",
+    "chrono_tile", "chrono_tile_parser",
+    "file_decoder",
+    "global_config", "global_config_parser",
+    "grammar_actions",
+    "omsi_files",
+    "station_links", "station_links_parser",
+    "tile", "tile_parser", "tile_stream_parser",
+    "time_table_line", "time_table_line_parser",
+    "track", "track_parser",
+    "trip", "trip_parser",
+]
+
+class CacheEntryHeader:
+    def __init__(self,
+                 format_version: str,
+                 size: int,
+                 mtime_ns: int,
+                 content_hash: str,
+                 ) -> None:
+        self.format_version: str = format_version
+        self.size: int = size
+        self.mtime_ns: int = mtime_ns
+        self.content_hash: str = content_hash
+
+def default_directory() -> str:
+    base: str | None
+    if platform.system() == 'Windows':
+        base = os.getenv('LOCALAPPDATA')
+    else:
+        base = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base or tempfile.gettempdir(), "omsi_map_merger", "parse_cache")
+
+@functools.cache
+def format_version() -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{CACHE_FORMAT_VERSION}\0{version.version}\0".encode())
+    sources: list[str] = sorted(glob.glob(os.path.join(os.path.dirname(os.path.realpath(__file__)), "*.pg")))
+    for module_name in _SOURCE_MODULES:
+        spec = importlib.util.find_spec(module_name)
+        if spec is not None and spec.origin is not None and os.path.isfile(spec.origin):
+            sources.append(spec.origin)
+        # else: frozen app, sources not available, app version is enough
+    for source in sources:
+        h.update(os.path.basename(source).encode() + b"\0")
+        with open(source, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+class ParseCache:
+    def __init__(self,
+                 directory: str,
+                 max_size: int = DEFAULT_MAX_SIZE,
+                 ) -> None:
+        self.directory: str = directory
+        self.max_size: int = max_size
+
+    def entry_path(self, path: str, true_loader: typing.Callable[[str], typing.Any]) -> str:
+        loader_name: str = f"{getattr(true_loader, '__module__', '')}.{getattr(true_loader, '__qualname__', type(true_loader).__qualname__)}"
+        key: bytes = f"{os.path.realpath(path)}\0{loader_name}".encode()
+        return os.path.join(self.directory, hashlib.blake2b(key, digest_size=20).hexdigest() + ENTRY_SUFFIX)
+
+    def load[T](self, path: str, true_loader: typing.Callable[[str], T]) -> T:
+        stat: os.stat_result = os.stat(path) # FileNotFoundError goes to caller like from true loader
+        entry_path: str = self.entry_path(path, true_loader)
+        current_hash: str | None = None
+
+        try:
+            with open(entry_path, 'rb') as f:
+                header: CacheEntryHeader = pickle.load(f)
+                if header.format_version == format_version():
+                    same_stat: bool = header.size == stat.st_size and header.mtime_ns == stat.st_mtime_ns
+                    if not same_stat:
+                        current_hash = file_fingerprint.content_hash(path)
+                    if same_stat or header.content_hash == current_hash:
+                        data: T = pickle.load(f)
+                        self.__touch(entry_path)
+                        logger.info(f"Parse cache hit for \"{path}\"")
+                        return data
+        except FileNotFoundError:
+            pass
+        except Exception as exception:
+            logger.warning(f"Removing unreadable parse cache entry \"{entry_path}\" ({type(exception).__name__}: {exception})")
+            self.__remove(entry_path)
+
+        logger.info(f"Parse cache miss for \"{path}\"")
+        if current_hash is None:
+            current_hash = file_fingerprint.content_hash(path)
+        loaded: T = true_loader(path)
+        mtime_ns: int = stat.st_mtime_ns
+        if file_fingerprint.racy(mtime_ns):
+            mtime_ns = -1 # file may still be modified within the same mtime, force hash check next time
+        self.__write(entry_path, CacheEntryHeader(format_version(), stat.st_size, mtime_ns, current_hash), loaded)
+        return loaded
+
+    def __touch(self, entry_path: str) -> None:# mark as recently used
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+    def __write(self, entry_path: str, header: CacheEntryHeader, data: typing.Any) -> None:
+        temporary_path: str | None = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # write to temporary file first, other processes may read this entry at the same time
+            fd, temporary_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, entry_path)
+        except Exception as exception:
+            logger.warning(f"Unable to write parse cache entry \"{entry_path}\" ({type(exception).__name__}: {exception})")
+            if temporary_path is not None:
+                self.__remove(temporary_path)
+
+    def __remove(self, entry_path: str) -> None:
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
+
+    def entries(self) -> list[os.DirEntry]:
+        try:
+            with os.scandir(self.directory) as it:
+                return [entry for entry in it if entry.name.endswith(ENTRY_SUFFIX) and entry.is_file()]
+        except FileNotFoundError:
+            return []
+
+    def size(self) -> int:
+        return sum([entry.stat().st_size for entry in self.entries()])
+
+    def evict(self) -> None:
+        entries_stats: list[tuple[str, os.stat_result]] = []
+        for entry in self.entries():
+            try:
+                entries_stats.append((entry.path, entry.stat()))
+            except FileNotFoundError:# removed by other process
+                pass
+        total_size: int = sum([stat.st_size for _, stat in entries_stats])
+        for entry_path, stat in sorted(entries_stats, key=lambda entry_stat: entry_stat[1].st_mtime_ns):
+            if total_size <= self.max_size:
+                break
+            logger.info(f"Evicting parse cache entry \"{entry_path}\"")
+            self.__remove(entry_path)
+            total_size -= stat.st_size
+
+    def clear(self) -> None:
+        for entry in self.entries():
+            self.__remove(entry.path)
+
+class CachedLoader[T]:
+    # picklable (if true loader is) true loader for loader.SafeLoaderUnit
+    def __init__(self,
+                 cache: ParseCache,
+                 true_loader: typing.Callable[[str], T],
+                 ) -> None:
+        self.cache: ParseCache = cache
+        self.true_loader: typing.Callable[[str], T] = true_loader
+
+    def parse(self, path: str) -> T:
+        return self.cache.load(path, self.true_loader)
+
+def cached[T](true_loader: typing.Callable[[str], T], cache: ParseCache | None) -> typing.Callable[[str], T]:
+    if cache is None:
+        return true_loader
+    return CachedLoader(cache, true_loader).parse
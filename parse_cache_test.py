@@ -0,0 +1,126 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pickle
+import pytest
+import parse_cache
+
+class Parsed:
+    def __init__(self, content: str):
+        self.content: str = content
+
+parsed_paths: list[str] = []
+
+def counting_loader(path: str) -> Parsed:
+    parsed_paths.append(path)
+    with open(path) as f:
+        return Parsed(f.read())
+
+@pytest.fixture
+def cache(tmp_path) -> parse_cache.ParseCache:
+    parsed_paths.clear()
+    return parse_cache.ParseCache(str(tmp_path / "cache"))
+
+@pytest.fixture
+def source(tmp_path) -> str:
+    path = tmp_path / "source.txt"
+    path.write_text("content 1")
+    os.utime(path, ns=(10**18, 10**18)) # not racy
+    return str(path)
+
+def test_hit(cache, source) -> None:
+    assert cache.load(source, counting_loader).content == "content 1"
+    assert cache.load(source, counting_loader).content == "content 1"
+    assert parsed_paths == [source]
+
+def test_changed_content(cache, source) -> None:
+    cache.load(source, counting_loader)
+    with open(source, 'w') as f:
+        f.write("content 2")
+    assert cache.load(source, counting_loader).content == "content 2"
+    assert parsed_paths == [source, source]
+
+def test_changed_content_same_size_and_mtime(cache, source) -> None:
+    stat: os.stat_result = os.stat(source)
+    cache.load(source, counting_loader)
+    with open(source, 'w') as f:
+        f.write("content 2")
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    cache.load(source, counting_loader)
+    assert parsed_paths == [source] # size and mtime are trusted, like make does
+
+def test_touched_not_changed(cache, source) -> None:
+    cache.load(source, counting_loader)
+    os.utime(source, ns=(2 * 10**18, 2 * 10**18))
+    assert cache.load(source, counting_loader).content == "content 1"
+    assert parsed_paths == [source]
+
+def test_racy_mtime_verified_with_hash(cache, tmp_path) -> None:
+    path = tmp_path / "fresh.txt"
+    path.write_text("content 1")
+    stat: os.stat_result = os.stat(path)
+    cache.load(str(path), counting_loader)
+    path.write_text("content 2")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.load(str(path), counting_loader).content == "content 2"
+
+def test_format_version_changed(cache, source, monkeypatch) -> None:
+    cache.load(source, counting_loader)
+    monkeypatch.setattr(parse_cache, "format_version", lambda: "other version")
+    cache.load(source, counting_loader)
+    assert parsed_paths == [source, source]
+
+def test_corrupted_entry(cache, source) -> None:
+    cache.load(source, counting_loader)
+    with open(cache.entry_path(source, counting_loader), 'wb') as f:
+        f.write(b"not a pickle")
+    assert cache.load(source, counting_loader).content == "content 1"
+    assert parsed_paths == [source, source]
+
+def test_not_existing_file(cache, tmp_path) -> None:
+    with pytest.raises(FileNotFoundError):
+        cache.load(str(tmp_path / "not_existing.txt"), counting_loader)
+
+def test_lru_eviction(tmp_path) -> None:
+    sources: list[str] = []
+    for i in range(4):
+        path = tmp_path / f"source{i}.txt"
+        path.write_text(f"content {i}" * 100)
+        sources.append(str(path))
+    unlimited = parse_cache.ParseCache(str(tmp_path / "cache"))
+    unlimited.load(sources[0], counting_loader)
+    entry_size: int = unlimited.size()
+
+    cache = parse_cache.ParseCache(str(tmp_path / "cache"), max_size=2 * entry_size)
+    cache.load(sources[1], counting_loader)
+    os.utime(cache.entry_path(sources[0], counting_loader), ns=(10**18, 10**18)) # source0 used recently
+    os.utime(cache.entry_path(sources[1], counting_loader), ns=(10**17, 10**17))
+    cache.load(sources[2], counting_loader)
+    assert cache.size() > 2 * entry_size # writing does not evict
+    cache.evict()
+    assert cache.size() <= 2 * entry_size
+    assert os.path.exists(cache.entry_path(sources[0], counting_loader))
+    assert not os.path.exists(cache.entry_path(sources[1], counting_loader))
+    assert os.path.exists(cache.entry_path(sources[2], counting_loader))
+
+def test_cached_loader_picklable(cache, source) -> None:
+    cached_loader = pickle.loads(pickle.dumps(parse_cache.cached(counting_loader, cache)))
+    assert cached_loader(source).content == "content 1"
+
+def test_no_cache() -> None:
+    assert parse_cache.cached(counting_loader, None) is counting_loader
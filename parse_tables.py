@@ -0,0 +1,120 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+# Parse tables of grammars, cached in one file shared by all grammars.
+# Every grammar has entry with hash of its files and of table settings,
+# entry is rebuilt when hash changes. Tables are stored in parglare's
+# serializable form, so they are loaded with grammar they were built for.
+# Tables are canonical LR(1): parglare merges states with the same items
+# into LALR states, whose lookahead sets come from all merged contexts, and
+# since parglare.Parser recognizes only tokens expected in current state,
+# a line like "mirror" would be taken for other token in wrong context.
+
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import parglare
+import parglare.closure
+import parglare.tables
+import parglare.tables.persist
+import parglare.version
+import parse_cache
+
+logger = logging.getLogger(__name__)
+
+TABLES_FORMAT_VERSION: int = 2
+CACHE_FILENAME: str = "parse_tables.cache"
+
+_lock = threading.Lock()
+
+def default_path() -> str:# next to parse cache directory
+    return os.path.join(os.path.dirname(parse_cache.default_directory()), CACHE_FILENAME)
+
+def grammar_hash(grammar: parglare.Grammar) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{TABLES_FORMAT_VERSION}\0{parglare.version.__version__}\0".encode())
+    for file_name in sorted(grammar.imported_files.keys()):
+        h.update(os.path.basename(file_name).encode() + b"\0")
+        with open(file_name, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def _merge_equal_states(old_state, new_state) -> bool:# in place of parglare.tables.merge_states, merges only states with the same lookaheads
+    if old_state != new_state:
+        return False
+    return all([item.follow == new_state.get_item(item).follow for item in old_state.kernel_items])
+
+def _canonical_table(grammar: parglare.Grammar) -> parglare.tables.LRTable:
+    # conflicts are not resolved by preferring shifts, parglare.Parser refuses table with conflicts
+    merge_states = parglare.tables.merge_states
+    parglare.tables.merge_states = _merge_equal_states
+    try:
+        return parglare.tables.create_table(grammar, parglare.closure.LR_1,
+                                            prefer_shifts=False, prefer_shifts_over_empty=False, lexical_disambiguation=True)
+    finally:
+        parglare.tables.merge_states = merge_states
+
+@functools.cache
+def _entries(path: str) -> dict[str, tuple[str, list]]:# grammar file name: (hash, serializable table)
+    try:
+        with open(path, 'rb') as f:
+            entries: dict[str, tuple[str, list]] = pickle.load(f)
+            return entries
+    except FileNotFoundError:
+        pass
+    except Exception as exception:
+        logger.warning(f"Ignoring unreadable parse tables cache \"{path}\" ({type(exception).__name__}: {exception})")
+    return {}
+
+def _write(path: str, entries: dict[str, tuple[str, list]]) -> None:
+    temporary_path: str | None = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # other processes may read cache at the same time
+        fd, temporary_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+    except Exception as exception:
+        logger.warning(f"Unable to write parse tables cache \"{path}\" ({type(exception).__name__}: {exception})")
+        if temporary_path is not None:
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+
+def table(grammar: parglare.Grammar, path: str | None = None) -> parglare.tables.LRTable:# pass it to parglare.Parser as "table" argument
+    path = path or default_path()
+    key: str = os.path.basename(grammar.file_path)
+    current_hash: str = grammar_hash(grammar)
+    with _lock:
+        entries: dict[str, tuple[str, list]] = _entries(path)
+        entry: tuple[str, list] | None = entries.get(key)
+        if entry is not None and entry[0] == current_hash:
+            try:
+                return parglare.tables.persist.table_from_serializable(entry[1], grammar)
+            except Exception as exception:
+                logger.warning(f"Rebuilding unreadable parse table of \"{key}\" ({type(exception).__name__}: {exception})")
+        logger.info(f"Building parse table of \"{key}\"")
+        built: parglare.tables.LRTable = _canonical_table(grammar)
+        entries[key] = (current_hash, parglare.tables.persist.table_to_serializable(built))
+        _write(path, entries)
+        return built
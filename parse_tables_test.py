@@ -0,0 +1,74 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+import glob
+import os
+import pytest
+import shutil
+import parglare
+import parse_tables
+import track_parser
+
+def track_grammar(directory: str) -> parglare.Grammar:
+    file_name: str = os.path.join(directory, "track_grammar.pg")
+    if not os.path.exists(file_name):
+        shutil.copy(os.path.join(os.path.dirname(os.path.realpath(track_parser.__file__)), "track_grammar.pg"), file_name)
+    return parglare.Grammar.from_file(file_name)
+
+def states(table: parglare.tables.LRTable) -> list:
+    return parglare.tables.persist.table_to_serializable(table)
+
+def test_table_cached(tmp_path) -> None:
+    path: str = str(tmp_path / "cache" / parse_tables.CACHE_FILENAME)
+    built: parglare.tables.LRTable = parse_tables.table(track_grammar(str(tmp_path)), path)
+    assert os.path.isfile(path)
+    parse_tables._entries.cache_clear() # as in next start of app
+    modified_ns: int = os.stat(path).st_mtime_ns
+    loaded: parglare.tables.LRTable = parse_tables.table(track_grammar(str(tmp_path)), path)
+    assert os.stat(path).st_mtime_ns == modified_ns
+    assert states(loaded) == states(built)
+    assert set(parse_tables._entries(path).keys()) == {"track_grammar.pg"}
+
+def test_table_rebuilt_when_grammar_changes(tmp_path) -> None:
+    path: str = str(tmp_path / parse_tables.CACHE_FILENAME)
+    grammar: parglare.Grammar = track_grammar(str(tmp_path))
+    old_hash: str = parse_tables.grammar_hash(grammar)
+    parse_tables.table(grammar, path)
+    with open(tmp_path / "track_grammar.pg", 'a') as f:
+        f.write("\n// changed\n")
+    parse_tables._entries.cache_clear()
+    grammar = track_grammar(str(tmp_path))
+    assert parse_tables.grammar_hash(grammar) != old_hash
+    parse_tables.table(grammar, path)
+    assert parse_tables._entries(path)["track_grammar.pg"][0] == parse_tables.grammar_hash(grammar)
+
+def test_unreadable_cache_ignored(tmp_path) -> None:
+    path: str = str(tmp_path / parse_tables.CACHE_FILENAME)
+    with open(path, 'wb') as f:
+        f.write(b"not a cache")
+    parse_tables._entries.cache_clear()
+    grammar: parglare.Grammar = track_grammar(str(tmp_path))
+    assert parglare.Parser(grammar, table=parse_tables.table(grammar, path)) is not None
+    parse_tables._entries.cache_clear()
+    assert "track_grammar.pg" in parse_tables._entries(path)
+
+@pytest.mark.parametrize("grammar_file", sorted(glob.glob(os.path.join(os.path.dirname(os.path.realpath(parse_tables.__file__)), "*_grammar.pg"))),
+                         ids=os.path.basename)
+def test_grammar_deterministic(grammar_file, tmp_path) -> None:# all grammars are parsed by LR parser, conflicts would need GLR parser
+    grammar: parglare.Grammar = parglare.Grammar.from_file(grammar_file)
+    table: parglare.tables.LRTable = parse_tables.table(grammar, str(tmp_path / parse_tables.CACHE_FILENAME))
+    assert table.sr_conflicts == [] and table.rr_conflicts == []
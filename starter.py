@@ -17,8 +17,10 @@
 
 import PySimpleGUI as sg
 import omsi_map_merger
+import parse_cache
 import version
 import loader
+import metrics
 import timetable
 import traceback
 import logging
@@ -27,7 +29,9 @@ import platform
 import sys
 import tempfile
 import pathlib
+import threading
 import time
+import typing
 import run_files_manager
 
 root_logger = logging.getLogger()
@@ -42,20 +46,45 @@ logger_handler_file = logging.FileHandler(str(log_file_path))
 logger_handler_file.setFormatter(logging.Formatter(log_format_str))
 root_logger.addHandler(logger_handler_file)
 
+# save metrics of reading, merging and saving maps next to log
+metrics_file_path: pathlib.Path = log_file_path.with_suffix('.metrics.jsonl')
+metrics_file: metrics.JsonLines = metrics.JsonLines.open(str(metrics_file_path))
+
 # set up starter logger
 logger = logging.getLogger(__name__)
 
 EMPTY_STR = ''
+EVENT_TASK_PROGRESS = 'task_progress'# sent by background task
+EVENT_TASK_DONE = 'task_done'
+EVENT_TASK_FILE = 'task_file'# file being processed by background task
+PROGRESS_BAR_MAX = 1000
+PROGRESS_INTERVAL = 0.1# seconds between progress events
+SLOWEST_FILES_SHOWN = 30
 
 logger.info(f"This is OMSI Map Merger {version.version}")
 logger.info(f"Python version is {sys.version}")
 logger.info(f"Platform is {platform.platform()}")
 logger.info(f"Log is being saved to file: \"{log_file_path}\"")
+logger.info(f"Metrics are being saved to file: \"{metrics_file_path}\"")
 
 class MapLoadingInteractionManager:
     class NoSelectedMapComponentError(Exception):
         pass
 
+    class Task:# load, merge or save running in worker thread, which must not touch window
+        def __init__(self,
+                     name: str,
+                     run: typing.Callable[[loader.LoadProgress], typing.Any],
+                     on_done: typing.Callable[[typing.Any], None],# called in event loop with result of run
+                     cancellable: bool,
+                     ) -> None:
+            self.name: str = name
+            self.run: typing.Callable[[loader.LoadProgress], typing.Any] = run
+            self.on_done: typing.Callable[[typing.Any], None] = on_done
+            self.cancellable: bool = cancellable
+            self.progress: loader.LoadProgress# set when started, with observer
+            self.summary: metrics.Summary# set when started
+
     def __init__(self,
                  merger: omsi_map_merger.OmsiMapMerger,
                  window: sg.Window,
@@ -71,6 +100,7 @@ class MapLoadingInteractionManager:
                  key_load_scan_timetable_lines: str,
                  key_load_scan_tracks: str,
                  key_load_scan_trips: str,
+                 key_load_slowest_files: str,
                  key_graph: str,
                  key_shift_left: str,
                  key_shift_right: str,
@@ -80,8 +110,14 @@ class MapLoadingInteractionManager:
                  key_new_map_directory: str,
                  key_new_map_name: str,
                  key_merge: str,
+                 key_progress_bar: str,
+                 key_progress_text: str,
+                 key_progress_cancel: str,
+                 key_progress_file: str,
+                 key_trace_memory: str,
                  ) -> None:
         self.__omsi_map_merger: omsi_map_merger.OmsiMapMerger = merger
+        self.__window: sg.Window = window
         self.__tree: sg.Tree = window[key_tree] # type: ignore
         self.__multiline_details: sg.Multiline = window[key_details] # type: ignore
         self.__input_add: sg.Input = window[key_add_input] # type: ignore
@@ -94,6 +130,7 @@ class MapLoadingInteractionManager:
         self.__button_load_scan_timetable_lines: sg.Button = window[key_load_scan_timetable_lines] # type: ignore
         self.__button_load_scan_tracks: sg.Button = window[key_load_scan_tracks] # type: ignore
         self.__button_load_scan_trips: sg.Button = window[key_load_scan_trips] # type: ignore
+        self.__button_load_slowest_files: sg.Button = window[key_load_slowest_files] # type: ignore
         self.__graph: sg.Graph = window[key_graph] # type: ignore
         self.__button_shift_left: sg.Button = window[key_shift_left] # type: ignore
         self.__button_shift_right: sg.Button = window[key_shift_right] # type: ignore
@@ -103,6 +140,16 @@ class MapLoadingInteractionManager:
         self.__button_merge: sg.Button = window[key_merge] # type: ignore
         self.__input_new_map_directory: sg.In = window[key_new_map_directory] # type: ignore
         self.__input_new_map_name: sg.In = window[key_new_map_name] # type: ignore
+        self.__progress_bar: sg.ProgressBar = window[key_progress_bar] # type: ignore
+        self.__text_progress: sg.Text = window[key_progress_text] # type: ignore
+        self.__button_progress_cancel: sg.Button = window[key_progress_cancel] # type: ignore
+        self.__text_progress_file: sg.Text = window[key_progress_file] # type: ignore
+        self.__checkbox_trace_memory: sg.Checkbox = window[key_trace_memory] # type: ignore
+        self.__task: MapLoadingInteractionManager.Task | None = None# running in background
+        self.__thread: threading.Thread | None = None# of last task
+        self.__closing: bool = False# app closes when no task is running
+        self.__detached: bool = False# window is not read anymore, worker threads must not send events
+        self.__last_progress_event: float = 0.0
         self.__maps_components_by_id = dict() #add type hint (int, anything)
 
         self.__update_tree()
@@ -116,6 +163,10 @@ class MapLoadingInteractionManager:
         tree_data: sg.TreeData = sg.TreeData()
         self.__maps_components_by_id = dict()
 
+        def status_with_stats(safe_loader: loader.SafeLoader) -> str:
+            stats: loader.LoadStats | None = safe_loader.get_stats()
+            return safe_loader.info_short() + (EMPTY_STR if stats is None else f" ({stats})")
+
         def add_to_tree(parent_map_component, element_map_component, name: str, component_type: str, status: str, ready: str) -> None:
             self.__maps_components_by_id[id(element_map_component)] = element_map_component
             tree_data.insert(EMPTY_STR if parent_map_component == EMPTY_STR  else id(parent_map_component),
@@ -134,10 +185,10 @@ class MapLoadingInteractionManager:
             raise Exception(f"This object isn't object of SafeLoader type (is  {type(safe_loader).__name__})")
         
         def add_safe_loader_unit(parent_component, loader_unit: loader.SafeLoaderUnit):
-            add_to_tree(parent_component, loader_unit, loader_unit.get_name(), "unit/"+loader_unit.get_type_name(), loader_unit.info_short(), str(loader_unit.ready()))
+            add_to_tree(parent_component, loader_unit, loader_unit.get_name(), "unit/"+loader_unit.get_type_name(), status_with_stats(loader_unit), str(loader_unit.ready()))
 
         def add_safe_loader_list(parent_component, loader_list: loader.SafeLoaderList):
-            add_to_tree(parent_component, loader_list, loader_list.get_name(), "list", loader_list.info_short(), str(loader_list.ready()))
+            add_to_tree(parent_component, loader_list, loader_list.get_name(), "list", status_with_stats(loader_list), str(loader_list.ready()))
             for loader in loader_list.get_sl_list():
                 add_safe_loader(loader_list, loader)
         
@@ -182,38 +233,138 @@ class MapLoadingInteractionManager:
             raise self.NoSelectedMapComponentError(f"Handling of \"Load selected\" is allowed only when SafeLoader (or its derivative) is selected. There is nothing selected.")
         
         if isinstance(smc, loader.SafeLoader):
-            self.__get_selected_map_component().load()
+            self.__start_task(self.Task("Reading selected", lambda progress: smc.load(None, progress), lambda _: self.update_tdg(), True))
         else:
             raise self.NoSelectedMapComponentError(f"Handling of \"Load selected\" is allowed only when SafeLoader (or its derivative) is selected. Type of selected: {type(smc)}.")
-            
-        self.__update_tree()
-        #self.__update_disability() może to jest potrzebne pomyslec kiedyś
+    
+    def __handle_load_whole_maps(self) -> None:
+        self.__start_task(self.Task("Reading maps", lambda progress: self.__omsi_map_merger.load_maps(progress=progress), lambda _: self.update_tdg(), True))
+    
+    def __handle_load_slowest_files(self) -> None:
+        units: list[loader.SafeLoaderUnit] = loader.slowest_units(list(self.__omsi_map_merger.get_maps()), SLOWEST_FILES_SHOWN)
+        if not units:
+            sg.popup("No files have been read yet.", title="Slowest files")
+            return
+        sg.popup_scrolled("\n\n".join([f"{unit.get_path()}\n{typing.cast(loader.LoadStats, unit.get_stats()).info_detailed()}" for unit in units]),
+                          title=f"Slowest files (up to {SLOWEST_FILES_SHOWN})", size=(90, 30))
     
     def __handle_load_open_editor(self) -> None:
         assert platform.system() == 'Windows', "Startfile available only on Windows"
         os.startfile(self.__get_selected_map_component().get_path()) # type: ignore
     
     def __handle_merge(self) -> None:
-        try:
-            mr: omsi_map_merger.MergeResult = self.__omsi_map_merger.merged_omsi_map(self.__input_new_map_name.get())
+        new_map_name: str = self.__input_new_map_name.get()
+        new_map_directory: str = self.__input_new_map_directory.get()
+        def merged(mr: omsi_map_merger.MergeResult) -> None:
             if len(mr.warnings) == 0 or sg.popup_yes_no(f"\
 There {"was a warning" if len(mr.warnings) == 1 else "were warnings"} reported during map merge:\n\
 {"\n".join([f"\t*{warn}" for warn in mr.warnings])}\n\
 Do you still want to save merged map?",
                                                         title="Map merge warnings") == "Yes":
-                try:
-                    mr.merged_map.save(self.__input_new_map_directory.get())
-                    sg.Popup(f"Map saved in directory \"{self.__input_new_map_directory.get()}\"",
-                            title="Map save completed")
-                except:
-                    error_message: str = "An error occured while saving map:\n" + traceback.format_exc()
-                    logger.error(error_message)
-                    sg.Popup(error_message, title="Error")
-        except:
-            error_message: str = "An error occured while merge:\n" + traceback.format_exc()
+                # not cancellable, partly saved map would have to be removed before saving again
+                self.__start_task(self.Task("Saving merged map",
+                                            lambda progress: mr.merged_map.save(new_map_directory, files_progress=self.__send_files_progress, observer=progress.observer),
+                                            lambda _: sg.Popup(f"Map saved in directory \"{new_map_directory}\"", title="Map save completed"),
+                                            False))
+        self.__start_task(self.Task("Merging maps", lambda progress: self.__omsi_map_merger.merged_omsi_map(new_map_name, progress.observer), merged, False))
+    
+    def __start_task(self, task: 'MapLoadingInteractionManager.Task') -> None:
+        assert self.__task is None, "Only one task can run in background"
+        logger.info(f"Starting background task: {task.name}")
+        task.summary = metrics.Summary()
+        task.progress = loader.LoadProgress(self.__send_progress,
+                                            metrics.Observers([task.summary,
+                                                               metrics_file,
+                                                               metrics.EventSender(lambda text: self.__send_event(EVENT_TASK_FILE, text), PROGRESS_INTERVAL)]),
+                                            bool(self.__checkbox_trace_memory.get()))
+        self.__task = task
+        self.__progress_bar.update(current_count=0)
+        self.__text_progress.update(value=f"{task.name}...")
+        self.__text_progress_file.update(value=EMPTY_STR)
+        self.__update_disability()
+        def run() -> None:
+            try:
+                result: typing.Any = task.run(task.progress)
+            except BaseException as exception:
+                self.__send_event(EVENT_TASK_DONE, (None, exception, traceback.format_exc()))
+            else:
+                self.__send_event(EVENT_TASK_DONE, (result, None, EMPTY_STR))
+        self.__thread = threading.Thread(target=run, name=task.name, daemon=True)
+        self.__thread.start()
+    
+    def __send_event(self, key: str, value: typing.Any) -> None:# in worker threads
+        if not self.__detached:
+            self.__window.write_event_value(key, value)
+    
+    def __send_progress(self, progress: loader.LoadProgress) -> None:# in worker thread, events are limited not to flood event loop
+        if time.perf_counter() - self.__last_progress_event >= PROGRESS_INTERVAL:
+            self.__last_progress_event = time.perf_counter()
+            self.__send_event(EVENT_TASK_PROGRESS, (progress.fraction(), str(progress)))
+    
+    def __send_files_progress(self, done: int, submitted: int) -> None:# in placer's threads
+        if time.perf_counter() - self.__last_progress_event >= PROGRESS_INTERVAL or done == submitted:
+            self.__last_progress_event = time.perf_counter()
+            self.__send_event(EVENT_TASK_PROGRESS, (done / submitted if submitted else 0.0, f"{done}/{submitted} files placed"))
+    
+    def __handle_task_progress(self, fraction: float, text: str) -> None:
+        if self.__task is not None:
+            self.__progress_bar.update(current_count=int(fraction * PROGRESS_BAR_MAX))
+            self.__text_progress.update(value=f"{self.__task.name}: {text}" + (", closing when finished" if self.__closing else EMPTY_STR))
+    
+    def __handle_task_done(self, result: typing.Any, exception: BaseException | None, traceback_text: str) -> None:
+        task: MapLoadingInteractionManager.Task | None = self.__task
+        assert task is not None
+        self.__task = None
+        logger.info(f"Background task finished: {task.name}, {task.progress}")
+        logger.info(f"Metrics of {task.name.lower()}:\n{task.summary}")
+        self.__text_progress_file.update(value=EMPTY_STR)
+        self.__progress_bar.update(current_count=0 if exception is not None else PROGRESS_BAR_MAX)
+        if isinstance(exception, loader.LoadCancelledError):
+            self.__text_progress.update(value=f"{task.name}: cancelled")
+            self.update_tdg()# files read before cancelling are kept
+        elif exception is not None:
+            self.__text_progress.update(value=f"{task.name}: failed")
+            error_message: str = f"An error occured while {task.name.lower()}:\n" + traceback_text
             logger.error(error_message)
             sg.Popup(error_message, title="Error")
-        
+            self.update_tdg()
+        else:
+            self.__text_progress.update(value=f"{task.name}: done in {task.progress.elapsed():.1f} s")
+            if not self.__closing:# no merged map is saved after app is closed
+                task.on_done(result)
+        self.__update_disability()
+    
+    def cancel_task(self) -> None:# running task stops before next file
+        if self.__task is not None and self.__task.cancellable:
+            logger.info(f"Cancelling background task: {self.__task.name}")
+            self.__task.progress.cancel()
+            self.__button_progress_cancel.update(disabled=True)
+    
+    def busy(self) -> bool:
+        return self.__task is not None
+    
+    def close(self) -> None:# running task is cancelled, or waited for if user agrees, see closed()
+        task: MapLoadingInteractionManager.Task | None = self.__task
+        if task is not None and not task.cancellable and sg.popup_yes_no(
+                f"{task.name} can not be cancelled, its files would be left incomplete.\n"
+                f"Close OMSI Map Merger when {task.name.lower()} is finished?", title="Closing") != "Yes":
+            return
+        logger.info("Closing requested" + (f", waiting for background task: {task.name}" if task is not None else EMPTY_STR))
+        self.__closing = True
+        self.cancel_task()
+        if task is not None:
+            self.__text_progress.update(value=f"{task.name}: closing when finished")
+    
+    def closed(self) -> bool:
+        return self.__closing and self.__task is None
+    
+    def join_task(self) -> None:# before window is closed, running task is cancelled if possible
+        self.__detached = True
+        self.__closing = True
+        self.cancel_task()
+        if self.__thread is not None and self.__thread.is_alive():
+            logger.info(f"Waiting for background task to finish: {self.__thread.name}")
+            self.__thread.join()
     
     def __is_selected_component_instance(self, component_type) -> bool:
         try:
@@ -222,12 +373,39 @@ Do you still want to save merged map?",
             return False
     
     def __update_disability(self):
+        task: MapLoadingInteractionManager.Task | None = self.__task
+        # labelled for running task, merging and saving can not be cancelled
+        self.__button_progress_cancel.update(text=f"Cancel {task.name.lower()}" if task is not None and task.cancellable else "Cancel",
+                                             disabled = not (task is not None and task.cancellable and not task.progress.cancelled()))
+        if self.__task is not None:# maps are changed by task
+            for button in [
+                self.__button_add,
+                self.__button_remove,
+                self.__button_load_whole_map,
+                self.__button_load_selected,
+                self.__button_load_open_editor,
+                self.__button_load_scan_chronos,
+                self.__button_load_scan_timetable_lines,
+                self.__button_load_scan_tracks,
+                self.__button_load_scan_trips,
+                self.__button_load_slowest_files,
+                self.__button_shift_left,
+                self.__button_shift_right,
+                self.__button_shift_up,
+                self.__button_shift_down,
+                self.__button_toggle_keep_groundtex,
+                self.__button_merge,
+            ]:
+                button.update(disabled=True)
+            return
+        self.__button_add.update(disabled=False)
         selected_mtm: bool = self.__is_selected_component_instance(omsi_map_merger.MapToMerge)
 
         self.__button_remove.update(disabled = not selected_mtm)
         self.__button_load_scan_chronos.update(disabled = not (selected_mtm
                             and self.__get_selected_map_component().get_global_config().get_status() == loader.FileParsingStatus.READ_SUCCESS))
         self.__button_load_whole_map.update(disabled = not len(self.__omsi_map_merger.get_maps()))
+        self.__button_load_slowest_files.update(disabled = not len(self.__omsi_map_merger.get_maps()))
         self.__button_load_selected.update(disabled = not self.__is_selected_component_instance(loader.SafeLoader))
         self.__button_load_open_editor.update(disabled = not (self.__is_selected_component_instance(loader.SafeLoaderUnit) and platform.system() == 'Windows'))
         selected_tt :bool = self.__is_selected_component_instance(timetable.TimetableSl)
@@ -260,7 +438,23 @@ Do you still want to save merged map?",
         self.__update_disability()
         self.__draw_graph() #tylko na chwilę!!!!
     
-    def handle_event(self, event) -> bool:# true if handled, false if didn't handled
+    def handle_event(self, event, values: dict) -> bool:# true if handled, false if didn't handled
+        if event == EVENT_TASK_PROGRESS:
+            self.__handle_task_progress(*values[event])
+            return True
+        if event == EVENT_TASK_FILE:
+            if self.__task is not None:
+                self.__text_progress_file.update(value=values[event])
+            return True
+        if event == EVENT_TASK_DONE:
+            self.__handle_task_done(*values[event])
+            return True
+        if event == self.__button_progress_cancel.key:
+            self.cancel_task()
+            return True
+        if self.__task is not None:
+            logger.debug(f"GUI event {event} ignored while {self.__task.name}")
+            return True
         for gui_element, handler, updater in [
             # some handlers have to be lambda-encapsulated because they access map components' members, that are sometimes not accesible
             # e.g. self.__get_selected_map_component().scan_chrono() is accessible only when OmsiMapLoader is selected
@@ -269,14 +463,16 @@ Do you still want to save merged map?",
 
             (self.__input_add, self.__handle_add, self.update_tdg),
             (self.__button_remove, self.__handle_remove, self.update_tdg),
-            (self.__button_load_whole_map, self.__omsi_map_merger.load_maps, self.update_tdg),
-            (self.__button_load_selected, self.__handle_load_selected, self.update_tdg),
+            # reading, merging and saving run in background, window is updated when they are done
+            (self.__button_load_whole_map, self.__handle_load_whole_maps, lambda: None),
+            (self.__button_load_selected, self.__handle_load_selected, lambda: None),
             (self.__button_load_scan_chronos, lambda: self.__get_selected_map_component().scan_chrono(), self.__update_tree),
             (self.__button_load_scan_timetable_lines, lambda: self.__get_selected_map_component().scan_time_table_lines(), self.__update_tree),
             (self.__button_load_scan_tracks, lambda: self.__get_selected_map_component().scan_tracks(), self.__update_tree),
             (self.__button_load_scan_trips, lambda: self.__get_selected_map_component().scan_trips(), self.__update_tree),
 
             (self.__button_load_open_editor, self.__handle_load_open_editor, lambda: None),
+            (self.__button_load_slowest_files, self.__handle_load_slowest_files, lambda: None),
             (self.__button_shift_left, lambda: self.__get_selected_map_component().shift(shift_x = -1), self.update_dg),
             (self.__button_shift_right, lambda: self.__get_selected_map_component().shift(shift_x = 1), self.update_dg),
             (self.__button_shift_up, lambda: self.__get_selected_map_component().shift(shift_y = 1), self.update_dg),
@@ -357,12 +553,13 @@ try:
                 select_mode=sg.TABLE_SELECT_MODE_BROWSE,
                 col0_width=40,
                 auto_size_columns=False,
-                col_widths=[10,20],
+                col_widths=[10,40],
                 )
         ],
         [
             sg.Button("Load_selected", key="load_selected", disabled=True),
             sg.Button("Open file in editor", key='load_open_file', disabled=True),
+            sg.Button("Slowest files", key='load_slowest_files', disabled=True),
         ],
         [
             sg.Button("Scan for chronos", key='load_scan_chronos', disabled=True),
@@ -381,6 +578,13 @@ try:
             sg.Button("Open location in file manager", key='open_log_location', disabled=not run_files_manager.supported())
         ],
         [sg.Frame("Reading maps files", map_reading_panel)],
+        [
+            sg.ProgressBar(PROGRESS_BAR_MAX, orientation='h', size=(50, 20), key='progress_bar'),
+            sg.Button("Cancel", key='progress_cancel', disabled=True),
+            sg.Checkbox("Measure memory of parsing (slower)", key='trace_memory'),
+        ],
+        [sg.Text(EMPTY_STR, key='progress_text', size=(90, 1))],
+        [sg.Text(EMPTY_STR, key='progress_file', size=(90, 1))],
     ]
 
     layout_right = [
@@ -398,8 +602,8 @@ try:
     ]
     layout = [[sg.Column(layout_left), sg.VSep(), sg.Column(layout_right)]]
 
-    omm = omsi_map_merger.OmsiMapMerger()
-    window = sg.Window("OMSI Map Merger", layout, finalize=True)
+    omm = omsi_map_merger.OmsiMapMerger(parse_cache.ParseCache(parse_cache.default_directory()))
+    window = sg.Window("OMSI Map Merger", layout, finalize=True, enable_close_attempted_event=True)
 
     maps_loading_interaction_manager: MapLoadingInteractionManager = MapLoadingInteractionManager(
         omm,
@@ -416,6 +620,7 @@ try:
         'load_scan_timetable_lines',
         'load_scan_tracks',
         'load_scan_trips',
+        'load_slowest_files',
         'graph',
         'shift_left',
         'shift_right',
@@ -424,13 +629,21 @@ try:
         'toggle_keep_groundtex',
         'new_map_directory',
         'new_map_name',
-        'merge')
+        'merge',
+        'progress_bar',
+        'progress_text',
+        'progress_cancel',
+        'progress_file',
+        'trace_memory')
 
     while True:
         event, values = window.read() # type: ignore
-        logger.debug(f"GUI event occured: {event}, values: {values}")
-        if event == sg.WIN_CLOSED or event == "cancel":
+        if event not in [EVENT_TASK_PROGRESS, EVENT_TASK_FILE]:# sent many times by every task
+            logger.debug(f"GUI event occured: {event}, values: {values}")
+        if event == sg.WIN_CLOSED:
             break
+        elif event == sg.WINDOW_CLOSE_ATTEMPTED_EVENT or event == "cancel":
+            maps_loading_interaction_manager.close()
         elif event == 'open_log_location':
             try:
                 run_files_manager.run_explorer_sel(log_file_path)
@@ -441,10 +654,13 @@ try:
         elif event == 'copy_log_path':
             logger.info("Copying log path to clipboard.")
             sg.clipboard_set(str(log_file_path))
-        elif maps_loading_interaction_manager.handle_event(event):
+        elif maps_loading_interaction_manager.handle_event(event, values):
             pass
         else:
             logger.error("GUI event not handled")
+        if maps_loading_interaction_manager.closed():
+            break
+    maps_loading_interaction_manager.join_task()# map is not left half-written
 except KeyboardInterrupt:
     logger.info("Keaboard interruption occured, program will be terminated")
 except:
@@ -462,3 +678,4 @@ OMSI Map Merger will be terminated now.",
 
 logger.info("Closing OMSI Map Merger")
 window.close()
+metrics_file.close()
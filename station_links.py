@@ -15,6 +15,8 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import copy
+
 class StationLinkEntry:
     def __init__(self,
                  comment: str,
@@ -36,6 +38,12 @@ class StationLinkEntry:
         self.line6: str = line6
         self.line7: str = line7
         self.chrono_files = chrono_files#???????????
+    
+    def shifted_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> 'StationLinkEntry':# other attributes are shared with self
+        shifted: StationLinkEntry = copy.copy(self)
+        shifted.id = self.id + ids_value
+        shifted.tile_index = self.tile_index + tile_indices_value
+        return shifted
 
 class StationLink:
     def __init__(self,
@@ -62,6 +70,13 @@ class StationLink:
         self.line8: str = line8
         self.line9: str = line9
         self.station_link_entry: list[StationLinkEntry] = station_link_entry
+    
+    def shifted_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> 'StationLink':
+        shifted: StationLink = copy.copy(self)
+        shifted.id_busstop_start = self.id_busstop_start + ids_value
+        shifted.id_busstop_end = self.id_busstop_end + ids_value
+        shifted.station_link_entry = [station_link_entry.shifted_ids_and_tile_indices(ids_value, tile_indices_value) for station_link_entry in self.station_link_entry]
+        return shifted
 
 class StationLinks:
     def __init__(self,
@@ -72,10 +87,5 @@ class StationLinks:
         self.comment2: str = comment2
         self.station_link: list[StationLink] = station_link
     
-    def change_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> None:
-        for station_link in self.station_link:
-            station_link.id_busstop_start += ids_value
-            station_link.id_busstop_end += ids_value
-            for station_link_entry in station_link.station_link_entry:
-                station_link_entry.id += ids_value
-                station_link_entry.tile_index += tile_indices_value
+    def shifted_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> 'StationLinks':
+        return StationLinks(self.comment1, self.comment2, [station_link.shifted_ids_and_tile_indices(ids_value, tile_indices_value) for station_link in self.station_link])
@@ -15,7 +15,10 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import file_decoder
 import parglare
+import parse_tables
+import grammar_actions
 import station_links
 import os
 
@@ -26,8 +29,9 @@ class StationLinksParser:
                                                                   station_link=n[7] if n[7] is not None else []
                                                                   )],
         "NONEMPTY_LINE": [lambda _, n: n[0]],
-        "NONEMPTY_LINES": [lambda _, n: [n[0]],
-                           lambda _, n: n[0] + [n[1]]],
+        "STATION_LINK_COMMENT": [lambda _, n: n[0]],
+        "NONEMPTY_LINES": [grammar_actions.list_first,
+                           grammar_actions.list_append],
         "STATION_LINK_ENTRY_GROUP": [lambda _, n: station_links.StationLinkEntry(comment=n[0],
                                                                                  id=int(n[2]),
                                                                                  line2=n[3],
@@ -38,8 +42,8 @@ class StationLinksParser:
                                                                                  line7=n[8],
                                                                                  chrono_files=n[9]
                                                                                  )],
-        "STATION_LINK_ENTRY_GROUP_LIST": [lambda _, n: [n[0]],
-                                          lambda _, n: n[0] + [n[1]]],
+        "STATION_LINK_ENTRY_GROUP_LIST": [grammar_actions.list_first,
+                                          grammar_actions.list_append],
         "STATION_LINK_GROUP": [lambda _, n: station_links.StationLink(comment=n[0],
                                                                       line1=n[3],
                                                                       id_busstop_start=int(n[4]),
@@ -52,15 +56,15 @@ class StationLinksParser:
                                                                       line9=n[11],
                                                                       station_link_entry=n[13] if n[13] is not None else []
                                                                       )],
-        "STATION_LINK_GROUP_LIST": [lambda _, n: [n[0]],
-                                    lambda _, n: n[0] + [n[1]]]
+        "STATION_LINK_GROUP_LIST": [grammar_actions.list_first,
+                                    grammar_actions.list_append]
     }
     def __init__(self):
         self.grammar = parglare.Grammar.from_file(os.path.join(os.path.dirname(os.path.realpath(__file__)), "station_links_grammar.pg"))
-        self.parser = parglare.GLRParser(self.grammar,
-                                         actions=self.actions,
-                                         ws="\r")
+        self.parser = parglare.Parser(self.grammar,
+                                      actions=self.actions,
+                                      ws="\r",
+                                      table=parse_tables.table(self.grammar))
     def parse(self, file_name):
-        with open(file_name, encoding="iso-8859-1") as f:
-            content = f.read()
-        return self.parser.parse(content)[0]
+        content = file_decoder.decoded(file_name, ["iso-8859-1"])
+        return self.parser.parse(content)
@@ -0,0 +1,66 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import pytest
+import station_links
+import station_links_parser
+import station_links_serializer
+
+@pytest.fixture(scope="module")
+def parser() -> station_links_parser.StationLinksParser:
+    return station_links_parser.StationLinksParser()
+
+def serialized(sl: station_links.StationLinks) -> str:
+    f = io.StringIO()
+    station_links_serializer.StationLinksSerializer().serialize_(sl, f)
+    return f.getvalue()
+
+def some_entry(comment: str, id: int, chrono_files: list[str] | None) -> station_links.StationLinkEntry:
+    return station_links.StationLinkEntry(comment, id, '0', 3, '27.3', '0', '1', '2', chrono_files)
+
+def some_link(comment: str, id_busstop_start: int, entries: list[station_links.StationLinkEntry]) -> station_links.StationLink:
+    return station_links.StationLink(comment, '0', id_busstop_start, id_busstop_start + 1, '1', '2', '3', '4', '5', '6', entries)
+
+def station_links_corpus() -> list[station_links.StationLinks]:
+    return [
+        station_links.StationLinks("No links", "Second comment", []),
+        station_links.StationLinks("Comments before links", "Second comment",
+                                   [some_link('Bahnhof - Markt', 10, [some_entry('Entry 1', 1, None), some_entry('Entry 2', 2, ['Chrono\\a', 'Chrono\\b'])]),
+                                    some_link('Markt - Bahnhof', 12, [some_entry('[StnLink]', 3, ['Chrono\\a'])]),# entry comment looking like a header
+                                    some_link('[StnLink_entry]', 14, [some_entry('Entry 1', 4, None)])]),
+    ]
+
+def assert_station_links_equal(parsed: station_links.StationLinks, original: station_links.StationLinks) -> None:
+    assert (parsed.comment1, parsed.comment2) == (original.comment1, original.comment2)
+    assert len(parsed.station_link) == len(original.station_link)
+    for parsed_link, original_link in zip(parsed.station_link, original.station_link):
+        assert {**vars(parsed_link), 'station_link_entry': None} == {**vars(original_link), 'station_link_entry': None}
+        assert [vars(entry) for entry in parsed_link.station_link_entry] == [vars(entry) for entry in original_link.station_link_entry]
+
+@pytest.mark.parametrize("original", station_links_corpus(), ids=lambda sl: sl.comment1)
+def test_round_trip(original, parser) -> None:
+    content: str = serialized(original)
+    parsed: station_links.StationLinks = parser.parser.parse(content)
+    assert_station_links_equal(parsed, original)
+    assert serialized(parsed) == content
+
+def test_comment_before_link(parser) -> None:# last line of previous entry is not taken as comment of next link
+    content: str = serialized(station_links_corpus()[1])
+    parsed: station_links.StationLinks = parser.parser.parse(content)
+    assert [link.comment for link in parsed.station_link] == ['Bahnhof - Markt', 'Markt - Bahnhof', '[StnLink_entry]']
+    assert parsed.station_link[0].station_link_entry[1].chrono_files == ['Chrono\\a', 'Chrono\\b']
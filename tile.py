@@ -15,9 +15,21 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import array
+import collections.abc
+import copy
+import itertools
 import omsi_files
+import operator
+import typing
+
+# big maps have millions of tile elements, __slots__ (no per-instance __dict__) save memory
 
 class Rule:
+    __slots__ = (
+        'kill', 'line1', 'line2', 'line3', 'line4',
+    )
+    
     def __init__(self,
                  kill: bool,
                  line1: str,
@@ -41,6 +53,12 @@ class Rule:
         return hash(self.__key())
 
 class Spline:
+    __slots__ = (
+        'h', 'line1', 'file_name', 'id', 'id_previous', 'id_next', 'pos_x', 'pos_z', 'pos_y', 'rotate', 'length',
+        'radius', 'gradient_start', 'gradient_end', 'delta_h', 'cant_start', 'cant_end', 'skew_start', 'skew_end',
+        'line18', 'mirror', 'spline_terrain_align_2', 'rule_list',
+    )
+    
     def __init__(self,
                  h: bool,
                  line1: str,
@@ -102,8 +120,22 @@ class Spline:
     
     def __hash__(self) -> int:
         return hash(self.__key())
+    
+    def shifted_ids(self, value: int) -> 'Spline':# other attributes are shared with self
+        shifted: Spline = copy.copy(self)
+        shifted.id = self.id + value
+        if self.id_previous != 0:
+            shifted.id_previous = self.id_previous + value
+        if self.id_next != 0:
+            shifted.id_next = self.id_next + value
+        return shifted
 
 class _Object:
+    __slots__ = (
+        'description', 'attach_object', 'line1', 'file_name', 'id', 'pos_x', 'pos_z', 'pos_y', 'rotate', 'pitch',
+        'bank', 'line10', 'opt_lines', 'varparent', 'spline_terrain_align', 'rule_list',
+    )
+    
     def __init__(self,
                  description: str,
 				 attach_object: bool,
@@ -149,8 +181,20 @@ class _Object:
     
     def __hash__(self) -> int:
         return hash(self.__key())
+    
+    def shifted_ids(self, value: int) -> '_Object':# other attributes are shared with self
+        shifted: _Object = copy.copy(self)
+        shifted.id = self.id + value
+        if self.varparent is not None:
+            shifted.varparent = self.varparent + value
+        return shifted
 
 class SplineAttachement:
+    __slots__ = (
+        'description', 'line1', 'file_name', 'id', 'line4', 'pos_x', 'pos_z', 'pos_y', 'rotate', 'pitch', 'bank',
+        'interval', 'distance', 'line13', 'line14', 'opt_lines', 'varparent', 'spline_terrain_align', 'rule_list',
+    )
+    
     def __init__(self,
                  description: str,
                  line1: str,
@@ -202,8 +246,21 @@ class SplineAttachement:
     
     def __hash__(self) -> int:
         return hash(self.__key())
+    
+    def shifted_ids(self, value: int) -> 'SplineAttachement':# other attributes are shared with self
+        shifted: SplineAttachement = copy.copy(self)
+        shifted.id = self.id + value
+        if self.varparent is not None:
+            shifted.varparent = self.varparent + value
+        return shifted
 
 class SplineAttachementRepeater:
+    __slots__ = (
+        'description', 'line1', 'line2', 'line3', 'file_name', 'id', 'line6', 'pos_x', 'pos_z', 'pos_y', 'rotate',
+        'pitch', 'bank', 'interval', 'distance', 'line15', 'line16', 'opt_lines', 'varparent', 'spline_terrain_align',
+        'rule_list',
+    )
+    
     def __init__(self,
                  description: str,
                  line1: str,
@@ -259,6 +316,13 @@ class SplineAttachementRepeater:
     
     def __hash__(self) -> int:
         return hash(self.__key())
+    
+    def shifted_ids(self, value: int) -> 'SplineAttachementRepeater':# other attributes are shared with self
+        shifted: SplineAttachementRepeater = copy.copy(self)
+        shifted.id = self.id + value
+        if self.varparent is not None:
+            shifted.varparent = self.varparent + value
+        return shifted
 
 class Tile:
     def __init__(self,
@@ -291,29 +355,194 @@ class Tile:
     def __hash__(self) -> int:
         return hash(self.__key())
     
-    def change_ids(self, value: int) -> None:
+    def objects_count(self) -> int:# splines and objects
+        return len(self.spline or []) + len(self._object or [])
+    
+    def shifted_ids(self, value: int) -> 'Tile':# unchanged parts are shared with self
+        shifted: Tile = copy.copy(self)
         if self.spline is not None:
-            for spl in self.spline:
-                spl.id = spl.id + value
-                if spl.id_previous != 0:
-                    spl.id_previous = spl.id_previous + value
-                if spl.id_next != 0:
-                    spl.id_next = spl.id_next + value
+            shifted.spline = [spl.shifted_ids(value) for spl in self.spline]
         if self._object is not None:
-            for obj in self._object:
-                obj.id = obj.id + value
-                if obj.varparent is not None:
-                   obj.varparent = obj.varparent + value
-    
-    def change_groundtex_indices(self, value: int):
-        for omsi_file in self._files.omsi_files:
-            if "groundtex_index" in omsi_file.params:
-                omsi_file.params["groundtex_index"] = str(int(omsi_file.params["groundtex_index"])+value)
+            shifted._object = [obj.shifted_ids(value) for obj in self._object]
+        return shifted
+    
+    def shifted_groundtex_indices(self, value: int) -> 'Tile':
+        return self.__with_files([omsi_file.with_params({"groundtex_index": str(int(omsi_file.params["groundtex_index"])+value)})
+                                  if "groundtex_index" in omsi_file.params else omsi_file
+                                  for omsi_file in self._files.omsi_files])
+    
+    def with_files_pos(self, pos_x: int, pos_y: int) -> 'Tile':
+        return self.__with_files([omsi_file.with_params({'pos_x': str(pos_x), 'pos_y': str(pos_y)}) for omsi_file in self._files.omsi_files])
+    
+    def with_file(self, omsi_file: omsi_files.OmsiFile) -> 'Tile':
+        return self.__with_files(self._files.omsi_files + [omsi_file])
+    
+    def __with_files(self, files: list[omsi_files.OmsiFile]) -> 'Tile':
+        shifted: Tile = copy.copy(self)
+        shifted._files = omsi_files.OmsiFiles(files)
+        return shifted
+
+    def save_files(self,
+                   directory,
+                   placement: omsi_files.FilePlacement = omsi_files.FilePlacement.COPY,
+                   placer: omsi_files.FilesPlacer | None = None,
+                   ) -> omsi_files.PlacementSummary:
+        return self._files.save(directory, placement, placer)
 
-    def set_files_pos(self, pos_x: int, pos_y: int) -> None:
-        for ofile in self._files.omsi_files:
-            ofile.params['pos_x'] = str(pos_x)
-            ofile.params['pos_y'] = str(pos_y)
+# Columnar storage of ids: ids of tile's splines and objects kept in integer
+# arrays, so shifting all ids of a tile is one bulk operation on arrays (map
+# with builtin functions, no Python level loop) instead of copying every
+# element. Elements are built from the arrays only when accessed.
+
+def _shifted_column(column: array.array, value: int, mask: array.array | None = None) -> array.array:
+    if mask is None:
+        return array.array('q', map(value.__add__, column))
+    # value is added only where mask is 1
+    return array.array('q', map(operator.add, column, map(value.__mul__, mask)))
+
+class SplineIds:
+    # has_previous/has_next are 0 where id_previous/id_next is 0 (no neighbour spline), such ids are not shifted
+    __slots__ = ('id', 'id_previous', 'id_next', 'has_previous', 'has_next')
+    
+    def __init__(self,
+                 id: array.array,
+                 id_previous: array.array,
+                 id_next: array.array,
+                 has_previous: array.array,
+                 has_next: array.array,
+                 ):
+        self.id: array.array = id
+        self.id_previous: array.array = id_previous
+        self.id_next: array.array = id_next
+        self.has_previous: array.array = has_previous
+        self.has_next: array.array = has_next
+    
+    @classmethod
+    def of(cls, splines: list[Spline]) -> 'SplineIds':
+        id_previous: array.array = array.array('q', map(operator.attrgetter('id_previous'), splines))
+        id_next: array.array = array.array('q', map(operator.attrgetter('id_next'), splines))
+        return cls(array.array('q', map(operator.attrgetter('id'), splines)),
+                   id_previous,
+                   id_next,
+                   array.array('b', map(bool, id_previous)),
+                   array.array('b', map(bool, id_next)))
+    
+    def shifted(self, value: int) -> 'SplineIds':
+        return SplineIds(_shifted_column(self.id, value),
+                         _shifted_column(self.id_previous, value, self.has_previous),
+                         _shifted_column(self.id_next, value, self.has_next),
+                         self.has_previous,
+                         self.has_next)
+    
+    def rows(self) -> typing.Iterator[tuple[int, int, int]]:# (id, id_previous, id_next) of every spline
+        return zip(self.id, self.id_previous, self.id_next)
+    
+    def element(self, spline: Spline, index: int) -> Spline:
+        with_ids: Spline = copy.copy(spline)
+        with_ids.id = self.id[index]
+        with_ids.id_previous = self.id_previous[index]
+        with_ids.id_next = self.id_next[index]
+        return with_ids
 
-    def save_files(self, directory) -> None:
-        self._files.save(directory)
\ No newline at end of file
+type AnyObject = _Object | SplineAttachement | SplineAttachementRepeater
+
+class ObjectIds:
+    # varparent is 0 and has_varparent is 0 where varparent is None
+    __slots__ = ('id', 'varparent', 'has_varparent')
+    
+    def __init__(self,
+                 id: array.array,
+                 varparent: array.array,
+                 has_varparent: array.array,
+                 ):
+        self.id: array.array = id
+        self.varparent: array.array = varparent
+        self.has_varparent: array.array = has_varparent
+    
+    @classmethod
+    def of(cls, objects: list[AnyObject]) -> 'ObjectIds':
+        varparents: list[int | None] = list(map(operator.attrgetter('varparent'), objects))
+        return cls(array.array('q', map(operator.attrgetter('id'), objects)),
+                   array.array('q', [0 if varparent is None else varparent for varparent in varparents]),
+                   array.array('b', map(operator.is_not, varparents, itertools.repeat(None))))
+    
+    def shifted(self, value: int) -> 'ObjectIds':
+        return ObjectIds(_shifted_column(self.id, value),
+                         _shifted_column(self.varparent, value, self.has_varparent),
+                         self.has_varparent)
+    
+    def rows(self) -> typing.Iterator[tuple[int, int | None]]:# (id, varparent) of every object
+        return zip(self.id, (varparent if has_varparent else None for varparent, has_varparent in zip(self.varparent, self.has_varparent)))
+    
+    def element(self, obj: AnyObject, index: int) -> AnyObject:
+        with_ids: AnyObject = copy.copy(obj)
+        with_ids.id = self.id[index]
+        with_ids.varparent = self.varparent[index] if self.has_varparent[index] else None
+        return with_ids
+
+class ElementsView[E: Spline | AnyObject](collections.abc.Sequence):
+    # read-only list of elements with ids taken from columns, other attributes are shared with base elements
+    def __init__(self, base: list[E], ids: SplineIds | ObjectIds) -> None:
+        self.__base: list[E] = base
+        self.__ids: SplineIds | ObjectIds = ids
+    
+    def __len__(self) -> int:
+        return len(self.__base)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return typing.cast(E, self.__ids.element(self.__base[index], index))
+    
+    def __eq__(self, other) -> bool:
+        return isinstance(other, collections.abc.Sequence) and list(self) == list(other)
+    
+    def with_ids(self) -> typing.Iterator[tuple[E, tuple]]:# base elements with their ids (rows of columns), without copying elements
+        return zip(self.__base, self.__ids.rows())
+
+class ColumnarTile(Tile):
+    # Tile with ids in columns, spline and _object are ElementsViews. Given
+    # spline and _object are base elements, their ids are used only when
+    # spline_ids and object_ids are not given.
+    def __init__(self,
+                 initial_comment: str,
+                 version: str,
+                 terrain: bool,
+                 water: bool,
+                 variable_terrainlightmap: bool,
+                 variable_terrain: bool,
+                 spline: list[Spline] | None,
+                 _object: list[AnyObject] | None,
+                 spline_ids: SplineIds | None = None,
+                 object_ids: ObjectIds | None = None,
+                 ):
+        super().__init__(initial_comment, version, terrain, water, variable_terrainlightmap, variable_terrain, spline, _object)
+        self.__base_spline: list[Spline] | None = spline
+        self.__base_object: list[AnyObject] | None = _object
+        self.spline_ids: SplineIds | None = None
+        self.object_ids: ObjectIds | None = None
+        if spline is not None:
+            self.spline_ids = SplineIds.of(spline) if spline_ids is None else spline_ids
+            self.spline = typing.cast(list[Spline], ElementsView(spline, self.spline_ids))
+        if _object is not None:
+            self.object_ids = ObjectIds.of(_object) if object_ids is None else object_ids
+            self._object = typing.cast(list[AnyObject], ElementsView(_object, self.object_ids))
+    
+    @classmethod
+    def of(cls, til: Tile) -> 'ColumnarTile':
+        if isinstance(til, ColumnarTile):
+            return til
+        columnar: ColumnarTile = cls(til.initial_comment, til.version, til.terrain, til.water, til.variable_terrainlightmap, til.variable_terrain,
+                                     til.spline, til._object)
+        columnar._files = til._files
+        return columnar
+    
+    def shifted_ids(self, value: int) -> 'ColumnarTile':
+        shifted: ColumnarTile = ColumnarTile(self.initial_comment, self.version, self.terrain, self.water, self.variable_terrainlightmap, self.variable_terrain,
+                                             self.__base_spline, self.__base_object,
+                                             None if self.spline_ids is None else self.spline_ids.shifted(value),
+                                             None if self.object_ids is None else self.object_ids.shifted(value))
+        shifted._files = self._files
+        return shifted
@@ -16,9 +16,23 @@
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
 import parglare
+import parse_tables
+import grammar_actions
 import tile
+import tile_stream_parser
 import os
 import file_decoder
+import contextlib
+import logging
+from enum import Enum, auto
+
+logger = logging.getLogger(__name__)
+
+ENCODINGS: list[str] = ['utf_16', 'ascii']
+
+class TileParserEngine(Enum):
+    LR = auto() # parglare LR parser over tile_grammar.pg
+    STREAM = auto() # tile_stream_parser, falls back to LR on unsupported syntax
 
 class TileParser():
     actions = {
@@ -87,13 +101,11 @@ class TileParser():
                                                     spline_terrain_align_2=n[22],
                                                     rule_list=n[23]
                                                     )],
-        "SPLINE_GROUP_LIST": [lambda _, n: [n[0]],
-                              lambda _, n: [n[0]],
-                              lambda _, n: n[0] + [n[1]],
-                              lambda _, n: n[0] + [n[1]]],
-        "LINES": [lambda _, n: [n[0]],
-                  lambda _, n: n[0] + [n[1]]],
-        "SPLINE_TERRAIN_ALGIN_GROUP": [lambda _, n: True],
+        "SPLINE_GROUP_LIST": [grammar_actions.list_first,
+                              grammar_actions.list_first,
+                              grammar_actions.list_append,
+                              grammar_actions.list_append],
+        "SPLINE_TERRAIN_ALIGN_GROUP": [lambda _, n: True],
         "OBJECT_HEADER_GROUP": [lambda _, n: False,
                                 lambda _, n: True],
         "OBJECT_GROUP": [lambda _, n: tile._Object(description=n[0],
@@ -108,10 +120,10 @@ class TileParser():
                                                    pitch=n[9],
                                                    bank=n[10],
                                                    line10=n[11],
-												   opt_lines=n[12],
-                                                   varparent= int(n[14]) if n[14] is not None else None,
-                                                   spline_terrain_align=n[15],
-                                                   rule_list=n[16]
+												   opt_lines=grammar_actions.terminated_lines(n[12]),
+                                                   varparent= int(n[13]) if n[13] is not None else None,
+                                                   spline_terrain_align=n[14],
+                                                   rule_list=n[15]
                                                    )],
         "SPLINEATTACHEMENT_GROUP": [lambda _, n: tile.SplineAttachement(description=n[0],
                                                                         line1=n[2],
@@ -128,10 +140,10 @@ class TileParser():
                                                                         distance=n[13],
                                                                         line13=n[14],
                                                                         line14=n[15],
-                                                                        opt_lines=n[16],
-                                                                        varparent= int(n[18]) if n[18] is not None else None,
-                                                                        spline_terrain_align=n[19],
-                                                                        rule_list=n[20]
+                                                                        opt_lines=grammar_actions.terminated_lines(n[16]),
+                                                                        varparent= int(n[17]) if n[17] is not None else None,
+                                                                        spline_terrain_align=n[18],
+                                                                        rule_list=n[19]
                                                                         )],
         "SPLINEATTACHEMENT_REPEATER_GROUP": [lambda _, n: tile.SplineAttachementRepeater(description=n[0],
                                                                                          line1=n[2],
@@ -150,17 +162,17 @@ class TileParser():
                                                                                          distance=n[15],
                                                                                          line15=n[16],
                                                                                          line16=n[17],
-                                                                                         opt_lines=n[18],
-                                                                                         varparent= int(n[20]) if n[20] is not None else None,
-                                                                                         spline_terrain_align=n[21],
-                                                                                         rule_list=n[22]
+                                                                                         opt_lines=grammar_actions.terminated_lines(n[18]),
+                                                                                         varparent= int(n[19]) if n[19] is not None else None,
+                                                                                         spline_terrain_align=n[20],
+                                                                                         rule_list=n[21]
                                                                                          )],
-        "OBJECT_GROUP_LIST": [lambda _, n: [n[0]],
-                              lambda _, n: [n[0]],
-                              lambda _, n: [n[0]],
-                              lambda _, n: n[0] + [n[1]],
-                              lambda _, n: n[0] + [n[1]],
-                              lambda _, n: n[0] + [n[1]]],
+        "OBJECT_GROUP_LIST": [grammar_actions.list_first,
+                              grammar_actions.list_first,
+                              grammar_actions.list_first,
+                              grammar_actions.list_append,
+                              grammar_actions.list_append,
+                              grammar_actions.list_append],
         "VARPARENT_GROUP": [lambda _, n: n[1]],
         "RULE_GROUP": [lambda _, n: tile.Rule(kill=False,
                                               line1=n[1],
@@ -174,18 +186,49 @@ class TileParser():
                                                    line3=n[3],
                                                    line4=n[4]
                                                    )],
-        "RULE_GROUP_LIST": [lambda _, n: [n[0]],
-                            lambda _, n: [n[0]],
-                            lambda _, n: n[0] + [n[1]],
-                            lambda _, n: n[0] + [n[1]]],
+        "RULE_GROUP_LIST": [grammar_actions.list_first,
+                            grammar_actions.list_first,
+                            grammar_actions.list_append,
+                            grammar_actions.list_append],
         "OPTIONAL_LINE": [lambda _, n: "",
                           lambda _, n: n[0]],
-		"NONEMPTY_LINE": [lambda _, n: n[0]]
+		"NONEMPTY_LINE": [lambda _, n: n[0]],
+        "OBJECT_COMMENT": [lambda _, n: n[0]],
+        "TERMINATED_LINES": [lambda _, n: [""],
+                             grammar_actions.list_append_empty,
+                             grammar_actions.list_append_empty],
+        "UNTERMINATED_LINES": [grammar_actions.list_first,
+                               grammar_actions.list_append,
+                               grammar_actions.list_append]
     }
-    def __init__(self):
+    def __init__(self, engine: TileParserEngine = TileParserEngine.STREAM):
+        self.engine: TileParserEngine = engine
         self.grammar = parglare.Grammar.from_file(os.path.join(os.path.dirname(os.path.realpath(__file__)), "tile_grammar.pg"))
-        self.parser = parglare.GLRParser(self.grammar,
-                                         actions=self.actions,
-                                         ws="\r")
+        self.parser = parglare.Parser(self.grammar,
+                                      actions=self.actions,
+                                      ws="\r",
+                                      table=parse_tables.table(self.grammar))
+        self.stream_parser = tile_stream_parser.TileStreamParser()
+
     def parse(self, file_name):
-        return self.parser.parse(file_decoder.decoded(file_name, ['utf_16', 'ascii']))[0]
+        # stream parser takes lines decoded chunk by chunk from memory mapped file, so whole content is never held
+        with file_decoder.mapped(file_name) as data:
+            if self.engine is TileParserEngine.STREAM:
+                encoding: str = file_decoder.sniffed_encoding(data, ENCODINGS)
+                try:
+                    with contextlib.closing(file_decoder.decoded_lines(data, encoding)) as lines:
+                        return self.stream_parser.parse_split_lines(lines)
+                except tile_stream_parser.UnsupportedSyntaxError as e:
+                    logger.info(f"Stream tile parser gave up ({e}), falling back to LR parser.")
+                    return self.parser.parse(file_decoder.decoded_buffer(data, ENCODINGS, file_name))
+                except UnicodeError as e:
+                    logger.info(f"Decoding tile with encoding \"{encoding}\" failed ({e}), trying other encodings.")
+            return self.parse_content(file_decoder.decoded_buffer(data, ENCODINGS, file_name))
+
+    def parse_content(self, content: str) -> tile.Tile:
+        if self.engine is TileParserEngine.STREAM:
+            try:
+                return self.stream_parser.parse_content(content)
+            except tile_stream_parser.UnsupportedSyntaxError as e:
+                logger.info(f"Stream tile parser gave up ({e}), falling back to LR parser.")
+        return self.parser.parse(content)
@@ -0,0 +1,132 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import pickle
+import pytest
+import parglare
+import file_decoder
+import tile
+import tile_parser
+import tile_serializer
+import tile_stream_parser
+
+@pytest.fixture(scope="module")
+def lr_parser() -> tile_parser.TileParser:
+    return tile_parser.TileParser(tile_parser.TileParserEngine.LR)
+
+@pytest.fixture(scope="module")
+def stream_parser() -> tile_parser.TileParser:
+    return tile_parser.TileParser(tile_parser.TileParserEngine.STREAM)
+
+def serialized(t: tile.Tile) -> str:
+    f = io.StringIO()
+    tile_serializer.TileSerializer().serialize_(t, f)
+    return f.getvalue()
+
+def some_rules() -> list[tile.Rule]:
+    return [tile.Rule(False, '0', '', 'Sceneryobjects\\Signs\\sign.sco', '1'),
+            tile.Rule(True, '2', '3', '', '4')]
+
+def some_spline(h: bool, mirror: bool, spline_terrain_align_2: str | None, rule_list: list[tile.Rule] | None) -> tile.Spline:
+    return tile.Spline(h, '0', 'Splines\\Marcel\\Hstr_6spur_Wilhelm1.sli', 4, 0, 5, '45.8954123576869', '3.81469718101361E-6', '14.8770606207205', '0', '149.999997646012', '199.99999686135', \
+                       '0', '0', '0.5' if h else None, '0', '0', '0', '0', '0', mirror, spline_terrain_align_2, rule_list)
+
+def some_objects() -> list[tile._Object | tile.SplineAttachement | tile.SplineAttachementRepeater]:
+    return [
+        tile._Object('Object Nr. 1', False, '0', 'Sceneryobjects\\Buildings_MC\\bw_50s_01.sco', 6, '53.3936693422588', '126.708424359543', '0', '29.4639429430018', '0', '0', '0', None, None, None, None),
+        tile._Object('Object Nr. 2', True, '0', 'Sceneryobjects\\Buildings_MC\\bw_50s_01.sco', 7, '1', '2', '3', '4', '5', '6', '1', ['2', 'Text 1', '', 'Text 3', ''], 6, True, some_rules()),
+        tile.SplineAttachement('Object Nr. 0', '0', 'Sceneryobjects\\Buildings_MC\\bw_30s_01.sco', 1, '0', '48.6367491077964', '0', '9.71228307628491', '277.671388033057', '0', '0', \
+                               '29.9999995292025', '299.999995292025', '0', '0', None, None, True, None),
+        tile.SplineAttachement('Object Nr. 3', '0', 'Sceneryobjects\\Buildings_MC\\bw_30s_01.sco', 8, '0', '1', '2', '3', '4', '5', '6', \
+                               '7', '8', '0', '1', ['mirror'], 4, None, some_rules()[:1]),
+        tile.SplineAttachementRepeater('Object Nr. 23', '0', '12', '117', 'Sceneryobjects\\Dodatkowe busze Heir\\Busz 4a\\Busz 4_5m.sco', 10989, '0', '-3.52011121533649', \
+                                       '-0.499999992153375', '971.351040613941', '90.0000020235813', '0', '0', '2.99999995292025', '394.999998955127', '0', '0', None, 4444, None, None),
+        tile.SplineAttachementRepeater('Object Nr. 24', '0', '12', '117', 'Sceneryobjects\\Busz.sco', 10990, '0', '1', '2', '3', '4', '5', '6', '7', '8', '0', '0', \
+                                       ['', ''], None, True, some_rules()[1:]),
+    ]
+
+def tiles_corpus() -> list[tile.Tile]:
+    return [
+        tile.Tile("Empty tile", '', None, None, None, None, None, None),
+        tile.Tile("Flags only", '14', True, True, True, True, None, None),
+        tile.Tile("Splines only", '14', True, None, None, None,
+                  [some_spline(False, False, None, None),
+                   some_spline(True, True, '1', None),
+                   some_spline(False, True, None, some_rules()),
+                   some_spline(True, False, '0', some_rules())],
+                  None),
+        tile.Tile("Objects only", '14', None, True, None, True, None, some_objects()),
+        tile.Tile("Created for testing purposes", '14', True, True, True, True,
+                  [some_spline(False, False, None, None), some_spline(True, False, None, some_rules())],
+                  some_objects() + list(reversed(some_objects()))),
+    ]
+
+@pytest.mark.parametrize("original", tiles_corpus(), ids=lambda t: t.initial_comment)
+def test_engines_equal(original, lr_parser, stream_parser) -> None:
+    content: str = serialized(original)
+    parsed_lr: tile.Tile = lr_parser.parse_content(content)
+    parsed_stream: tile.Tile = stream_parser.parse_content(content)
+    assert parsed_lr == parsed_stream
+    assert parsed_stream == original
+
+@pytest.mark.parametrize("original", tiles_corpus(), ids=lambda t: t.initial_comment)
+def test_stream_parser_accepts_serialized(original) -> None:
+    assert tile_stream_parser.TileStreamParser().parse_content(serialized(original)) == original
+
+@pytest.mark.parametrize("original", tiles_corpus(), ids=lambda t: t.initial_comment)
+def test_pickle_round_trip(original) -> None:# parse cache and parallel loading pickle tiles
+    unpickled: tile.Tile = pickle.loads(pickle.dumps(original, protocol=pickle.HIGHEST_PROTOCOL))
+    assert unpickled == original
+
+@pytest.mark.parametrize("original", tiles_corpus() + [tile.ColumnarTile.of(tiles_corpus()[-1]).shifted_ids(100)], ids=lambda t: t.initial_comment)
+def test_serialize_file(original, tmp_path) -> None:# tile encoded at once, same bytes as printed line by line to text stream
+    tile_serializer.TileSerializer().serialize(original, tmp_path / "tile_0_0.map")
+    with open(tmp_path / "expected.map", 'w', encoding='utf_16', newline='\r\n') as f:
+        for line in tile_serializer.TileSerializer().lines(original):
+            print(line, file=f)
+    assert (tmp_path / "tile_0_0.map").read_bytes() == (tmp_path / "expected.map").read_bytes()
+
+def test_parse_file(tmp_path, lr_parser, stream_parser) -> None:
+    original: tile.Tile = tiles_corpus()[-1]
+    file_path = tmp_path / "tile_0_0.map"
+    tile_serializer.TileSerializer().serialize(original, str(file_path))
+    assert stream_parser.parse(str(file_path)) == lr_parser.parse(str(file_path)) == original
+
+@pytest.mark.parametrize("original", tiles_corpus(), ids=lambda t: t.initial_comment)
+def test_parse_file_in_chunks(original, tmp_path, stream_parser, monkeypatch) -> None:# lines and chunks split at every place
+    monkeypatch.setattr(file_decoder, "CHUNK_SIZE", 7)
+    monkeypatch.setattr(tile_stream_parser, "WINDOW_STEP", 3)
+    file_path = tmp_path / "tile_0_0.map"
+    tile_serializer.TileSerializer().serialize(original, str(file_path))
+    assert stream_parser.parse(str(file_path)) == original
+
+def test_fallback_to_lr(lr_parser, stream_parser) -> None:
+    content: str = "Tile\n\n[version]\n14\r\n\n[terrain]\n\n\n"
+    with pytest.raises(tile_stream_parser.UnsupportedSyntaxError):
+        tile_stream_parser.TileStreamParser().parse_content(content)
+    assert stream_parser.parse_content(content) == lr_parser.parse_content(content)
+
+@pytest.mark.parametrize("content", [
+    "Tile\n\n[version]\n14\n",
+    "Tile\n\n[version]\n14\n\n[spline]\n0\n",
+    "Tile\n\n[version]\n14\n\nObject\n[object]\n0\n1\n2\n3\n4\n5\n6\n7\n8\n9\n",
+    "Tile\n\n[version]\n14\n\n[object]\n0\n1\n2\n3\n4\n5\n6\n7\n8\n9\n\n",
+])
+def test_invalid_tile_rejected(content, stream_parser) -> None:
+    with pytest.raises(parglare.ParseError):
+        stream_parser.parse_content(content)
@@ -16,155 +16,150 @@
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
 import tile
+import typing
+
+# Whole tile is built as list of lines, joined and encoded once, writing
+# every field separately through UTF-16 text stream is much slower on
+# big tiles. Output is the same as written by print() to text stream with
+# newline='\r\n'.
+
+def _splines_with_ids(splines: typing.Sequence[tile.Spline]) -> typing.Iterable[tuple[tile.Spline, tuple[int, int, int]]]:
+    if isinstance(splines, tile.ElementsView):
+        return splines.with_ids()
+    return ((spl, (spl.id, spl.id_previous, spl.id_next)) for spl in splines)
+
+def _objects_with_ids(objects: typing.Sequence[tile.AnyObject]) -> typing.Iterable[tuple[tile.AnyObject, tuple[int, int | None]]]:
+    if isinstance(objects, tile.ElementsView):
+        return objects.with_ids()
+    return ((obj, (obj.id, obj.varparent)) for obj in objects)
+
+def _rule_lines(rul: tile.Rule) -> tuple[str, ...]:
+    return ("[kill_rule]" if rul.kill else "[rule]", str(rul.line1), str(rul.line2), str(rul.line3), str(rul.line4))
+
 class TileSerializer:
     def serialize(self, tile_class, file_name):
-        with open(file_name, 'w', encoding='utf_16', newline='\r\n') as f:
-            self.serialize_(tile_class, f)
+        with open(file_name, 'wb') as f:
+            f.write(self.serialized(tile_class).replace('\n', '\r\n').encode('utf_16'))
 
-    def serialize_(self, tile_class, f):
-        print(tile_class.initial_comment, file=f)
-        print(file=f)
+    def serialize_(self, tile_class, f):# f is text stream
+        f.write(self.serialized(tile_class))
+    
+    def serialized(self, tile_class) -> str:# with '\n' newlines
+        lines: list[str] = self.lines(tile_class)
+        lines.append("")
+        return "\n".join(lines)
+    
+    def lines(self, tile_class) -> list[str]:
+        lines: list[str] = []
+        add = lines.append
+        extend = lines.extend
+        
+        extend((str(tile_class.initial_comment), ""))
 
-        print("[version]", file=f)
-        print(tile_class.version, file=f)
-        print(file=f)
+        extend(("[version]", str(tile_class.version), ""))
 
         if tile_class.terrain:
-            print("[terrain]", file=f)
-            print(file=f)
-            print(file=f)#like OMSI 2 Editor
+            extend(("[terrain]", "", ""))#like OMSI 2 Editor
         
         if tile_class.water:
-            print("[water]", file=f)
-            print(file=f)
-            print(file=f)
+            extend(("[water]", "", ""))
 
         if tile_class.variable_terrainlightmap:
-            print("[variable_terrainlightmap]", file=f)
-            print(file=f)
+            extend(("[variable_terrainlightmap]", ""))
 
         if tile_class.variable_terrain:
-            print("[variable_terrain]", file=f)
-            print(file=f)
+            extend(("[variable_terrain]", ""))
         
         if tile_class.spline is not None:
-            for spl in tile_class.spline:
-                if spl.h:
-                    print("[spline_h]", file=f)
-                else:
-                    print("[spline]", file=f)
-                print(spl.line1, file=f)
-                print(spl.file_name, file=f)
-                print(spl.id, file=f)
-                print(spl.id_previous, file=f)
-                print(spl.id_next, file=f)
-                print(spl.pos_x, file=f)
-                print(spl.pos_z, file=f)
-                print(spl.pos_y, file=f)
-                print(spl.rotate, file=f)
-                print(spl.length, file=f)
-                print(spl.radius, file=f)
-                print(spl.gradient_start, file=f)
-                print(spl.gradient_end, file=f)
+            for spl, (spl_id, id_previous, id_next) in _splines_with_ids(tile_class.spline):
+                add("[spline_h]" if spl.h else "[spline]")
+                extend(map(str, (spl.line1,
+                                 spl.file_name,
+                                 spl_id,
+                                 id_previous,
+                                 id_next,
+                                 spl.pos_x,
+                                 spl.pos_z,
+                                 spl.pos_y,
+                                 spl.rotate,
+                                 spl.length,
+                                 spl.radius,
+                                 spl.gradient_start,
+                                 spl.gradient_end)))
                 if spl.h:
-                    print(spl.delta_h, file=f)
-                print(spl.cant_start, file=f)
-                print(spl.cant_end, file=f)
-                print(spl.skew_start, file=f)
-                print(spl.skew_end, file=f)
-                print(spl.line18, file=f)
-                if spl.mirror:
-                    print("mirror", file=f)
-                else:
-                    print(file=f)
+                    add(str(spl.delta_h))
+                extend(map(str, (spl.cant_start,
+                                 spl.cant_end,
+                                 spl.skew_start,
+                                 spl.skew_end,
+                                 spl.line18)))
+                add("mirror" if spl.mirror else "")
                 if spl.spline_terrain_align_2 != "" and spl.spline_terrain_align_2 is not None:
-                    print(file=f)
-                    print("[spline_terrain_align_2]", file=f)
-                    print(spl.spline_terrain_align_2, file=f)
+                    extend(("", "[spline_terrain_align_2]", str(spl.spline_terrain_align_2)))
                 if spl.rule_list is not None:
                     for rul in spl.rule_list:
-                        print(file=f)
-                        if rul.kill:
-                            print("[kill_rule]", file=f)
-                        else:
-                            print("[rule]", file=f)
-                        print(rul.line1, file=f)
-                        print(rul.line2, file=f)
-                        print(rul.line3, file=f)
-                        print(rul.line4, file=f)
-                print(file=f)
+                        add("")
+                        extend(_rule_lines(rul))
+                add("")
         
         if tile_class._object is not None:
-            for obj in tile_class._object:
-                print(obj.description, file=f)
+            for obj, (obj_id, varparent) in _objects_with_ids(tile_class._object):
+                add(str(obj.description))
                 if isinstance(obj, tile._Object):
-                    if obj.attach_object:
-                        print("[attachObj]", file=f)
-                    else:
-                        print("[object]", file=f)
-                    print(obj.line1, file=f)
-                    print(obj.file_name, file=f)
-                    print(obj.id, file=f)
-                    print(obj.pos_x, file=f)
-                    print(obj.pos_y, file=f)
-                    print(obj.pos_z, file=f)
-                    print(obj.rotate, file=f)
-                    print(obj.pitch, file=f)
-                    print(obj.bank, file=f)
-                    print(obj.line10, file=f)
+                    add("[attachObj]" if obj.attach_object else "[object]")
+                    extend(map(str, (obj.line1,
+                                     obj.file_name,
+                                     obj_id,
+                                     obj.pos_x,
+                                     obj.pos_y,
+                                     obj.pos_z,
+                                     obj.rotate,
+                                     obj.pitch,
+                                     obj.bank,
+                                     obj.line10)))
                 elif isinstance(obj, tile.SplineAttachement):
-                    print("[splineAttachement]", file=f)
-                    print(obj.line1, file=f)
-                    print(obj.file_name, file=f)
-                    print(obj.id, file=f)
-                    print(obj.line4, file=f)
-                    print(obj.pos_x, file=f)
-                    print(obj.pos_z, file=f)
-                    print(obj.pos_y, file=f)
-                    print(obj.rotate, file=f)
-                    print(obj.pitch, file=f)
-                    print(obj.bank, file=f)
-                    print(obj.interval, file=f)
-                    print(obj.distance, file=f)
-                    print(obj.line13, file=f)
-                    print(obj.line14, file=f)
+                    add("[splineAttachement]")
+                    extend(map(str, (obj.line1,
+                                     obj.file_name,
+                                     obj_id,
+                                     obj.line4,
+                                     obj.pos_x,
+                                     obj.pos_z,
+                                     obj.pos_y,
+                                     obj.rotate,
+                                     obj.pitch,
+                                     obj.bank,
+                                     obj.interval,
+                                     obj.distance,
+                                     obj.line13,
+                                     obj.line14)))
                 elif isinstance(obj, tile.SplineAttachementRepeater):
-                    print("[splineAttachement_repeater]", file=f)
-                    print(obj.line1, file=f)
-                    print(obj.line2, file=f)
-                    print(obj.line3, file=f)
-                    print(obj.file_name, file=f)
-                    print(obj.id, file=f)
-                    print(obj.line6, file=f)
-                    print(obj.pos_x, file=f)
-                    print(obj.pos_z, file=f)
-                    print(obj.pos_y, file=f)
-                    print(obj.rotate, file=f)
-                    print(obj.pitch, file=f)
-                    print(obj.bank, file=f)
-                    print(obj.interval, file=f)
-                    print(obj.distance, file=f)
-                    print(obj.line15, file=f)
-                    print(obj.line16, file=f)
+                    add("[splineAttachement_repeater]")
+                    extend(map(str, (obj.line1,
+                                     obj.line2,
+                                     obj.line3,
+                                     obj.file_name,
+                                     obj_id,
+                                     obj.line6,
+                                     obj.pos_x,
+                                     obj.pos_z,
+                                     obj.pos_y,
+                                     obj.rotate,
+                                     obj.pitch,
+                                     obj.bank,
+                                     obj.interval,
+                                     obj.distance,
+                                     obj.line15,
+                                     obj.line16)))
                 if obj.opt_lines is not None:
-                    for ol in obj.opt_lines:
-                        print(ol, file=f)
-                print(file=f)
-                if obj.varparent is not None:
-                    print("[varparent]", file=f)
-                    print(obj.varparent, file=f)
-                    print(file=f)
+                    extend(map(str, obj.opt_lines))
+                add("")
+                if varparent is not None:
+                    extend(("[varparent]", str(varparent), ""))
                 if obj.spline_terrain_align:
-                    print("[spline_terrain_align]", file=f)
-                    print(file=f)
+                    extend(("[spline_terrain_align]", ""))
                 if obj.rule_list is not None:
                     for rul in obj.rule_list:
-                        if rul.kill:
-                            print("[kill_rule]", file=f)
-                        else:
-                            print("[rule]", file=f)
-                        print(rul.line1, file=f)
-                        print(rul.line2, file=f)
-                        print(rul.line3, file=f)
-                        print(rul.line4, file=f)
-                        print(file=f)
+                        extend(_rule_lines(rul))
+                        add("")
+        return lines
@@ -0,0 +1,342 @@
+# Copyright 2024 Bartosz Gajewski
+#
+# This file is part of OMSI Map Merger.
+#
+# OMSI Map Merger is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# OMSI Map Merger is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
+
+# Deterministic, line oriented parser of "tile_x_y.map" files.
+# It accepts the same language as tile_grammar.pg and builds the same objects
+# as tile_parser.TileParser.actions do, but in a single pass over lines.
+# Whenever it meets something it is not sure about it raises
+# UnsupportedSyntaxError, so the caller can fall back to the LR parser.
+
+import itertools
+import tile
+import typing
+
+SPLINE_LINES_COUNT: int = 18
+SPLINE_H_LINES_COUNT: int = 19
+OBJECT_LINES_COUNT: int = 10
+SPLINEATTACHEMENT_LINES_COUNT: int = 14
+SPLINEATTACHEMENT_REPEATER_LINES_COUNT: int = 16
+RULE_LINES_COUNT: int = 4
+
+OBJECT_HEADERS: set[str] = {"[object]", "[attachObj]", "[splineAttachement]", "[splineAttachement_repeater]"}
+RULE_HEADERS: set[str] = {"[rule]", "[kill_rule]"}
+
+class UnsupportedSyntaxError(Exception):
+    pass
+
+def _int(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise UnsupportedSyntaxError(f"\"{value}\" is not an integer")
+
+WINDOW_STEP: int = 4096 # lines taken from iterator at once
+
+def _terminated_lines(lines: typing.Iterator[str]) -> typing.Iterator[str]:
+    # lines of content split at "\n", content must end with line end, so the last one is empty and is skipped
+    previous: str | None = next(lines, None)
+    for line in lines:
+        yield typing.cast(str, previous)
+        previous = line
+    if previous != "":
+        raise UnsupportedSyntaxError("Content does not end with line end.")
+
+class _Lines:
+    # Lines are taken from iterator when needed and lines before the current
+    # one are dropped, so only a window of lines around the current one is
+    # held. index is number of the current line in whole content.
+    def __init__(self, lines: typing.Iterable[str]) -> None:
+        self.__source: typing.Iterator[str] = iter(() if isinstance(lines, list) else lines)
+        self.__window: list[str] = lines if isinstance(lines, list) else [] # list is held whole
+        self.__offset: int = 0 # index of first line in window
+        self.index: int = 0
+    
+    @classmethod
+    def of_content(cls, content: str) -> '_Lines':
+        if "\r" in content:
+            raise UnsupportedSyntaxError("Carriage return characters left in decoded content.")
+        if not content.endswith("\n"):
+            raise UnsupportedSyntaxError("Content does not end with line end.")
+        lines: list[str] = content.split("\n")
+        lines.pop() # empty string after last line end
+        return cls(lines)
+    
+    def __available(self, end: int) -> bool:# whether lines before end are in window
+        while self.__offset + len(self.__window) < end:
+            taken: list[str] = list(itertools.islice(self.__source, WINDOW_STEP))
+            if not taken:
+                return False
+            del self.__window[:self.index - self.__offset]
+            self.__offset = self.index
+            self.__window.extend(taken)
+        return True
+    
+    def __line(self, index: int) -> str:
+        return self.__window[index - self.__offset]
+
+    def error(self, message: str) -> UnsupportedSyntaxError:
+        return UnsupportedSyntaxError(f"Line {self.index + 1}: {message}")
+
+    def at_end(self) -> bool:
+        return not self.__available(self.index + 1)
+
+    def peek(self) -> str | None:
+        return None if self.at_end() else self.__line(self.index)
+
+    def header(self, header: str) -> bool:
+        if self.peek() == header:
+            self.index += 1
+            return True
+        return False
+
+    def optional_line(self) -> str:
+        if self.at_end():
+            raise self.error("unexpected end of file")
+        line: str = self.__line(self.index)
+        if line.startswith("["):
+            raise self.error(f"section header \"{line}\" where plain line expected")
+        self.index += 1
+        return line
+
+    def optional_lines(self, count: int) -> list[str]:
+        if not self.__available(self.index + count):
+            raise self.error("unexpected end of file")
+        start: int = self.index - self.__offset
+        chunk: list[str] = self.__window[start:start + count]
+        for line in chunk:
+            if line.startswith("["):
+                raise self.error(f"section header \"{line}\" where plain line expected")
+        self.index += count
+        return chunk
+
+    def nonempty_line(self) -> str:
+        line: str = self.optional_line()
+        if line == "":
+            self.index -= 1
+            raise self.error("empty line where nonempty line expected")
+        return line
+
+    def line_end(self) -> None:
+        if self.optional_line() != "":
+            self.index -= 1
+            raise self.error("nonempty line where empty line expected")
+
+    def plain_lines_block(self) -> list[str] | None:
+        # LINES? line_end of object-like groups, the block ends where the
+        # next section header starts (or one line earlier, when it is header
+        # of next object, which is preceded by its description)
+        end: int = self.index
+        while self.__available(end + 1) and not self.__line(end).startswith("["):
+            end += 1
+        if self.__available(end + 1) and self.__line(end) in OBJECT_HEADERS:
+            end -= 1
+        if end <= self.index or self.__line(end - 1) != "":
+            raise self.error("object group is not terminated with empty line")
+        block: list[str] = self.__window[self.index - self.__offset:end - 1 - self.__offset]
+        self.index = end
+        return block if block else None
+
+class TileStreamParser:
+    def parse_content(self, content: str) -> tile.Tile:
+        return self.parse_lines(_Lines.of_content(content))
+    
+    def parse_split_lines(self, lines: typing.Iterator[str]) -> tile.Tile:# content split at "\n", eg. by file_decoder.decoded_lines
+        return self.parse_lines(_Lines(_terminated_lines(lines)))
+    
+    def parse_lines(self, lines: _Lines) -> tile.Tile:
+        initial_comment: str = lines.nonempty_line()
+        lines.line_end()
+        if not lines.header("[version]"):
+            raise lines.error("[version] expected")
+        version: str = lines.optional_line()
+        lines.line_end()
+        terrain: bool | None = self.__flag_group(lines, "[terrain]", 2)
+        water: bool | None = self.__flag_group(lines, "[water]", 2)
+        variable_terrainlightmap: bool | None = self.__flag_group(lines, "[variable_terrainlightmap]", 1)
+        variable_terrain: bool | None = self.__flag_group(lines, "[variable_terrain]", 1)
+
+        splines: list[tile.Spline] = []
+        while True:
+            if lines.header("[spline]"):
+                splines.append(self.__spline(lines, False))
+            elif lines.header("[spline_h]"):
+                splines.append(self.__spline(lines, True))
+            else:
+                break
+
+        objects: list[tile._Object | tile.SplineAttachement | tile.SplineAttachementRepeater] = []
+        while not lines.at_end():
+            objects.append(self.__object(lines))
+
+        return tile.Tile(initial_comment=initial_comment,
+                         version=version,
+                         terrain=terrain,
+                         water=water,
+                         variable_terrainlightmap=variable_terrainlightmap,
+                         variable_terrain=variable_terrain,
+                         spline=splines if splines else None,
+                         _object=objects if objects else None,
+                         )
+
+    def __flag_group(self, lines: _Lines, header: str, line_ends: int) -> bool | None:
+        if not lines.header(header):
+            return None
+        for _ in range(line_ends):
+            lines.line_end()
+        return True
+
+    def __rule_list(self, lines: _Lines) -> list[tile.Rule] | None:
+        rules: list[tile.Rule] = []
+        while lines.peek() in RULE_HEADERS:
+            kill: bool = lines.peek() == "[kill_rule]"
+            lines.index += 1
+            line1, line2, line3, line4 = lines.optional_lines(RULE_LINES_COUNT)
+            lines.line_end()
+            rules.append(tile.Rule(kill=kill,
+                                   line1=line1,
+                                   line2=line2,
+                                   line3=line3,
+                                   line4=line4,
+                                   ))
+        return rules if rules else None
+
+    def __spline(self, lines: _Lines, h: bool) -> tile.Spline:
+        n: list[str] = lines.optional_lines(SPLINE_H_LINES_COUNT if h else SPLINE_LINES_COUNT)
+        delta_h: str | None = n.pop(13) if h else None
+        mirror: bool
+        if lines.header("mirror"):
+            mirror = True
+        else:
+            lines.line_end()
+            mirror = False
+        lines.line_end()
+        spline_terrain_align_2: str | None = None
+        if lines.header("[spline_terrain_align_2]"):
+            spline_terrain_align_2 = lines.optional_line()
+            lines.line_end()
+        return tile.Spline(h=h,
+                           line1=n[0],
+                           file_name=n[1],
+                           id=_int(n[2]),
+                           id_previous=_int(n[3]),
+                           id_next=_int(n[4]),
+                           pos_x=n[5],
+                           pos_z=n[6],
+                           pos_y=n[7],
+                           rotate=n[8],
+                           length=n[9],
+                           radius=n[10],
+                           gradient_start=n[11],
+                           gradient_end=n[12],
+                           delta_h=delta_h,
+                           cant_start=n[13],
+                           cant_end=n[14],
+                           skew_start=n[15],
+                           skew_end=n[16],
+                           line18=n[17],
+                           mirror=mirror,
+                           spline_terrain_align_2=spline_terrain_align_2,
+                           rule_list=self.__rule_list(lines),
+                           )
+
+    def __object(self, lines: _Lines) -> tile._Object | tile.SplineAttachement | tile.SplineAttachementRepeater:
+        description: str = lines.nonempty_line()
+        header: str | None = lines.peek()
+        if header not in OBJECT_HEADERS:
+            raise lines.error(f"object group header expected, found \"{header}\"")
+        lines.index += 1
+        match header:
+            case "[object]" | "[attachObj]":
+                n: list[str] = lines.optional_lines(OBJECT_LINES_COUNT)
+                opt_lines, varparent, spline_terrain_align, rule_list = self.__object_tail(lines)
+                return tile._Object(description=description,
+                                    attach_object=header == "[attachObj]",
+                                    line1=n[0],
+                                    file_name=n[1],
+                                    id=_int(n[2]),
+                                    pos_x=n[3],
+                                    pos_y=n[4],
+                                    pos_z=n[5],
+                                    rotate=n[6],
+                                    pitch=n[7],
+                                    bank=n[8],
+                                    line10=n[9],
+                                    opt_lines=opt_lines,
+                                    varparent=varparent,
+                                    spline_terrain_align=spline_terrain_align,
+                                    rule_list=rule_list,
+                                    )
+            case "[splineAttachement]":
+                n: list[str] = lines.optional_lines(SPLINEATTACHEMENT_LINES_COUNT)
+                opt_lines, varparent, spline_terrain_align, rule_list = self.__object_tail(lines)
+                return tile.SplineAttachement(description=description,
+                                              line1=n[0],
+                                              file_name=n[1],
+                                              id=_int(n[2]),
+                                              line4=n[3],
+                                              pos_x=n[4],
+                                              pos_z=n[5],
+                                              pos_y=n[6],
+                                              rotate=n[7],
+                                              pitch=n[8],
+                                              bank=n[9],
+                                              interval=n[10],
+                                              distance=n[11],
+                                              line13=n[12],
+                                              line14=n[13],
+                                              opt_lines=opt_lines,
+                                              varparent=varparent,
+                                              spline_terrain_align=spline_terrain_align,
+                                              rule_list=rule_list,
+                                              )
+            case _:
+                n: list[str] = lines.optional_lines(SPLINEATTACHEMENT_REPEATER_LINES_COUNT)
+                opt_lines, varparent, spline_terrain_align, rule_list = self.__object_tail(lines)
+                return tile.SplineAttachementRepeater(description=description,
+                                                      line1=n[0],
+                                                      line2=n[1],
+                                                      line3=n[2],
+                                                      file_name=n[3],
+                                                      id=_int(n[4]),
+                                                      line6=n[5],
+                                                      pos_x=n[6],
+                                                      pos_z=n[7],
+                                                      pos_y=n[8],
+                                                      rotate=n[9],
+                                                      pitch=n[10],
+                                                      bank=n[11],
+                                                      interval=n[12],
+                                                      distance=n[13],
+                                                      line15=n[14],
+                                                      line16=n[15],
+                                                      opt_lines=opt_lines,
+                                                      varparent=varparent,
+                                                      spline_terrain_align=spline_terrain_align,
+                                                      rule_list=rule_list,
+                                                      )
+
+    def __object_tail(self, lines: _Lines) -> tuple[list[str] | None, int | None, bool | None, list[tile.Rule] | None]:
+        opt_lines: list[str] | None = lines.plain_lines_block()
+        varparent: int | None = None
+        if lines.header("[varparent]"):
+            varparent = _int(lines.optional_line())
+            lines.line_end()
+        spline_terrain_align: bool | None = None
+        if lines.header("[spline_terrain_align]"):
+            lines.line_end()
+            spline_terrain_align = True
+        return opt_lines, varparent, spline_terrain_align, self.__rule_list(lines)
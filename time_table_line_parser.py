@@ -15,7 +15,10 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import file_decoder
 import parglare
+import parse_tables
+import grammar_actions
 import time_table_line
 import os
 
@@ -33,14 +36,14 @@ class TimeTableLineParser:
                                                                trip_name=n[2],
                                                                line2=n[3],
                                                                depart_time=n[4])],
-        "ADDTRIP_GROUP_LIST": [lambda _, n: [n[0]],
-                               lambda _, n: n[0] + [n[1]]],
+        "ADDTRIP_GROUP_LIST": [grammar_actions.list_first,
+                               grammar_actions.list_append],
         "NEWTOUR_GROUP": [lambda _, n: time_table_line.NewTour(tour_name=n[3],
                                                                ai_group_name=n[4],
                                                                line3=n[5],
                                                                trips=n[9])],
-        "NEWTOUR_GROUP_LIST": [lambda _, n: [n[0]],
-                               lambda _, n: n[0] + [n[1]]],
+        "NEWTOUR_GROUP_LIST": [grammar_actions.list_first,
+                               grammar_actions.list_append],
         "OPTIONAL_LINE": [lambda _, n: "",
                           lambda _, n: n[0]],
     }
@@ -48,8 +51,8 @@ class TimeTableLineParser:
         self.grammar = parglare.Grammar.from_file(os.path.join(os.path.dirname(os.path.realpath(__file__)), "time_table_line_grammar.pg"))
         self.parser = parglare.Parser(self.grammar,
                                       actions=self.actions,
-                                      ws="\r")
+                                      ws="\r",
+                                      table=parse_tables.table(self.grammar))
     def parse(self, file_name):
-        with open(file_name, encoding="iso-8859-1") as f:
-            content = f.read()
+        content = file_decoder.decoded(file_name, ["iso-8859-1"])
         return self.parser.parse(content)
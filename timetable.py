@@ -30,9 +30,11 @@ import busstops_serializer
 import station_links
 import station_links_parser
 import station_links_serializer
+import lazy_instance
 import loader
+import parse_cache
 import named_data as nd
-import glob
+import directory_index
 import os
 import itertools
 import logging
@@ -44,21 +46,39 @@ TIMETABLE_DIRNAME: str = 'TTData'
 BUSSTOPS_FILENAME: str = 'Busstops.cfg'
 STNLINKS_FILENAME: str = 'StnLinks.cfg'
 
-_time_table_line_parser = time_table_line_parser.TimeTableLineParser()
+_time_table_line_parser = lazy_instance.LazyInstance(time_table_line_parser.TimeTableLineParser)
 _time_table_line_serializer = time_table_line_serializer.TimeTableLineSerializer()
 
-_track_parser = track_parser.TrackParser()
+_track_parser = lazy_instance.LazyInstance(track_parser.TrackParser)
 _track_serializer = track_serializer.TrackSerializer()
 
-_trip_parser = trip_parser.TripParser()
+_trip_parser = lazy_instance.LazyInstance(trip_parser.TripParser)
 _trip_serializer = trip_serializer.TripSerializer()
 
-_busstops_parser = busstops_parser.BusstopsParser()
+_busstops_parser = lazy_instance.LazyInstance(busstops_parser.BusstopsParser)
 _busstops_serializer = busstops_serializer.BusstopsSerializer()
 
-_station_links_parser = station_links_parser.StationLinksParser()
+_station_links_parser = lazy_instance.LazyInstance(station_links_parser.StationLinksParser)
 _station_links_serializer = station_links_serializer.StationLinksSerializer()
 
+# module level functions (unlike bound methods of parsers) are picklable,
+# so they can be used as true loaders with loader.ParallelLoader
+
+def parse_time_table_line(path: str) -> time_table_line.TimeTableLine:
+    return _time_table_line_parser.get().parse(path)
+
+def parse_track(path: str) -> track.Track:
+    return _track_parser.get().parse(path)
+
+def parse_trip(path: str) -> trip.Trip:
+    return _trip_parser.get().parse(path)
+
+def parse_busstops(path: str) -> busstops.Busstops:
+    return _busstops_parser.get().parse(path)
+
+def parse_station_links(path: str) -> station_links.StationLinks:
+    return _station_links_parser.get().parse(path)
+
 class Timetable:
     def __init__(self,
                  tbusstops: busstops.Busstops,
@@ -82,20 +102,20 @@ class Timetable:
     def get_trips_names(self) -> list[str]:
         return nd.names(self.trips)
     
-    def change_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> None:
+    def shifted_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> 'Timetable':# unchanged parts (eg. time table lines) are shared with self
         logger.info("Changing objects' IDs and tiles' indices in tracks.")
-        for track in self.tracks:
-            track.data.change_ids_and_tile_indices(ids_value, tile_indices_value)
+        tracks: list[nd.NamedData[track.Track]] = [nd.NamedData(track.name, track.data.shifted_ids_and_tile_indices(ids_value, tile_indices_value)) for track in self.tracks]
         
         logger.info("Changing objects' IDs and tiles' indices in trips.")
-        for trip in self.trips:
-            trip.data.change_ids_and_tile_indices(ids_value, tile_indices_value)
+        trips: list[nd.NamedData[trip.Trip]] = [nd.NamedData(trip.name, trip.data.shifted_ids_and_tile_indices(ids_value, tile_indices_value)) for trip in self.trips]
         
         logger.info("Changing objects' IDs, splines' IDs and tiles' indices in Busstops.cfg file.")
-        self.busstops.change_ids_and_tile_indices(ids_value, tile_indices_value)
+        shifted_busstops: busstops.Busstops = self.busstops.shifted_ids_and_tile_indices(ids_value, tile_indices_value)
         
         logger.info("Changing objects' IDs, splines' IDs and tiles' indices in StnLinks.cfg file.")
-        self.station_links.change_ids_and_tile_indices(ids_value, tile_indices_value)
+        shifted_station_links: station_links.StationLinks = self.station_links.shifted_ids_and_tile_indices(ids_value, tile_indices_value)
+        
+        return Timetable(shifted_busstops, shifted_station_links, self.time_table_lines, tracks, trips)
     
     def save(self, directory: str) -> None:
         os.makedirs(os.path.join(directory, TIMETABLE_DIRNAME))
@@ -126,11 +146,13 @@ class TimetableSl(loader.SafeLoaderList):
     def __init__(self,
                  map_directory: str,
                  chrono_directory: str = "",
+                 cache: parse_cache.ParseCache | None = None,
                  ):
         self.map_directory = map_directory
         self.chrono_directory = chrono_directory
-        self.busstops = loader.SafeLoaderUnit(busstops.Busstops, os.path.join(self.map_directory, self.chrono_directory, TIMETABLE_DIRNAME, BUSSTOPS_FILENAME), _busstops_parser.parse)
-        self.station_links = loader.SafeLoaderUnit(station_links.StationLinks, os.path.join(self.map_directory, self.chrono_directory, TIMETABLE_DIRNAME, STNLINKS_FILENAME), _station_links_parser.parse)
+        self.cache: parse_cache.ParseCache | None = cache
+        self.busstops = loader.SafeLoaderUnit(busstops.Busstops, os.path.join(self.map_directory, self.chrono_directory, TIMETABLE_DIRNAME, BUSSTOPS_FILENAME), parse_cache.cached(parse_busstops, self.cache))
+        self.station_links = loader.SafeLoaderUnit(station_links.StationLinks, os.path.join(self.map_directory, self.chrono_directory, TIMETABLE_DIRNAME, STNLINKS_FILENAME), parse_cache.cached(parse_station_links, self.cache))
         self.time_table_line_files = []
         self.time_table_lines: loader.SafeLoaderList = loader.SafeLoaderList([], "Timetable lines")
         self.scanned_time_table_lines: bool = False
@@ -163,26 +185,42 @@ class TimetableSl(loader.SafeLoaderList):
         )
 
     
-    def scan_time_table_lines(self) -> None:
-        self.time_table_line_files = [os.path.relpath(x, os.path.join(self.map_directory, self.chrono_directory, TIMETABLE_DIRNAME)) for x in glob.glob(os.path.join(self.map_directory, self.chrono_directory, TIMETABLE_DIRNAME, "*.ttl"))]
-        self.time_table_lines.set_sl_list(list(map(lambda time_table_line_file: loader.SafeLoaderUnit(time_table_line.TimeTableLine, os.path.join(self.map_directory, self.chrono_directory, TIMETABLE_DIRNAME, time_table_line_file), _time_table_line_parser.parse), self.time_table_line_files)))
+    def __scanned(self, safe_loaders: loader.SafeLoaderList, data_type: type, files: list[str], true_loader: typing.Callable[[str], typing.Any], keep_loaded: bool) -> list[loader.SafeLoader]:
+        kept: dict[str, loader.SafeLoaderUnit] = {sl.get_path(): sl for sl in typing.cast(list[loader.SafeLoaderUnit], safe_loaders.get_sl_list())} if keep_loaded else {}
+        paths: list[str] = [os.path.join(self.map_directory, self.chrono_directory, TIMETABLE_DIRNAME, file) for file in files]
+        return [kept[path] if path in kept else loader.SafeLoaderUnit(data_type, path, true_loader) for path in paths]
+    
+    def __scanned_files(self, pattern: str) -> list[str]:# names of files in timetable directory
+        return [os.path.basename(file) for file in directory_index.of(self.map_directory).files(os.path.join(self.chrono_directory, TIMETABLE_DIRNAME), pattern)]
+    
+    def scan_time_table_lines(self, keep_loaded: bool = False) -> None:# keep_loaded: reuse loaders of files found again
+        self.time_table_line_files = self.__scanned_files("*.ttl")
+        self.time_table_lines.set_sl_list(self.__scanned(self.time_table_lines, time_table_line.TimeTableLine, self.time_table_line_files, parse_cache.cached(parse_time_table_line, self.cache), keep_loaded))
         self.scanned_time_table_lines  = True
     
-    def scan_tracks(self) -> None:
-        self.track_files = [os.path.relpath(x, os.path.join(self.map_directory, self.chrono_directory, TIMETABLE_DIRNAME)) for x in glob.glob(os.path.join(self.map_directory, self.chrono_directory, TIMETABLE_DIRNAME, "*.ttr"))]
-        self.tracks.set_sl_list(list(map(lambda track_file: loader.SafeLoaderUnit(track.Track, os.path.join(self.map_directory, self.chrono_directory, TIMETABLE_DIRNAME, track_file), _track_parser.parse), self.track_files)))
+    def scan_tracks(self, keep_loaded: bool = False) -> None:
+        self.track_files = self.__scanned_files("*.ttr")
+        self.tracks.set_sl_list(self.__scanned(self.tracks, track.Track, self.track_files, parse_cache.cached(parse_track, self.cache), keep_loaded))
         self.scanned_tracks = True
     
-    def scan_trips(self) -> None:
-        self.trip_files = [os.path.relpath(x, os.path.join(self.map_directory, self.chrono_directory, TIMETABLE_DIRNAME)) for x in glob.glob(os.path.join(self.map_directory, self.chrono_directory, TIMETABLE_DIRNAME, "*.ttp"))]
-        self.trips.set_sl_list(list(map(lambda trip_file: loader.SafeLoaderUnit(trip.Trip, os.path.join(self.map_directory, self.chrono_directory, TIMETABLE_DIRNAME, trip_file), _trip_parser.parse), self.trip_files)))
+    def scan_trips(self, keep_loaded: bool = False) -> None:
+        self.trip_files = self.__scanned_files("*.ttp")
+        self.trips.set_sl_list(self.__scanned(self.trips, trip.Trip, self.trip_files, parse_cache.cached(parse_trip, self.cache), keep_loaded))
         self.scanned_trips = True
     
-    def load(self):
+    def load(self, pool: loader.ParallelLoader | None = None, progress: loader.LoadProgress | None = None):
+        directory_index.of(self.map_directory).refresh(os.path.join(self.chrono_directory, TIMETABLE_DIRNAME))
         self.scan_time_table_lines()
         self.scan_tracks()
         self.scan_trips()
-        super().load()
+        super().load(pool, progress)
+    
+    def reload(self, pool: loader.ParallelLoader | None = None, progress: loader.LoadProgress | None = None):
+        directory_index.of(self.map_directory).refresh(os.path.join(self.chrono_directory, TIMETABLE_DIRNAME))
+        self.scan_time_table_lines(keep_loaded=True)
+        self.scan_tracks(keep_loaded=True)
+        self.scan_trips(keep_loaded=True)
+        super().reload(pool, progress)
     
     def everything_scanned(self) -> bool:
         return self.scanned_time_table_lines and self.scanned_tracks and self.scanned_trips
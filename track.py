@@ -15,6 +15,8 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import copy
+
 class TrackEntry:
     def __init__(self,
                  comment=None,
@@ -34,6 +36,12 @@ class TrackEntry:
         self.length = length
         self.line6 = line6
         self.line7 = line7
+    
+    def shifted_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> 'TrackEntry':
+        shifted: TrackEntry = copy.copy(self)
+        shifted.id = str(int(self.id) + ids_value)
+        shifted.tile_index = str(int(self.tile_index) + tile_indices_value)
+        return shifted
 
 class Track:
     def __init__(self,
@@ -44,8 +52,7 @@ class Track:
         self.comment2 = comment2
         self.track_entry = track_entry
     
-    def change_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int):
-        if self.track_entry is not None:
-            for te in self.track_entry:
-                te.id = str(int(te.id) + ids_value)
-                te.tile_index = str(int(te.tile_index) + tile_indices_value)
+    def shifted_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> 'Track':# unchanged parts are shared with self
+        return Track(self.comment1,
+                     self.comment2,
+                     None if self.track_entry is None else [te.shifted_ids_and_tile_indices(ids_value, tile_indices_value) for te in self.track_entry])
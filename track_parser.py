@@ -15,7 +15,10 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import file_decoder
 import parglare
+import parse_tables
+import grammar_actions
 import track
 import os
 
@@ -35,15 +38,15 @@ class TrackParser():
                                                             line6=n[7],
                                                             line7=n[8],
                                                             )],
-        "TRACK_ENTRY_GROUP_LIST": [lambda _, n: [n[0]],
-                                   lambda _, n: n[0] + [n[1]]]
+        "TRACK_ENTRY_GROUP_LIST": [grammar_actions.list_first,
+                                   grammar_actions.list_append]
     }
     def __init__(self):
         self.grammar = parglare.Grammar.from_file(os.path.join(os.path.dirname(os.path.realpath(__file__)), "track_grammar.pg"))
         self.parser = parglare.Parser(self.grammar,
                                       actions=self.actions,
-                                      ws="\r")
+                                      ws="\r",
+                                      table=parse_tables.table(self.grammar))
     def parse(self, file_name):
-        with open(file_name, encoding="iso-8859-1") as f:
-            content = f.read()
+        content = file_decoder.decoded(file_name, ["iso-8859-1"])
         return self.parser.parse(content)
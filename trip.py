@@ -15,12 +15,18 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import copy
 import typing
 
 class AnyStation:
     def __init__(self):
         self.id: int
         raise NotImplementedError
+    
+    def shifted_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> 'AnyStation':# other attributes are shared with self
+        shifted: AnyStation = copy.copy(self)
+        shifted.id = self.id + ids_value
+        return shifted
 
 class Station(AnyStation):
     def __init__(self,
@@ -41,6 +47,11 @@ class Station(AnyStation):
         self.line6 = line6
         self.line7 = line7
         self.line8 = line8
+    
+    def shifted_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> 'Station':
+        shifted: Station = typing.cast(Station, super().shifted_ids_and_tile_indices(ids_value, tile_indices_value))
+        shifted.tile_index = self.tile_index + tile_indices_value
+        return shifted
 
 class StationTyp2(AnyStation):
     def __init__(self, id: int):
@@ -64,8 +75,7 @@ class Trip:
         self.station: list[Station] | list[StationTyp2] = station
         self.lines = lines
     
-    def change_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int):
-        for station in self.station:
-            station.id += ids_value
-            if type(station) == Station:
-                typing.cast(Station, station).tile_index += tile_indices_value
\ No newline at end of file
+    def shifted_ids_and_tile_indices(self, ids_value: int, tile_indices_value: int) -> 'Trip':# unchanged parts are shared with self
+        shifted: Trip = copy.copy(self)
+        shifted.station = typing.cast(list[Station] | list[StationTyp2], [station.shifted_ids_and_tile_indices(ids_value, tile_indices_value) for station in self.station])
+        return shifted
@@ -15,7 +15,10 @@
 # You should have received a copy of the GNU General Public License
 # along with OMSI Map Merger. If not, see <http://www.gnu.org/licenses/>.
 
+import file_decoder
 import parglare
+import parse_tables
+import grammar_actions
 import trip
 import os
 
@@ -31,8 +34,8 @@ class TripParser:
                                         )],
         "NONEMPTY_LINE": [lambda _, n: n[0]],
         "STATION_TYP2_GROUP": [lambda _, n: trip.StationTyp2(int(n[1]))],
-        "STATION_TYP2_GROUP_LIST": [lambda _, n: [n[0]],
-                                    lambda _, n: n[0] + [n[1]]],
+        "STATION_TYP2_GROUP_LIST": [grammar_actions.list_first,
+                                    grammar_actions.list_append],
         "STATION_GROUP": [lambda _, n: trip.Station(id=int(n[1]),
                                                     interval=n[2],
                                                     name=n[3],
@@ -42,21 +45,21 @@ class TripParser:
                                                     line7=n[7],
                                                     line8=n[8]
                                                     )],
-        "STATION_GROUP_LIST": [lambda _, n: [n[0]],
-                               lambda _, n: n[0] + [n[1]]],
+        "STATION_GROUP_LIST": [grammar_actions.list_first,
+                               grammar_actions.list_append],
         "STATIONS": [lambda _, n: n[0],
                      lambda _, n: n[0]],
         "OPTIONAL_LINE": [lambda _, n: "",
                           lambda _, n: n[0]],
-        "LINES": [lambda _, n: [n[0]],
-                  lambda _, n: n[0] + [n[1]]],
+        "LINES": [grammar_actions.list_first,
+                  grammar_actions.list_append],
     }
     def __init__(self):
         self.grammar = parglare.Grammar.from_file(os.path.join(os.path.dirname(os.path.realpath(__file__)), "trip_grammar.pg"))
         self.parser = parglare.Parser(self.grammar,
                                       actions=self.actions,
-                                      ws="\r")
+                                      ws="\r",
+                                      table=parse_tables.table(self.grammar))
     def parse(self, file_name):
-        with open(file_name, encoding="iso-8859-1") as f:
-            content = f.read()
+        content = file_decoder.decoded(file_name, ["iso-8859-1"])
         return self.parser.parse(content)